@@ -1,9 +1,18 @@
 import math
-import time
 import random
 import json
 import os
 
+# Loaded policies are shared by every RobotAI in the process (batch runs build new AIs each match)
+_MODEL_CACHE = {}
+
+def _load_model(model_path):
+    model = _MODEL_CACHE.get(model_path)
+    if model is None:
+        from stable_baselines3 import PPO
+        model = _MODEL_CACHE[model_path] = PPO.load(model_path)
+    return model
+
 class RobotAI:
     def __init__(self, alliance="blue", is_tank=True, model_path=None):
         self.alliance = alliance
@@ -13,8 +22,7 @@ class RobotAI:
         
         if model_path and os.path.exists(model_path):
             try:
-                from stable_baselines3 import PPO
-                self.model = PPO.load(model_path)
+                self.model = _load_model(model_path)
                 print(f"Loaded ML Model for {alliance} AI: {model_path}")
             except ImportError:
                 print("Warning: stable-baselines3 not installed. Using heuristic AI.")
@@ -28,6 +36,18 @@ class RobotAI:
         self.recovery_timer = 0
         self.recovery_rot = 0.5
         
+    STATE_FIELDS = ('last_x', 'last_y', 'stuck_timer', 'recovery_timer', 'recovery_rot', 'state')
+
+    def get_state(self):
+        return {k: getattr(self, k, None) for k in self.STATE_FIELDS}
+
+    def set_state(self, state):
+        for k in self.STATE_FIELDS:
+            if state[k] is not None:
+                setattr(self, k, state[k])
+            elif hasattr(self, k):
+                delattr(self, k)
+
     def get_dist(self, x1, y1, x2, y2):
         return ((x1 - x2)**2 + (y1 - y2)**2)**0.5
 
@@ -121,7 +141,7 @@ class RobotAI:
             if self.stuck_timer > 1.2: # Stuck for > 1.2 second
                 self.recovery_timer = 0.8 # Recover for 0.8s
                 self.stuck_timer = 0
-                self.recovery_rot = 1.0 if math.sin(time.time() * 10) > 0 else -1.0 # Pseudo-random
+                self.recovery_rot = random.choice((1.0, -1.0)) # Seeded with the match, so runs replay
 
         # Logic per State
         inputs = {'x': 0, 'y': 0, 'rot': 0, 'shoot_toggle': False, 'pass_toggle': False}
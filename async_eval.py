@@ -0,0 +1,134 @@
+import os
+import random
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from stable_baselines3.common.callbacks import BaseCallback
+
+from opponent_pool import NumpyPolicy, policy_arrays
+from checkpoint_store import capture_model, write_capture
+
+# Asynchronous Evaluation
+# Drop-in for SB3's EvalCallback that never stops training: every eval_freq calls the current policy
+# is snapshotted as plain numpy arrays (opponent_pool.policy_arrays) and its episodes are spread over a
+# background process pool, each worker holding one env built once. Results are collected on later
+# steps and logged under eval/, and the snapshot's own weights are saved as best_model.zip when it beats
+# the best mean reward. If max_pending snapshots are still running, the new one is skipped.
+# Episodes use fixed seeds (eval_seed + i) so successive snapshots are compared on the same matches.
+
+_worker_env = None
+
+def _init_worker(env_fn):
+    global _worker_env
+    _worker_env = env_fn()
+
+def _run_episodes(flat, layers, seeds):
+    # Deterministic rollouts in a worker -> [(episode reward, length, scored)]
+    policy = NumpyPolicy("eval", flat, layers)
+    results = []
+    for seed in seeds:
+        # The sim draws from the global RNGs as well as the env's np_random
+        random.seed(seed)
+        np.random.seed(seed)
+        obs, _ = _worker_env.reset(seed=seed)
+        done, ep_reward, ep_len, info = False, 0.0, 0, {}
+        while not done:
+            action = policy(obs[None])[0]
+            obs, reward, terminated, truncated, info = _worker_env.step(action)
+            ep_reward += reward
+            ep_len += 1
+            done = terminated or truncated
+        results.append((float(ep_reward), ep_len, info.get('scored', 0)))
+    return results
+
+class AsyncEvalCallback(BaseCallback):
+    def __init__(self, env_fn, n_eval_episodes=5, eval_freq=10000, n_workers=2, max_pending=1,
+                 best_model_save_path=None, log_path=None, eval_seed=10000, verbose=1):
+        # env_fn: picklable callable returning the eval env (e.g. functools.partial(FrcEnv, render_mode=None))
+        super(AsyncEvalCallback, self).__init__(verbose)
+        self.env_fn = env_fn
+        self.n_eval_episodes = n_eval_episodes
+        self.eval_freq = eval_freq
+        self.n_workers = max(1, min(n_workers, n_eval_episodes))
+        self.max_pending = max_pending
+        self.best_model_save_path = best_model_save_path
+        self.log_path = os.path.join(log_path, "evaluations") if log_path is not None else None
+        self.eval_seed = eval_seed
+        self.best_mean_reward = -np.inf
+        self.pending = [] # [(num_timesteps, policy_state, futures)]
+        self.skipped = 0
+        self.executor = None
+        self.evaluations_timesteps = []
+        self.evaluations_results = []
+        self.evaluations_length = []
+
+    def _init_callback(self) -> None:
+        if self.best_model_save_path is not None:
+            os.makedirs(self.best_model_save_path, exist_ok=True)
+        if self.log_path is not None:
+            os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+        ctx = mp.get_context("forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn")
+        self.executor = ProcessPoolExecutor(max_workers=self.n_workers, mp_context=ctx,
+                                            initializer=_init_worker, initargs=(self.env_fn,))
+
+    def _submit(self):
+        flat, layers = policy_arrays(self.model.policy)
+        # Kept for the best-model save; the live weights keep training meanwhile
+        policy_state = {k: v.detach().clone().cpu() for k, v in self.model.policy.state_dict().items()}
+        seeds = [self.eval_seed + i for i in range(self.n_eval_episodes)]
+        chunks = [seeds[i::self.n_workers] for i in range(self.n_workers)]
+        futures = [self.executor.submit(_run_episodes, flat, layers, chunk) for chunk in chunks if chunk]
+        self.pending.append((self.num_timesteps, policy_state, futures))
+
+    def _collect(self, block=False):
+        while self.pending and (block or all(f.done() for f in self.pending[0][2])):
+            timesteps, policy_state, futures = self.pending.pop(0)
+            results = [r for f in futures for r in f.result()]
+            self._report(timesteps, policy_state, results)
+
+    def _report(self, timesteps, policy_state, results):
+        rewards = [r[0] for r in results]
+        lengths = [r[1] for r in results]
+        mean_reward, std_reward = np.mean(rewards), np.std(rewards)
+        mean_length = np.mean(lengths)
+
+        if self.log_path is not None:
+            self.evaluations_timesteps.append(timesteps)
+            self.evaluations_results.append(rewards)
+            self.evaluations_length.append(lengths)
+            np.savez(self.log_path, timesteps=self.evaluations_timesteps,
+                     results=self.evaluations_results, ep_lengths=self.evaluations_length)
+
+        if self.verbose >= 1:
+            print(f"Eval num_timesteps={timesteps}, episode_reward={mean_reward:.2f} +/- {std_reward:.2f} "
+                  f"(reported at {self.num_timesteps})")
+        self.logger.record("eval/mean_reward", float(mean_reward))
+        self.logger.record("eval/mean_ep_length", float(mean_length))
+        self.logger.record("eval/mean_scored", float(np.mean([r[2] for r in results])))
+        self.logger.record("eval/snapshot_timesteps", timesteps)
+        self.logger.record("eval/lag_timesteps", self.num_timesteps - timesteps)
+
+        if mean_reward > self.best_mean_reward:
+            if self.verbose >= 1:
+                print("New best mean reward!")
+            if self.best_model_save_path is not None:
+                write_capture(os.path.join(self.best_model_save_path, "best_model.zip"),
+                              capture_model(self.model, policy_state, timesteps))
+            self.best_mean_reward = mean_reward
+
+    def _on_step(self) -> bool:
+        self._collect()
+        if self.eval_freq > 0 and self.n_calls % self.eval_freq == 0:
+            if len(self.pending) >= self.max_pending:
+                # Evaluation is behind: drop this snapshot instead of blocking training
+                self.skipped += 1
+                self.logger.record("eval/skipped", self.skipped)
+            else:
+                self._submit()
+        return True
+
+    def _on_training_end(self) -> None:
+        # Finish the evaluations already in flight, then shut the pool down
+        self._collect(block=True)
+        self.executor.shutdown()
@@ -0,0 +1,203 @@
+import os
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+
+import numpy as np
+
+from ml_utils import AFFINITY_LAYOUTS, available_cores, pin_worker, tuned_config_path, tuned_env_key
+
+# Throughput Autotuner
+# Short timed PPO runs over a grid of worker counts, batch sizes, CPU affinity layouts and
+# frames_per_step. For every point it measures rollout throughput (env steps/sec, policy inference
+# included) and the time of the policy update, and ranks the points by end-to-end samples/sec
+# (rollout + update). The best point for the configured frames_per_step and batch_size is written to
+# ml_config.tuned.json, which train.py / train_specialized.py / bc_pretrain.py apply on top of
+# ml_config.json when they train the same env (ml_utils.load_ml_config; --no_tuned to ignore it):
+#   {"machine": {...}, "env": "frc" | "specialized:<mode>", "training_params": {"n_envs", "worker_affinity"}, "results": [...]}
+# frames_per_step changes what the policy controls and batch_size changes PPO's optimisation (fewer
+# gradient steps per update always look faster), so both are only reported; change them in
+# ml_config.json by hand if the table makes a case for it.
+#
+#   python autotune.py --env specialized --mode janitor
+#   python autotune.py --env frc --n_envs 14 21 28 --batch_sizes 512 1024 --layouts none packed
+
+SIM_FPS = 60 # FrcEnv frame rate (frames_per_step frames per env step)
+
+def _make_env(env_kind, mode, ml_config_path, rank, n_envs, layout):
+    def _init():
+        from stable_baselines3.common.monitor import Monitor
+        pin_worker(rank, n_envs, layout)
+        if env_kind == "specialized":
+            from gym_env_specialized import SpecializedFrcEnv
+            env = SpecializedFrcEnv(render_mode=None, ml_config_path=ml_config_path, mode=mode)
+        else:
+            from gym_env import FrcEnv
+            env = FrcEnv(render_mode=None, ml_config_path=ml_config_path)
+        env.reset(seed=rank)
+        return Monitor(env)
+    return _init
+
+def _phase_timer():
+    from stable_baselines3.common.callbacks import BaseCallback
+
+    class PhaseTimer(BaseCallback):
+        # Wall time of each rollout collection and of the update that follows it
+        def __init__(self):
+            super().__init__()
+            self.collect, self.update = [], []
+            self._t_start = self._t_end = None
+
+        def _on_rollout_start(self) -> None:
+            self._t_start = time.perf_counter()
+            if self._t_end is not None:
+                self.update.append(self._t_start - self._t_end)
+
+        def _on_rollout_end(self) -> None:
+            self._t_end = time.perf_counter()
+            self.collect.append(self._t_end - self._t_start)
+
+        def _on_step(self) -> bool:
+            return True
+
+        def _on_training_end(self) -> None:
+            self.update.append(time.perf_counter() - self._t_end)
+
+    return PhaseTimer()
+
+def measure(env, n_envs, n_steps, batch_size, rollouts, train_cfg):
+    # Timed PPO iterations on an existing VecEnv -> (env steps/sec, update seconds per rollout)
+    from stable_baselines3 import PPO
+    model = PPO(
+        "MlpPolicy",
+        env,
+        verbose=0,
+        learning_rate=train_cfg['learning_rate'],
+        n_steps=n_steps,
+        batch_size=batch_size,
+        ent_coef=train_cfg.get('ent_coef', 0.0),
+        gamma=train_cfg['gamma'],
+        policy_kwargs=dict(net_arch=[256, 256])
+    )
+    timer = _phase_timer()
+    model.learn(total_timesteps=(rollouts + 1) * n_steps * n_envs, callback=timer)
+    # The first iteration warms up the workers and torch, it is not counted
+    collect = float(np.median(timer.collect[1:]))
+    update = float(np.median(timer.update[1:]))
+    return n_steps * n_envs / collect, update
+
+def default_grid(train_cfg, cpus):
+    n_envs = sorted({max(1, cpus * k // 4) for k in (1, 2, 3, 4)})
+    bs = train_cfg['batch_size']
+    return n_envs, sorted({max(64, bs // 2), bs, bs * 2})
+
+def autotune(env_kind, mode, n_envs_grid, batch_sizes, layouts, frames_grid, n_steps, rollouts,
+             ml_config_path="ml_config.json"):
+    from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv
+    with open(ml_config_path, "r") as f:
+        ml_config = json.load(f)
+    train_cfg = ml_config['training_params']
+
+    # One ml_config variant per frames_per_step (the envs read their own config file)
+    tmp_dir = tempfile.mkdtemp(prefix="autotune_")
+    results = []
+    try:
+        for frames in frames_grid:
+            variant = json.loads(json.dumps(ml_config))
+            variant['env_params']['frames_per_step'] = frames
+            variant_path = os.path.join(tmp_dir, f"ml_config_f{frames}.json")
+            with open(variant_path, "w") as f:
+                json.dump(variant, f)
+            for n_envs in n_envs_grid:
+                for layout in layouts:
+                    env_fns = [_make_env(env_kind, mode, variant_path, i, n_envs, layout) for i in range(n_envs)]
+                    env = SubprocVecEnv(env_fns) if n_envs > 1 else DummyVecEnv(env_fns)
+                    try:
+                        for batch_size in batch_sizes:
+                            steps_per_sec, update_s = measure(env, n_envs, n_steps, batch_size, rollouts, train_cfg)
+                            samples = n_steps * n_envs
+                            row = {
+                                'frames_per_step': frames, 'n_envs': n_envs, 'worker_affinity': layout,
+                                'batch_size': batch_size,
+                                'env_steps_per_sec': round(steps_per_sec, 1),
+                                'sim_seconds_per_sec': round(steps_per_sec * frames / SIM_FPS, 1),
+                                'update_s': round(update_s, 3),
+                                'samples_per_sec': round(samples / (samples / steps_per_sec + update_s), 1),
+                            }
+                            results.append(row)
+                            print(f"  f={frames:<3d} n_envs={n_envs:<3d} {layout:<7s} batch={batch_size:<5d} "
+                                  f"{row['env_steps_per_sec']:>9.1f} steps/s  update {row['update_s']:6.3f}s  "
+                                  f"-> {row['samples_per_sec']:>9.1f} samples/s")
+                    finally:
+                        env.close()
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return results
+
+def recommend(results, frames_per_step, batch_size):
+    # Fastest worker setup at the configured frames_per_step and batch_size (any measured ones, if those weren't)
+    candidates = [r for r in results if r['frames_per_step'] == frames_per_step] or results
+    candidates = [r for r in candidates if r['batch_size'] == batch_size] or candidates
+    best = max(candidates, key=lambda r: r['samples_per_sec'])
+    return {'n_envs': best['n_envs'], 'worker_affinity': best['worker_affinity']}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark rollout/update throughput and write tuned training_params")
+    parser.add_argument("--env", type=str, choices=["specialized", "frc"], default="specialized", help="Env to benchmark")
+    parser.add_argument("--mode", type=str, choices=["janitor", "lobber"], default="janitor", help="SpecializedFrcEnv mode")
+    parser.add_argument("--n_envs", type=int, nargs='+', help="Worker counts (default: 1/4, 1/2, 3/4 and all of the cores)")
+    parser.add_argument("--batch_sizes", type=int, nargs='+', help="PPO batch sizes (default: half, same and double ml_config)")
+    parser.add_argument("--layouts", type=str, nargs='+', choices=AFFINITY_LAYOUTS, default=list(AFFINITY_LAYOUTS), help="Worker CPU affinity layouts")
+    parser.add_argument("--frames_per_step", type=int, nargs='+', help="frames_per_step values (reported only; default: ml_config)")
+    parser.add_argument("--n_steps", type=int, help="Rollout length per worker (default: ml_config)")
+    parser.add_argument("--rollouts", type=int, default=2, help="Timed PPO iterations per point (after one warm-up)")
+    parser.add_argument("--config", type=str, default="ml_config.json", help="Base ML config")
+    parser.add_argument("--out", type=str, help="Tuned config to write (default: <config>.tuned.json)")
+    args = parser.parse_args()
+
+    with open(args.config, "r") as f:
+        ml_config = json.load(f)
+    train_cfg = ml_config['training_params']
+    frames_per_step = ml_config['env_params']['frames_per_step']
+    cpus = len(available_cores())
+    n_envs_grid, batch_sizes = default_grid(train_cfg, cpus)
+    n_envs_grid = args.n_envs or n_envs_grid
+    batch_sizes = args.batch_sizes or batch_sizes
+    frames_grid = args.frames_per_step or [frames_per_step]
+    n_steps = args.n_steps or train_cfg['n_steps']
+
+    points = len(n_envs_grid) * len(args.layouts) * len(batch_sizes) * len(frames_grid)
+    print(f"Autotuning {args.env}{' (' + args.mode + ')' if args.env == 'specialized' else ''} on {cpus} cores: {points} points")
+    results = autotune(args.env, args.mode, n_envs_grid, batch_sizes, args.layouts, frames_grid,
+                       n_steps, args.rollouts, ml_config_path=args.config)
+
+    print("\nTop configurations (samples/sec):")
+    for row in sorted(results, key=lambda r: -r['samples_per_sec'])[:10]:
+        print(f"  {row['samples_per_sec']:>9.1f}  n_envs={row['n_envs']:<3d} batch={row['batch_size']:<5d} "
+              f"{row['worker_affinity']:<7s} f={row['frames_per_step']}  ({row['sim_seconds_per_sec']} sim s/s)")
+
+    print(f"\nBest samples/sec per batch_size (reported only; ml_config has {train_cfg['batch_size']}):")
+    for bs in batch_sizes:
+        rows = [r for r in results if r['batch_size'] == bs]
+        if rows:
+            print(f"  batch={bs:<5d} {max(r['samples_per_sec'] for r in rows):>9.1f} samples/s")
+
+    tuned = {
+        'machine': {'host': platform.node(), 'cpus': cpus},
+        'env': tuned_env_key(args.env, args.mode),
+        'created': time.strftime("%Y-%m-%d %H:%M:%S"),
+        'n_steps': n_steps,
+        'training_params': recommend(results, frames_per_step, train_cfg['batch_size']),
+        'results': results
+    }
+    out = args.out or tuned_config_path(args.config)
+    with open(out + ".tmp", "w") as f:
+        json.dump(tuned, f, indent=4)
+    os.replace(out + ".tmp", out)
+    print(f"\nRecommended training_params {tuned['training_params']} written to {out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import os
+import sys
+import argparse
+
+import numpy as np
+import torch as th
+from stable_baselines3 import PPO
+from stable_baselines3.common.monitor import Monitor
+from stable_baselines3.common.vec_env import DummyVecEnv
+
+from demonstrations import DemoDataset
+from ml_utils import load_ml_config, tuned_env_key
+
+# Behavioral Cloning Pre-training
+# Fits the actor of a fresh [256, 256] PPO MlpPolicy (the same model train.py builds) to human
+# demonstrations recorded with main.py --record. The deterministic action (action_net mean) is
+# regressed onto the recorded actions with MSE; log_std and the value head are left alone so PPO
+# still explores and learns its critic from scratch. The result is an ordinary SB3 zip:
+#   python bc_pretrain.py --data demos --out ml_models/bc/bc_policy.zip
+#   python train.py --resume ml_models/bc/bc_policy.zip
+
+def make_model(env_kind, mode, train_cfg):
+    if env_kind == "specialized":
+        from gym_env_specialized import SpecializedFrcEnv
+        env = DummyVecEnv([lambda: Monitor(SpecializedFrcEnv(render_mode=None, mode=mode))])
+    else:
+        from gym_env import FrcEnv
+        env = DummyVecEnv([lambda: Monitor(FrcEnv(render_mode=None))])
+    return PPO(
+        "MlpPolicy",
+        env,
+        verbose=0,
+        learning_rate=train_cfg['learning_rate'],
+        n_steps=train_cfg['n_steps'],
+        batch_size=train_cfg['batch_size'],
+        ent_coef=train_cfg.get('ent_coef', 0.0),
+        gamma=train_cfg['gamma'],
+        policy_kwargs=dict(net_arch=[256, 256])
+    )
+
+def _actor_mean(policy, obs):
+    features = policy.extract_features(obs, policy.pi_features_extractor)
+    latent_pi = policy.mlp_extractor.forward_actor(features)
+    return policy.action_net(latent_pi)
+
+def evaluate(policy, dataset, batch_size):
+    # -> (MSE, toggle accuracy) of the deterministic actions over a dataset
+    sq_err, correct, n = 0.0, 0, 0
+    with th.no_grad():
+        for obs, act in dataset.iter_batches(batch_size, shuffle=False):
+            pred = th.clamp(_actor_mean(policy, th.as_tensor(obs, device=policy.device)), -1.0, 1.0).cpu().numpy()
+            sq_err += float(((pred - act) ** 2).sum())
+            # shoot / pass / dump are on when > 0.5 (action_to_inputs)
+            correct += int(((pred[:, 3:] > 0.5) == (act[:, 3:] > 0.5)).sum())
+            n += len(obs)
+    return sq_err / max(1, n * act.shape[1]), correct / max(1, n * 3)
+
+def pretrain(model, train_set, val_set=None, epochs=10, batch_size=256, lr=1e-3, seed=0):
+    policy = model.policy
+    # Only the actor path is trained
+    params = list(policy.mlp_extractor.policy_net.parameters()) + list(policy.action_net.parameters())
+    optimizer = th.optim.Adam(params, lr=lr)
+    rng = np.random.default_rng(seed)
+    for epoch in range(epochs):
+        policy.set_training_mode(True)
+        losses = []
+        for obs, act in train_set.iter_batches(batch_size, rng=rng):
+            obs_t = th.as_tensor(obs, device=policy.device)
+            act_t = th.as_tensor(act, device=policy.device)
+            loss = th.nn.functional.mse_loss(_actor_mean(policy, obs_t), act_t)
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            losses.append(loss.item())
+        policy.set_training_mode(False)
+        line = f"Epoch {epoch + 1}/{epochs}: train mse {np.mean(losses):.4f}"
+        if val_set is not None:
+            val_mse, val_acc = evaluate(policy, val_set, batch_size)
+            line += f"  val mse {val_mse:.4f}  val toggle acc {val_acc:.3f}"
+        print(line)
+    return model
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-train a PPO policy on recorded human play")
+    parser.add_argument("--data", type=str, nargs='+', required=True, help="Recording directories (main.py --record)")
+    parser.add_argument("--out", type=str, default=os.path.join("ml_models", "bc", "bc_policy.zip"))
+    parser.add_argument("--env", type=str, choices=["frc", "specialized"], default="frc", help="Env the policy will be fine-tuned in")
+    parser.add_argument("--mode", type=str, choices=["janitor", "lobber"], default="janitor", help="SpecializedFrcEnv mode")
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--batch_size", type=int, default=256)
+    parser.add_argument("--lr", type=float, default=1e-3)
+    parser.add_argument("--val_chunks", type=int, default=1, help="Most recent chunks held out for validation")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    dataset = DemoDataset(args.data)
+    if len(dataset) == 0:
+        print(f"Error: no recorded rows in {', '.join(args.data)}.")
+        sys.exit(1)
+    train_set, val_set = dataset.split(args.val_chunks)
+    print(f"Demonstrations: {len(train_set)} train rows, {len(val_set) if val_set else 0} validation rows "
+          f"in {len(dataset.chunks)} chunks")
+
+    th.manual_seed(args.seed)
+    model = make_model(args.env, args.mode, load_ml_config(env=tuned_env_key(args.env, args.mode))['training_params'])
+    pretrain(model, train_set, val_set, args.epochs, args.batch_size, args.lr, args.seed)
+
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    model.save(args.out)
+    print(f"BC policy saved to {args.out} (continue with: python train.py --resume {args.out})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+import os
+import re
+import copy
+import json
+import glob
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch as th
+from stable_baselines3.common.callbacks import BaseCallback
+from stable_baselines3.common.save_util import save_to_zip_file
+
+# Checkpoint Store
+# Replaces CheckpointCallback: the model is captured on the training thread (tensors cloned, a few
+# ms) and the SB3 zip is written by a background thread. Every run directory keeps a manifest.json
+#   {"checkpoints": [{"step", "path", "size", "reward", "time"}, ...]}
+# that resume lookups read instead of walking the filesystem, and a retention policy prunes old
+# zips: keep the last `keep_last`, the best by `reward` (mean rollout episode reward at save time)
+# and every `keep_every`-th checkpoint.
+# Runs saved before manifests existed get one on their first lookup (legacy_manifest): their zips
+# are scanned once, the step read from "*_<step>_steps.zip" names.
+
+MANIFEST_NAME = "manifest.json"
+
+def _clone(obj):
+    if isinstance(obj, th.Tensor):
+        return obj.detach().clone().cpu()
+    if isinstance(obj, dict):
+        return {k: _clone(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_clone(v) for v in obj)
+    return obj
+
+def capture_model(model, policy_state=None, num_timesteps=None):
+    # Everything model.save() writes, detached from the live model so it can be written later.
+    # policy_state / num_timesteps override the policy weights / step (e.g. an earlier eval snapshot).
+    data = model.__dict__.copy()
+    exclude = set(model._excluded_save_params())
+    state_dicts_names, torch_variable_names = model._get_torch_save_params()
+    for torch_var in state_dicts_names + torch_variable_names:
+        exclude.add(torch_var.split(".")[0])
+    for name in exclude:
+        data.pop(name, None)
+    data = copy.deepcopy(data)
+    if num_timesteps is not None:
+        data['num_timesteps'] = num_timesteps
+    params = _clone(model.get_parameters())
+    if policy_state is not None:
+        params['policy'] = policy_state
+    pytorch_variables = {name: _clone(getattr(model, name)) for name in torch_variable_names}
+    return data, params, pytorch_variables
+
+def write_capture(path, capture):
+    # Write a capture_model() result as an SB3 zip (atomic: readers never see a partial file)
+    data, params, pytorch_variables = capture
+    tmp_path = path + ".tmp"
+    save_to_zip_file(tmp_path, data=data, params=params, pytorch_variables=pytorch_variables)
+    os.replace(tmp_path, path)
+    return os.path.getsize(path)
+
+def manifest_path(run_dir):
+    return os.path.join(run_dir, MANIFEST_NAME)
+
+def load_manifest(run_dir):
+    try:
+        with open(manifest_path(run_dir), 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def legacy_manifest(run_dir):
+    # Manifest for a run without one, built from the zips under it (best_model/ included) and written
+    # so the scan happens once. Zips without a step in their name sort before every numbered one
+    entries = []
+    for root, _, files in os.walk(run_dir):
+        for name in files:
+            if not name.endswith(".zip"):
+                continue
+            path = os.path.join(root, name)
+            match = re.search(r"_(\d+)_steps\.zip$", name)
+            entries.append({
+                'step': int(match.group(1)) if match else -1, 'path': os.path.relpath(path, run_dir),
+                'size': os.path.getsize(path), 'reward': None, 'time': os.path.getmtime(path)
+            })
+    if not entries:
+        return None
+    entries.sort(key=lambda e: (e['step'], e['time']))
+    for i, e in enumerate(entries, 1):
+        e['index'] = i
+    manifest = {'checkpoints': entries, 'count': len(entries), 'legacy': True}
+    path = manifest_path(run_dir)
+    try:
+        with open(path + ".tmp", 'w') as f:
+            json.dump(manifest, f, indent=4)
+        os.replace(path + ".tmp", path)
+    except OSError as e:
+        print(f"Warning: could not write {path} ({e})")
+    return manifest
+
+def run_manifest(run_dir):
+    # The run's manifest, or one built from its zips for runs saved before manifests existed
+    if not os.path.isdir(run_dir):
+        return None
+    return load_manifest(run_dir) or legacy_manifest(run_dir)
+
+def latest_checkpoint(run_dir):
+    # Newest checkpoint zip of a run (None if the run has no checkpoints)
+    manifest = run_manifest(run_dir)
+    if not manifest or not manifest['checkpoints']:
+        return None
+    entry = max(manifest['checkpoints'], key=lambda e: (e['step'], e['time']))
+    return os.path.join(run_dir, entry['path'])
+
+def best_checkpoint(run_dir):
+    manifest = run_manifest(run_dir)
+    if not manifest:
+        return None
+    rated = [e for e in manifest['checkpoints'] if e.get('reward') is not None]
+    if not rated:
+        return None
+    return os.path.join(run_dir, max(rated, key=lambda e: e['reward'])['path'])
+
+def latest_run(model_dir, pattern="PPO_*", exclude=None):
+    # Run directory with the most recently saved checkpoint (runs without checkpoints are ignored)
+    runs = []
+    for run_dir in glob.glob(os.path.join(model_dir, pattern)):
+        if exclude and os.path.abspath(run_dir) == os.path.abspath(exclude):
+            continue
+        manifest = run_manifest(run_dir)
+        if manifest and manifest['checkpoints']:
+            runs.append((max(e['time'] for e in manifest['checkpoints']), run_dir))
+    return max(runs)[1] if runs else None
+
+class CheckpointStore:
+    def __init__(self, run_dir, name_prefix="model", keep_last=3, keep_every=10, keep_best=True):
+        self.run_dir = run_dir
+        self.name_prefix = name_prefix
+        self.keep_last = keep_last
+        self.keep_every = keep_every
+        self.keep_best = keep_best
+        os.makedirs(run_dir, exist_ok=True)
+        self.manifest = load_manifest(run_dir) or {'checkpoints': [], 'count': 0}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpoint")
+        self._pending = []
+
+    @property
+    def busy(self):
+        self._pending = [f for f in self._pending if not f.done()]
+        return len(self._pending) > 0
+
+    def save(self, model, step, reward=None):
+        # Capture now, write in the background. Returns False (and saves nothing) if the previous
+        # write is still running, so a slow disk can't pile up cloned models in memory.
+        if self.busy:
+            return False
+        capture = capture_model(model)
+        self._pending.append(self._executor.submit(self._write, capture, step, reward))
+        return True
+
+    def _write(self, capture, step, reward):
+        name = f"{self.name_prefix}_{step}_steps.zip"
+        size = write_capture(os.path.join(self.run_dir, name), capture)
+        with self._lock:
+            self.manifest['count'] += 1
+            self.manifest['checkpoints'].append({
+                'step': step, 'path': name, 'size': size, 'reward': reward,
+                'time': time.time(), 'index': self.manifest['count']
+            })
+            self._apply_retention()
+            self._save_manifest()
+
+    def _apply_retention(self):
+        entries = sorted(self.manifest['checkpoints'], key=lambda e: e['step'])
+        keep = {id(e) for e in entries[-self.keep_last:]} if self.keep_last > 0 else set()
+        if self.keep_every > 0:
+            keep |= {id(e) for e in entries if e['index'] % self.keep_every == 0}
+        rated = [e for e in entries if e.get('reward') is not None]
+        if self.keep_best and rated:
+            keep.add(id(max(rated, key=lambda e: e['reward'])))
+        for e in entries:
+            if id(e) not in keep:
+                try:
+                    os.remove(os.path.join(self.run_dir, e['path']))
+                except FileNotFoundError:
+                    pass
+        self.manifest['checkpoints'] = [e for e in entries if id(e) in keep]
+
+    def _save_manifest(self):
+        path = manifest_path(self.run_dir)
+        with open(path + ".tmp", 'w') as f:
+            json.dump(self.manifest, f, indent=4)
+        os.replace(path + ".tmp", path)
+
+    def close(self):
+        # Wait for the last write (and surface its error, if any)
+        for f in self._pending:
+            f.result()
+        self._executor.shutdown()
+
+class CheckpointStoreCallback(BaseCallback):
+    def __init__(self, store, save_freq, verbose=0):
+        super(CheckpointStoreCallback, self).__init__(verbose)
+        self.store = store
+        self.save_freq = save_freq
+        self.skipped = 0
+
+    def _on_step(self) -> bool:
+        if self.n_calls % self.save_freq == 0:
+            buf = self.model.ep_info_buffer
+            reward = float(np.mean([ep['r'] for ep in buf])) if buf else None
+            if not self.store.save(self.model, self.num_timesteps, reward):
+                self.skipped += 1
+                self.logger.record("checkpoint/skipped", self.skipped)
+        return True
+
+    def _on_training_end(self) -> None:
+        self.store.close()
@@ -0,0 +1,157 @@
+import os
+import json
+import time
+
+import numpy as np
+
+# Human Demonstrations (behavioral cloning data)
+# main.py --record <dir> logs every human-driven robot as (observation, action) pairs: the same 48-dim
+# get_observation vector FrcEnv feeds the policy, and the 6-dim action (action_to_inputs layout) that
+# reproduces the keyboard input. Rows go into fixed-size chunk files written through np.memmap:
+#   <dir>/chunk_00000_obs.npy   float32 (chunk_rows, 48)
+#   <dir>/chunk_00000_act.npy   float32 (chunk_rows, 6)
+#   <dir>/index.json            {"obs_dim", "act_dim", "frames_per_step", "chunks": [{"name", "rows"}, ...]}
+# Only the first `rows` rows of a chunk are valid (the last chunk of a session is usually partial).
+# DemoDataset streams shuffled batches straight from the memmaps, so bc_pretrain.py never holds the
+# whole dataset in RAM.
+
+INDEX_NAME = "index.json"
+OBS_DIM = 48
+ACT_DIM = 6
+
+def load_index(data_dir):
+    try:
+        with open(os.path.join(data_dir, INDEX_NAME), 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def _save_index(data_dir, index):
+    path = os.path.join(data_dir, INDEX_NAME)
+    with open(path + ".tmp", 'w') as f:
+        json.dump(index, f, indent=4)
+    os.replace(path + ".tmp", path)
+
+def keyboard_action(keys, ctrl, robot, dumped=False):
+    # The action that makes Robot.update() do what this frame's keys do (same key priorities:
+    # down beats up, right beats left, rotate_l beats rotate_r). Toggles report the robot's state.
+    y = 1.0 if keys[ctrl['down']] else (-1.0 if keys[ctrl['up']] else 0.0)
+    x = 0.0
+    if robot.drivetrain == "swerve":
+        x = 1.0 if keys[ctrl['right']] else (-1.0 if keys[ctrl['left']] else 0.0)
+    rot = -1.0 if keys[ctrl['rotate_l']] else (1.0 if keys[ctrl['rotate_r']] else 0.0)
+    return np.array([
+        x, y, rot,
+        1.0 if robot.auto_shoot_enabled else -1.0,
+        1.0 if robot.auto_pass_enabled else -1.0,
+        1.0 if dumped else -1.0
+    ], dtype=np.float32)
+
+class DemoRecorder:
+    """
+    Appends (obs, action) rows to memmapped chunk files. One row per human robot every
+    `frames_per_step` frames, i.e. at the rate the policy acts in FrcEnv.
+    """
+    def __init__(self, data_dir, frames_per_step=10, chunk_rows=4096):
+        self.data_dir = data_dir
+        self.frames_per_step = frames_per_step
+        self.chunk_rows = chunk_rows
+        os.makedirs(data_dir, exist_ok=True)
+        self.index = load_index(data_dir) or {'obs_dim': OBS_DIM, 'act_dim': ACT_DIM,
+                                               'frames_per_step': frames_per_step, 'chunks': []}
+        if self.index['frames_per_step'] != frames_per_step:
+            print(f"Warning: {data_dir} was recorded at frames_per_step={self.index['frames_per_step']}, now {frames_per_step}.")
+        self.frame = 0
+        self.total_rows = 0
+        self._obs = self._act = None
+        self._entry = None
+
+    def due(self):
+        # Call once per simulated frame; True on the frames that get recorded
+        due = self.frame % self.frames_per_step == 0
+        self.frame += 1
+        return due
+
+    def _open_chunk(self):
+        name = f"chunk_{len(self.index['chunks']):05d}"
+        base = os.path.join(self.data_dir, name)
+        self._obs = np.lib.format.open_memmap(base + "_obs.npy", mode='w+', dtype=np.float32, shape=(self.chunk_rows, OBS_DIM))
+        self._act = np.lib.format.open_memmap(base + "_act.npy", mode='w+', dtype=np.float32, shape=(self.chunk_rows, ACT_DIM))
+        self._entry = {'name': name, 'rows': 0, 'created': time.time()}
+        self.index['chunks'].append(self._entry)
+
+    def add(self, obs, action):
+        if self._entry is None or self._entry['rows'] == self.chunk_rows:
+            self._close_chunk()
+            self._open_chunk()
+        row = self._entry['rows']
+        self._obs[row] = obs
+        self._act[row] = action
+        self._entry['rows'] = row + 1
+        self.total_rows += 1
+
+    def _close_chunk(self):
+        if self._entry is None:
+            return
+        self._obs.flush()
+        self._act.flush()
+        self._obs = self._act = None
+        self._entry = None
+        _save_index(self.data_dir, self.index)
+
+    def end_match(self):
+        # Make everything recorded so far visible to readers (the chunk stays open)
+        self.frame = 0
+        if self._entry is not None:
+            self._obs.flush()
+            self._act.flush()
+            _save_index(self.data_dir, self.index)
+
+    def close(self):
+        self._close_chunk()
+
+class DemoDataset:
+    """
+    Streams (obs, action) batches from one or more recording directories. Chunks are memory-mapped
+    read-only; each epoch visits the chunks in random order and shuffles rows within a window of
+    `shuffle_chunks` chunks, so memory use is a few chunks no matter how large the dataset is.
+    """
+    def __init__(self, data_dirs, chunks=None):
+        # chunks: optional explicit [(dir, entry)] list (used for train/validation splits)
+        if chunks is None:
+            chunks = []
+            for data_dir in data_dirs:
+                index = load_index(data_dir)
+                if index is None:
+                    raise FileNotFoundError(f"No {INDEX_NAME} in {data_dir} (record with: python main.py --record {data_dir})")
+                chunks += [(data_dir, entry) for entry in index['chunks'] if entry['rows'] > 0]
+        self.chunks = chunks
+
+    def __len__(self):
+        return sum(entry['rows'] for _, entry in self.chunks)
+
+    def split(self, val_chunks):
+        # Hold out the last val_chunks chunks (the most recent play) for validation
+        if val_chunks <= 0 or val_chunks >= len(self.chunks):
+            return self, None
+        return DemoDataset(None, self.chunks[:-val_chunks]), DemoDataset(None, self.chunks[-val_chunks:])
+
+    def _load(self, data_dir, entry):
+        base = os.path.join(data_dir, entry['name'])
+        rows = entry['rows']
+        obs = np.load(base + "_obs.npy", mmap_mode='r')[:rows]
+        act = np.load(base + "_act.npy", mmap_mode='r')[:rows]
+        return obs, act
+
+    def iter_batches(self, batch_size, rng=None, shuffle=True, shuffle_chunks=4):
+        order = rng.permutation(len(self.chunks)) if shuffle else np.arange(len(self.chunks))
+        window = shuffle_chunks if shuffle else 1
+        for start in range(0, len(order), window):
+            # Only this window's rows are copied out of the memmaps
+            parts = [self._load(*self.chunks[i]) for i in order[start:start + window]]
+            obs = np.concatenate([p[0] for p in parts])
+            act = np.concatenate([p[1] for p in parts])
+            rows = rng.permutation(len(obs)) if shuffle else np.arange(len(obs))
+            for b in range(0, len(rows), batch_size):
+                idx = rows[b:b + batch_size]
+                yield obs[idx], act[idx]
@@ -60,6 +60,24 @@ class Field:
             {'x': self.width_in - self.divider_x, 'y': center_y, 'r': 18}
         ]
 
+        # Pre-rendered static layers, one per hub light state (None / "red" / "blue" / "both")
+        self._backgrounds = {}
+
+    def get_background(self, active_alliance=None, target=None):
+        # Everything draw() paints is static apart from the hub glow, so render each variant once and blit it.
+        # target: surface the background will be blitted to (its pixel format is used for fast blits)
+        bg = self._backgrounds.get(active_alliance)
+        if bg is None:
+            bg = pygame.Surface((int(self.width_in * self.ppi), int(self.length_in * self.ppi)))
+            bg.fill((30, 30, 30))
+            self.draw(bg, active_alliance)
+            if target is not None:
+                bg = bg.convert(target)
+            elif pygame.display.get_surface() is not None:
+                bg = bg.convert()
+            self._backgrounds[active_alliance] = bg
+        return bg
+
     def draw(self, screen, active_alliance=None):
         ppi = self.ppi
         
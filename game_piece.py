@@ -1,6 +1,13 @@
 import pygame
 import random
 import math
+import numpy as np
+
+# Column layout of the fuel state array used by GamePieceManager.get_state()/load_fuel()
+FUEL_COLUMNS = ('x', 'y', 'vel_x', 'vel_y', 'immune_timer', 'bounces', 'airborne_timer')
+FUEL_SOURCES = ('scatter', 'depot', 'recycled', 'pass', 'outpost', 'dump', 'lab')
+# Sprite colors by draw state: on the ground, can't be collected yet (immune_timer), in the air (airborne_timer)
+FUEL_COLORS = {'ground': (255, 255, 0), 'immune': (190, 190, 0), 'airborne': (255, 255, 170)}
 
 class Fuel:
     def __init__(self, x, y, ppi, source="scatter"):
@@ -26,6 +33,7 @@ class GamePieceManager:
         self.fuels = []
         self.outpost_released = False
         self.penalties = [] # List of (alliance, amount)
+        self.foul_robots = [] # Robot behind each entry in penalties (same order)
         self.stashed_red = 0
         self.stashed_blue = 0
         self.dump_queue = []
@@ -45,13 +53,89 @@ class GamePieceManager:
         # AI Awareness: Global Densities
         self.grid_counts = {} # (gx, gy) -> fuel count
         
+        # Spare Fuel objects reused by load_fuel() instead of constructing new ones
+        self.fuel_pool = []
+
+        # Pre-rasterized fuel sprites (one per FUEL_COLORS state), built on the first draw()
+        self._sprites = None
+        
     def reset(self, config):
         self.fuels = []
         self.outpost_released = False
         self.penalties = []
+        self.foul_robots = []
         self.dump_queue = []
         self.spawn_initial(config)
 
+    def get_state(self):
+        # Compact, picklable copy of all dynamic piece state (fuel as one float array + source codes)
+        fuels = [f for f in self.fuels if not f.collected]
+        data = np.array([[f.x, f.y, f.vel_x, f.vel_y, f.immune_timer, f.bounces, f.airborne_timer] for f in fuels],
+                        dtype=np.float64).reshape(-1, len(FUEL_COLUMNS))
+        sources = np.array([FUEL_SOURCES.index(f.source) if f.source in FUEL_SOURCES else 0 for f in fuels], dtype=np.int8)
+        return {
+            'fuel': data,
+            'fuel_source': sources,
+            'outpost_released': self.outpost_released,
+            'stashed_red': self.stashed_red,
+            'stashed_blue': self.stashed_blue,
+            'dump_queue': list(self.dump_queue),
+            'bounciness': self.bounciness,
+            'friction': self.friction
+        }
+
+    def set_state(self, state):
+        self.load_fuel(state['fuel'], state['fuel_source'])
+        self.outpost_released = state['outpost_released']
+        self.stashed_red = state['stashed_red']
+        self.stashed_blue = state['stashed_blue']
+        self.dump_queue = list(state['dump_queue'])
+        self.bounciness = state['bounciness']
+        self.friction = state['friction']
+        self.penalties = []
+        self.foul_robots = []
+
+    def load_fuel(self, data, sources=None, source="scatter"):
+        # Replace all fuel with the rows of `data` (FUEL_COLUMNS layout, or just x/y columns).
+        # Existing Fuel objects are recycled so bulk loads don't allocate per ball.
+        n = len(data)
+        pool = self.fuels + self.fuel_pool
+        while len(pool) < n:
+            pool.append(Fuel(0, 0, self.ppi, source))
+        fuels, self.fuel_pool = pool[:n], pool[n:]
+        
+        cols = np.asarray(data, dtype=np.float64).reshape(n, -1).T
+        xs, ys = cols[0].tolist(), cols[1].tolist()
+        full = len(cols) >= len(FUEL_COLUMNS)
+        if full:
+            vxs, vys, immune, bounces, airborne = cols[2].tolist(), cols[3].tolist(), cols[4].tolist(), cols[5].astype(int).tolist(), cols[6].tolist()
+        names = [FUEL_SOURCES[i] for i in sources.tolist()] if sources is not None else None
+        
+        for i, f in enumerate(fuels):
+            f.x, f.y = xs[i], ys[i]
+            f.collected = False
+            f.source = names[i] if names else source
+            if full:
+                f.vel_x, f.vel_y = vxs[i], vys[i]
+                f.immune_timer, f.bounces, f.airborne_timer = immune[i], bounces[i], airborne[i]
+            else:
+                # Settled, safe-to-collect fuel (e.g. lab piles)
+                f.vel_x = f.vel_y = 0
+                f.immune_timer = 0
+                f.bounces = 1
+                f.airborne_timer = 0
+        self.fuels = fuels
+
+    def load_layout(self, positions, source="lab"):
+        # Fresh start from an (n, 2) array of resting fuel positions (scenario banks)
+        self.load_fuel(positions, source=source)
+        self.outpost_released = False
+        self.penalties = []
+        self.foul_robots = []
+        self.dump_queue = []
+        self.stashed_red = 0
+        self.stashed_blue = 0
+
     def spawn_initial(self, config):
         field_w = config['field']['width_inches']
         field_h = config['field']['length_inches']
@@ -161,13 +245,10 @@ class GamePieceManager:
     def spawn_dump(self, x, y):
         self.dump_queue.append((x, y))
             
-    def update(self, robots, game_time, config, disable_outposts=False):
+    def update(self, robots, game_time, config):
+        # The outposts are released by the match clock (Simulation), not checked here every frame
         dt = 1/60 
-        dump_time = config['field'].get('outpost_dump_time', 30.0)
         p_val = config['field'].get('hub_penalty_value', 5)
-        
-        if not disable_outposts and game_time > dump_time and not self.outpost_released:
-            self.release_outpost(config)
 
         # Handle Dump Queue
         while self.dump_queue:
@@ -183,6 +264,7 @@ class GamePieceManager:
             self.fuels.append(f)
 
         self.penalties = [] # Clear penalties each frame (or handle them in main)
+        self.foul_robots = []
         self.stashed_red = 0
         self.stashed_blue = 0
 
@@ -277,6 +359,7 @@ class GamePieceManager:
                         if fuel.bounces == 0:
                             v = config.get('hub_penalty_value', 15)
                             self.penalties.append((robot.alliance, v))
+                            self.foul_robots.append(robot)
                             robot.penalty_timer = 2.0
                         break
                     
@@ -299,6 +382,29 @@ class GamePieceManager:
                         
         self.fuels = [f for f in self.fuels if not f.collected]
                         
+    def get_sprites(self, target=None):
+        # -> ({state: sprite}, offset). Blitting a sprite at (int(x * ppi) - offset, int(y * ppi) - offset)
+        # gives the same pixels as Fuel.draw's circle. target: surface they will be blitted to (pixel format)
+        if self._sprites is None:
+            r = int(Fuel(0, 0, self.ppi).radius * self.ppi)
+            sprites = {}
+            for state, color in FUEL_COLORS.items():
+                sprite = pygame.Surface((2 * r + 1, 2 * r + 1))
+                sprite.fill((0, 0, 0))
+                pygame.draw.circle(sprite, color, (r, r), r)
+                sprite.set_colorkey((0, 0, 0), pygame.RLEACCEL)
+                if target is not None:
+                    sprite = sprite.convert(target)
+                elif pygame.display.get_surface() is not None:
+                    sprite = sprite.convert()
+                sprites[state] = sprite
+            self._sprites = (sprites, r)
+        return self._sprites
+
     def draw(self, screen):
-        for fuel in self.fuels:
-            fuel.draw(screen, self.ppi)
+        # One blits() batch for all fuel instead of a draw.circle call per ball
+        sprites, r = self.get_sprites(screen)
+        ground, immune, airborne = sprites['ground'], sprites['immune'], sprites['airborne']
+        ppi = self.ppi
+        screen.blits([(airborne if f.airborne_timer > 0 and f.bounces == 0 else (immune if f.immune_timer > 0 else ground),
+                       (int(f.x * ppi) - r, int(f.y * ppi) - r)) for f in self.fuels if not f.collected], False)
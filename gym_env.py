@@ -3,6 +3,7 @@ from gymnasium import spaces
 import numpy as np
 import json
 import os
+import random
 import pygame
 
 # Import simulation components
@@ -10,9 +11,29 @@ from robot import Robot
 from field import Field
 from game_piece import GamePieceManager
 from ai import RobotAI
+from perf import make_profiler, profiling_config
+from rewards import RewardEngine, StepContext
+from ml_utils import get_observation, action_to_inputs
+from simulation import Simulation
+import sim_state
+
+def _sim_attr(name):
+    # World/clock attributes live on the env's Simulation (self.sim)
+    return property(lambda self: getattr(self.sim, name), lambda self, value: setattr(self.sim, name, value))
 
 class FrcEnv(gym.Env):
     metadata = {"render_modes": ["human", "rgb_array"], "render_fps": 60}
+    # Reward components enabled on top of the ml_config reward_shaping terms (see rewards.py)
+    extra_reward_components = ()
+
+    field = _sim_attr('field')
+    pieces = _sim_attr('pieces')
+    robots = _sim_attr('robots')
+    robot_ais = _sim_attr('robot_ais')
+    # Setting the time moves the match clock (snapshot restores)
+    game_time = property(lambda self: self.sim.game_time, lambda self, value: self.sim.seek(value))
+    match_duration = _sim_attr('match_duration')
+    disable_outposts = _sim_attr('disable_outposts')
 
     def __init__(self, render_mode=None, config_path="config.json", ml_config_path="ml_config.json"):
         super(FrcEnv, self).__init__()
@@ -27,6 +48,11 @@ class FrcEnv(gym.Env):
         self.fps = 60
         self.dt = 1.0 / self.fps
         self.frames_per_step = self.ml_config['env_params']['frames_per_step']
+        # Subsystem timers (config.json "profiling"); a no-op profiler when disabled
+        self.profiler = make_profiler(profiling_config(self.sim_config).get('enabled', False))
+        # Training uses the fixed red/blue/red/blue stage order; enforce_phases: false opens both hubs all match
+        phase_rule = "fixed" if self.ml_config['env_params'].get('enforce_phases', True) else "open"
+        self.sim = Simulation(self.sim_config, phase_rule=phase_rule, dt=self.dt, profiler=self.profiler)
         
         # Define Action Space: [vx, vy, vrot, shoot_toggle, pass_toggle, dump_toggle]
         # vx, vy, vrot are continuous (-1 to 1)
@@ -43,53 +69,58 @@ class FrcEnv(gym.Env):
         # Total: 6 + 20 + 16 + 2 + 4 = 48
         self.observation_space = spaces.Box(low=-1, high=1, shape=(48,), dtype=np.float32)
 
-        self.field = None
-        self.pieces = None
-        self.robots = []
         self.controlled_robot = None
-        self.game_time = 0
-        self.match_duration = 160
         self.screen = None
         self.clock = None
+        self._frame = None # Reused rgb_array frame buffer
+        
+        # Mid-match start states (start_states.py), sampled on reset with probability start_state_prob
+        ss_cfg = self.ml_config['env_params'].get('start_states', {})
+        self.start_state_prob = ss_cfg.get('prob', 0.0)
+        self.start_states = None
+        if self.start_state_prob > 0 and ss_cfg.get('path') and os.path.exists(ss_cfg['path']):
+            from start_states import StartStateBuffer
+            self.start_states = StartStateBuffer.load(ss_cfg['path'], self.sim_config,
+                                                      ss_cfg.get('phase_weights'), ss_cfg.get('situation_weights'))
+        
+        # Self-play opponents (opponent_pool.py): a frozen policy sampled per episode drives the
+        # opponent robots instead of RobotAI (None = heuristic)
+        sp_cfg = self.ml_config['env_params'].get('self_play', {})
+        self.opponent_pool = None
+        self.opponent = None
+        if sp_cfg.get('enabled', False):
+            from opponent_pool import OpponentPool
+            self.opponent_pool = OpponentPool(sp_cfg.get('pool_dir', os.path.join("ml_models", "opponent_pool")),
+                                              sp_cfg.get('pfsp_power', 2.0), sp_cfg.get('heuristic_prob', 0.2))
         
         # For Reward calculation
-        self.last_score = 0
-        self.last_holding = 0
+        self.reward_engine = RewardEngine(self.ml_config['reward_shaping'], self.extra_reward_components)
+        self.ep_rewards = {}
         self.total_reward = 0
-        self.disable_outposts = False
+
+    @property
+    def match_scores(self):
+        # Alliance points (fuel scored in an active phase + opponent fouls), decides the self-play result
+        return self.sim.totals()
 
     def _get_can_score(self, alliance):
-        # Global override for "Total Freedom" baseline training (can be overridden by subclass)
-        if not self.ml_config['env_params'].get('enforce_phases', True):
-            return True
-
-        # Mirroring main.py state machine (simplified for 1v1 Red training)
-        if 0 <= self.game_time < 30: 
-            return True # AUTO + TRANSITION
-        elif 30 <= self.game_time < 130:
-            stage_idx = int((self.game_time - 30) // 25)
-            # Default [red, blue, red, blue]
-            stage_alliances = ["red", "blue", "red", "blue"]
-            return stage_alliances[stage_idx] == alliance
-        elif 130 <= self.game_time < 160: 
-            return True # ENDGAME
-        return False
-
-    def _get_obs(self):
+        return self.sim.can_score(alliance)
+
+    def _get_obs(self, ctx=None):
         from ml_utils import get_observation
-        return get_observation(
-            self.controlled_robot, 
-            self.field, 
-            self.pieces, 
-            self.sim_config, 
-            self.game_time, 
-            self.match_duration
-        )
+        with self.profiler.timer("observation"):
+            return get_observation(
+                self.controlled_robot, 
+                self.field, 
+                self.pieces, 
+                self.sim_config, 
+                self.game_time, 
+                self.match_duration,
+                sorted_fuels=ctx.sorted_fuels if ctx is not None else None
+            )
 
-    def reset(self, seed=None, options=None):
-        super().reset(seed=seed)
-        
-        # Re-initialize simulation
+    def _build_world(self):
+        # Field, pieces, robots and AIs are built once; later resets copy the cached start state back in
         ppi = self.sim_config['field']['pixels_per_inch']
         self.field = Field(self.sim_config['field'])
         self.pieces = GamePieceManager(self.sim_config, ppi)
@@ -109,222 +140,172 @@ class FrcEnv(gym.Env):
         blue_bot = Robot(self.sim_config['field']['width_inches'] - 100, self.sim_config['field']['length_inches']/2, b_cfg, "blue")
         self.robots.append(blue_bot)
         self.robot_ais[blue_bot] = RobotAI("blue", b_cfg.get('drivetrain') == "tank")
-
-        self.game_time = 0
-        self.last_score = 0
-        self.last_holding = 0
-        self.total_reward = 0
-        self.total_scored = 0
-        self.last_can_score = True
-        self.last_min_dist = 999.0
-        self.last_hub_dist = 999.0
-        self.last_robot_x = self.controlled_robot.x
-        self.last_stashed_count = 0
-        self.ep_rewards = {
-            'rew_score': 0.0,
-            'rew_pickup': 0.0,
-            'rew_proximity': 0.0,
-            'rew_hub_proximity': 0.0,
-            'rew_stashing': 0.0,
-            'rew_time': 0.0,
-            'rew_steer': 0.0,
-            'rew_dump': 0.0
-        }
         
-        return self._get_obs(), {}
+        # Subclasses may drop robots from self.robots; all_robots keeps every object for restores
+        self.all_robots = list(self.robots)
+        self.start_state = sim_state.capture_world(0, self.pieces, self.robots, self.robot_ais)
 
-    def step(self, action):
-        reward = 0
-        terminated = False
-        truncated = False
-        
-        # Map actions to robot inputs (States, not Toggles)
-        ai_inputs = {
-            'x': action[0],
-            'y': action[1],
-            'rot': action[2],
-            'shoot_state': action[3] > 0.5,
-            'pass_state': action[4] > 0.5,
-            'dump_state': action[5] > 0.5
-        }
-
-        scored_this_step = 0
-        pickups_this_step = 0
-        fouls_this_step = 0
-        dumped_this_step = 0
-        passed_this_step = 0
-        dist_traveled = 0
-        last_pos = (self.controlled_robot.x, self.controlled_robot.y)
+    def reset(self, seed=None, options=None):
+        super().reset(seed=seed)
         
-        for _ in range(self.frames_per_step):
-            # Match Phase Scoring Check (respects internal state and config)
-            can_score_red = self._get_can_score("red")
-            can_score_blue = self._get_can_score("blue")
-            
-            # Update controlled robot
-            dummy_keys = [False] * 512
-            dummy_ctrl = {'up':0,'down':0,'left':0,'right':0,'rotate_l':0,'rotate_r':0,'shoot_key':0,'pass_key':0,'dump_key':0}
-            
-            # Check for score and dump
-            # Check for score, dump, and pass
-            res = self.controlled_robot.update(self.dt, dummy_keys, dummy_ctrl, self.field, self.game_time, self.robots, self.pieces, can_score_red, ai_inputs)
-            if isinstance(res, dict):
-                scored_this_step += res['scored']
-                self.total_scored += res['scored']
-                dumped_this_step += res['dumped']
-                passed_this_step += res['passed']
-                if res['scored'] > 0:
-                    self.pieces.recycle_fuel(self.controlled_robot, self.sim_config['field'])
-            
-            # Update other robots (using heuristic AI)
+        if self.field is None:
+            self._build_world()
+        else:
+            # Fast path: restore the kick-off state into the existing objects
+            self.robots = list(self.all_robots)
+            self.controlled_robot = self.robots[0]
+            sim_state.apply_world(self.start_state, self.pieces, self.robots, self.robot_ais)
             for robot in self.robots:
-                if robot != self.controlled_robot:
-                    can_score_other = can_score_red if robot.alliance == "red" else can_score_blue
-                    other_ai_inputs = None
-                    if robot in self.robot_ais:
-                        other_ai_inputs = self.robot_ais[robot].update(
-                            robot, self.field, self.pieces, can_score_other, self.robots, 
-                            self.game_time, self.match_duration, self.sim_config
-                        )
-                    other_res = robot.update(self.dt, dummy_keys, dummy_ctrl, self.field, self.game_time, self.robots, self.pieces, can_score_other, other_ai_inputs)
-                    if isinstance(other_res, dict) and other_res.get('scored'):
-                        self.pieces.recycle_fuel(robot, self.sim_config['field'])
-            
-            self.pieces.update(self.robots, self.game_time, self.sim_config, disable_outposts=self.disable_outposts)
-            
-            if self.render_mode == "human":
-                self.render()
-            
-            # Check for penalties (fouls)
-            for foul_alliance, amount in self.pieces.penalties:
-                if foul_alliance == self.controlled_robot.alliance:
-                    fouls_this_step += 1
-            
-            self.game_time += self.dt
-            self.last_can_score = can_score_red
-            
-            # Track movement for holding reward
-            curr_pos = (self.controlled_robot.x, self.controlled_robot.y)
-            dist_traveled += ((curr_pos[0]-last_pos[0])**2 + (curr_pos[1]-last_pos[1])**2)**0.5
-            last_pos = curr_pos
-
-            if self.game_time >= self.match_duration:
-                terminated = True
-                break
+                robot.ai_tick_timer = random.uniform(0, 1.0/robot.ai_update_rate) # Desync robots (as in Robot.__init__)
 
-        # Calculate Reward
-        rew_cfg = self.ml_config['reward_shaping']
-        
-        rew_score = scored_this_step * rew_cfg['score_reward']
-        rew_dump = dumped_this_step * rew_cfg.get('dump_penalty', 0)
-        
-        # Pickup reward: check if holding increased
-        current_holding = self.controlled_robot.holding
-        # Net change = change in holding + (scores + passes + dumps) 
-        # (prevents penalty for losing holding during intentional actions)
-        rew_pickup = (current_holding - self.last_holding + scored_this_step + passed_this_step + dumped_this_step) * rew_cfg['pickup_reward']
-        self.last_holding = current_holding
+        self._reset_episode()
         
-        # Hub proximity vs Stashing Reward
-        rew_hub_proxim = 0.0
-        rew_stashing = 0.0
-        if current_holding > 0 or scored_this_step > 0 or passed_this_step > 0 or dumped_this_step > 0:
-            own_hub = self.field.hubs[0] if self.controlled_robot.alliance == "red" else self.field.hubs[1]
-            dist_to_hub = ((own_hub['x'] - self.controlled_robot.x)**2 + (own_hub['y'] - self.controlled_robot.y)**2)**0.5
-            
-            if self.last_can_score:
-                # Delta hub distance
-                hub_delta = self.last_hub_dist - dist_to_hub
-                if abs(hub_delta) < 50:
-                    # DEPRECATED: One-Way rewards were exploitable for 'wiggling'
-                    # We now rely on completion (score) and time penalty (hustle)
-                    rew_hub_proxim = 0.0
-            else:
-                # Goal Line Stashing Reward (1-foot buffer past divider)
-                is_red = self.controlled_robot.alliance == "red"
-                field_cfg = self.sim_config['field']
-                
-                # The "Goal Line" is 12 inches inside the alliance zone to clear bumps/trench
-                if is_red:
-                    goal_line_x = field_cfg['divider_x'] - 12
-                    dist_to_line = max(0, self.controlled_robot.x - goal_line_x)
-                    last_dist_to_line = max(0, self.last_robot_x - goal_line_x)
-                else:
-                    goal_line_x = (field_cfg['width_inches'] - field_cfg['divider_x']) + 12
-                    dist_to_line = max(0, goal_line_x - self.controlled_robot.x)
-                    last_dist_to_line = max(0, goal_line_x - self.last_robot_x)
-
-                # One-Way: Only reward getting closer to the goal line, don't penalize hunting trips
-                progress = max(0, last_dist_to_line - dist_to_line)
-                shuttle_factor = rew_cfg.get('stashing_reward_factor', 0)
-                
-                # Formula: (Carrying Progress) + (Bonus per ball that JUST crossed) + (Pulse / Trigger bonus)
-                stashed_count = self.pieces.stashed_red if is_red else self.pieces.stashed_blue
-                stashed_delta = stashed_count - self.last_stashed_count
-                self.last_stashed_count = stashed_count
-                
-                # Formula: (Bonus per ball that JUST crossed) + (Pulse / Trigger bonus)
-                # DEPRECATED: progress component removed to prevent 'inching' exploits
-                trigger_bonus = (passed_this_step + dumped_this_step) * 10.0
-                
-                rew_stashing = (stashed_delta * 200.0) + trigger_bonus
-                
-                # Penalty for 'lazy dumping' in the Neutral Zone (Lobber only)
-                # We check mode for SpecializedFrcEnv, or just if it's not a Hub Scorer
-                if dumped_this_step and not self.last_can_score:
-                    if (is_red and self.controlled_robot.x > field_cfg['divider_x']) or \
-                       (not is_red and self.controlled_robot.x < field_cfg['divider_x']):
-                        rew_stashing -= 20.0 # Heavier penalty for dumping on the wrong side
-                
-                if passed_this_step:
-                    rew_stashing += 2.0
-            
-            self.last_robot_x = self.controlled_robot.x
-            self.last_hub_dist = dist_to_hub
-        else:
-            self.last_robot_x = self.controlled_robot.x
-            self.last_hub_dist = 999.0
+        snap = options.get('snapshot') if options else None
+        if snap is None and self.start_states is not None and self.np_random.random() < self.start_state_prob:
+            # Curriculum: begin some episodes from recorded mid-match states
+            snap = self.start_states.sample(self.np_random)
+        if snap is not None:
+            # Start the episode from a recorded mid-match state
+            self.restore(snap, restore_rng=False)
         
-        # Proximity reward (encouragement to move toward fuel)
-        rew_proxim = 0.0
-        if self.controlled_robot.holding < self.controlled_robot.capacity:
-            min_dist = 9999
-            for fuel in self.pieces.fuels:
-                if not fuel.collected:
-                    d = ((fuel.x - self.controlled_robot.x)**2 + (fuel.y - self.controlled_robot.y)**2)**0.5
-                    if d < min_dist: min_dist = d
-            
-            if min_dist < 999:
-                dist_delta = self.last_min_dist - min_dist
-                if abs(dist_delta) < 100:
-                    rew_proxim = dist_delta * rew_cfg['proximity_reward_factor']
-            self.last_min_dist = min_dist
+        return self._get_obs(), {}
+
+    def _reset_episode(self):
+        # Match clock and scoreboard, episode counters and reward trackers
+        self.sim.reset()
+        self.total_reward = 0
+        self.total_scored = 0
+        self.total_stashed = 0
+        self.last_can_score = True
+        if self.opponent_pool is not None:
+            self.opponent = self.opponent_pool.sample(self.np_random)
+        # Per-term episode totals, accumulated by the reward engine
+        self.ep_rewards = self.reward_engine.reset(self)
+
+    def set_reward_weights(self, rew_cfg):
+        # Live reward_shaping update (population-based training); episode totals keep accumulating
+        self.ml_config['reward_shaping'] = dict(rew_cfg)
+        self.reward_engine.set_weights(rew_cfg)
+
+    def snapshot(self):
+        # Full, picklable sim state (see sim_state.py): fuel, robots, AIs, time, reward trackers and RNGs
+        snap = sim_state.capture_world(self.game_time, self.pieces, self.robots, self.robot_ais)
+        snap.update({
+            'robot_ids': [self.all_robots.index(r) for r in self.robots],
+            'controlled_index': self.robots.index(self.controlled_robot),
+            'match_duration': self.match_duration,
+            'total_reward': self.total_reward,
+            'total_scored': self.total_scored,
+            'total_stashed': self.total_stashed,
+            'last_can_score': self.last_can_score,
+            'match_scores': self.match_scores,
+            'sim': self.sim.get_state(),
+            'rewards': self.reward_engine.get_state(),
+            'rng': dict(sim_state.capture_rng(), env=self.np_random.bit_generator.state)
+        })
+        return snap
+
+    def restore(self, snap, restore_rng=True):
+        # Copy a snapshot() back into the live objects (no Field/GamePieceManager/Robot rebuilds).
+        # Plain world captures (e.g. recorded from headless 1v1 matches) only carry the sim state;
+        # the env-side fields then keep their fresh-episode values.
+        if self.field is None:
+            self._build_world()
+        self.robots = [self.all_robots[i] for i in snap.get('robot_ids', range(len(snap['robots'])))]
+        self.controlled_robot = self.robots[snap.get('controlled_index', 0)]
+        self.game_time = sim_state.apply_world(snap, self.pieces, self.robots, self.robot_ais)
+        self.match_duration = snap.get('match_duration', self.match_duration)
+        self.total_reward = snap.get('total_reward', 0)
+        self.total_scored = snap.get('total_scored', 0)
+        self.total_stashed = snap.get('total_stashed', 0)
+        self.last_can_score = snap.get('last_can_score', self._get_can_score(self.controlled_robot.alliance))
+        # Older snapshots only carry the alliance totals
+        self.sim.set_state(snap.get('sim', {'scores': snap.get('match_scores', {"red": 0, "blue": 0})}))
+        if 'rewards' in snap:
+            self.reward_engine.set_state(snap['rewards'])
         else:
-            self.last_min_dist = 999.0
+            self.ep_rewards = self.reward_engine.reset(self)
+        if restore_rng and 'rng' in snap:
+            sim_state.restore_rng(snap['rng'])
+            self.np_random.bit_generator.state = snap['rng']['env']
 
-        rew_time = rew_cfg.get('time_penalty_per_step', 0)
-        rew_steer = abs(action[2]) * rew_cfg.get('steering_penalty_factor', 0)
+    def _opponent_robots(self):
+        # Robots the self-play opponent policy drives (the AI robots on the other alliance)
+        return [r for r in self.robots if r in self.robot_ais and r.alliance != self.controlled_robot.alliance]
 
-        step_reward = rew_score + rew_dump + rew_pickup + rew_hub_proxim + rew_stashing + rew_proxim + rew_time + rew_steer
-        
-        # Accumulate for breakdown
-        self.ep_rewards['rew_score'] += rew_score
-        self.ep_rewards['rew_pickup'] += rew_pickup
-        self.ep_rewards['rew_proximity'] += rew_proxim
-        self.ep_rewards['rew_hub_proximity'] += rew_hub_proxim
-        self.ep_rewards['rew_stashing'] += rew_stashing
-        self.ep_rewards['rew_time'] += rew_time
-        self.ep_rewards['rew_steer'] += rew_steer
-        self.ep_rewards['rew_dump'] += rew_dump
+    def _get_opponent_inputs(self):
+        # {robot: inputs} for every opponent robot from one batched forward pass (empty = heuristic AI)
+        if self.opponent is None:
+            return {}
+        robots = self._opponent_robots()
+        if not robots:
+            return {}
+        with self.profiler.timer("opponent_policy"):
+            obs = np.stack([get_observation(r, self.field, self.pieces, self.sim_config, self.game_time, self.match_duration)
+                            for r in robots])
+            actions = self.opponent(obs)
+        return {r: action_to_inputs(a) for r, a in zip(robots, actions)}
+
+    def _match_result(self, alliance):
+        # 1.0 win / 0.5 draw / 0.0 loss for `alliance`
+        other = "blue" if alliance == "red" else "red"
+        ours, theirs = self.match_scores[alliance], self.match_scores[other]
+        return 1.0 if ours > theirs else (0.5 if ours == theirs else 0.0)
+
+    def step(self, action):
+        truncated = False
+        robot = self.controlled_robot
+
+        # Map actions to robot inputs (States, not Toggles); self-play opponents act once per step
+        # too (one batched forward pass), the rest run the heuristic AI
+        inputs = self._get_opponent_inputs()
+        inputs[robot] = action_to_inputs(action)
+        self.sim.step(self.frames_per_step, inputs, on_frame=self._render_frame if self.render_mode == "human" else None)
+        terminated = self.sim.finished
+
+        events = self.sim.counters[robot]
+        self.total_scored += events.scored
+        self.last_can_score = self.sim.last_can_score[robot.alliance]
+
+        # Calculate Reward (components registered in rewards.py, one per reward_shaping term)
+        ctx = StepContext(
+            robot, self.field, self.pieces, self.sim_config,
+            action=action,
+            can_score=self.last_can_score,
+            scored=events.scored,
+            passed=events.passed,
+            dumped=events.dumped,
+            fouls=events.fouls,
+            dist_traveled=events.dist,
+            stashed_red=self.sim.step_stashed["red"],
+            stashed_blue=self.sim.step_stashed["blue"],
+            env=self
+        )
+        with self.profiler.timer("reward"):
+            step_reward = self.reward_engine.compute(ctx)
         
         self.total_reward += step_reward
+        self.total_stashed += ctx.stashed_delta
         
         info = { 'scored': self.total_scored }
         if terminated or truncated:
             # At the end of episode, pass the full breakdown
             info.update(self.ep_rewards)
+            # Fuel stashed into our zone (independent of the reward weights, e.g. the lobber PBT fitness)
+            info['stashed'] = self.total_stashed
+            if self.opponent_pool is not None:
+                # Reported back to the pool by the training callback (win-rate prioritized sampling)
+                info['opponent'] = self.opponent.name if self.opponent is not None else "heuristic"
+                info['result'] = self._match_result(self.controlled_robot.alliance)
+            # Per-episode subsystem timings (mean ms per call), logged under perf/ in TensorBoard
+            info.update(self.profiler.scalars())
+            self.profiler.reset()
             
-        return self._get_obs(), step_reward, terminated, truncated, info
+        return self._get_obs(ctx), step_reward, terminated, truncated, info
+
+    def _render_frame(self, sim):
+        with self.profiler.timer("render"):
+            self.render()
 
     def render(self):
         if self.render_mode is None:
@@ -338,17 +319,18 @@ class FrcEnv(gym.Env):
             if self.render_mode == "human":
                 self.screen = pygame.display.set_mode((w, h))
             else:
-                self.screen = pygame.Surface((w, h))
+                # 24-bit with R,G,B byte order: rows of pixels3d are then already laid out as an (h, w, 3) frame
+                self.screen = pygame.Surface((w, h), 0, 24, (0xff, 0xff00, 0xff0000, 0))
             self.clock = pygame.time.Clock()
             self.font = pygame.font.SysFont("Arial", 18)
 
-        # Drawing logic (similar to main.py)
+        # Drawing logic (similar to main.py); the static field layer is pre-rendered by Field
         ppi = self.sim_config['field']['pixels_per_inch']
-        self.screen.fill((30, 30, 30))
-        self.field.draw(self.screen, ppi)
+        self.screen.blit(self.field.get_background(self.sim.active_alliance(), self.screen), (0, 0))
         self.pieces.draw(self.screen)
         for robot in self.robots:
             robot.draw(self.screen, ppi, self.font)
+        self._draw_overlay()
             
         # Draw some ML info
         score_text = self.font.render(f"Reward: {self.total_reward:.1f} Time: {self.game_time:.1f}s", True, (255, 255, 255))
@@ -358,7 +340,23 @@ class FrcEnv(gym.Env):
             pygame.display.flip()
             self.clock.tick(self.fps) 
         elif self.render_mode == "rgb_array":
-            return np.transpose(np.array(pygame.surfarray.pixels3d(self.screen)), axes=(1, 0, 2))
+            # pixels3d is a (w, h, 3) view of the surface; its transpose is copied straight into an (h, w, 3) frame.
+            # env_params.reuse_render_buffer (opt-in) refills one array every call instead of allocating a
+            # new frame: only for callers that consume each frame before the next render (not RecordVideo)
+            view = pygame.surfarray.pixels3d(self.screen).transpose(1, 0, 2)
+            if not self.ml_config['env_params'].get('reuse_render_buffer', False):
+                frame = view.copy()
+            else:
+                if self._frame is None:
+                    self._frame = np.empty(view.shape, dtype=np.uint8)
+                frame = self._frame
+                np.copyto(frame, view)
+            del view # Release the surface lock
+            return frame
+
+    def _draw_overlay(self):
+        # Hook for subclasses to draw extra markers over the robots
+        pass
 
     def close(self):
         if self.screen is not None:
@@ -0,0 +1,252 @@
+import numpy as np
+
+from gym_env import FrcEnv
+from simulation import Simulation, lineup
+from ml_utils import get_observation, action_to_inputs
+from rewards import RewardEngine, StepContext
+import sim_state
+
+# Multi-Agent Match Environment
+# Every robot in config.json red_alliance / blue_alliance is an agent ("red_1" ... "blue_3").
+# The API follows PettingZoo's ParallelEnv (reset -> obs/infos dicts, step(actions dict) -> obs,
+# rewards, terminations, truncations, infos dicts) without depending on PettingZoo. reset_batch /
+# step_batch expose the same thing as (n_agents, ...) arrays, which is what multi_vec_env.py feeds
+# to SB3 so one shared policy gets a sample from every agent on every sim step.
+# Observations and actions are the same 48 / 6 dims as FrcEnv, so policies move between the two.
+
+class AgentSlot:
+    """
+    Per-agent bookkeeping: its robot, reward engine and episode totals.
+    Reward components see the slot as ctx.env (controlled_robot is this agent's robot).
+    """
+    def __init__(self, name, robot, reward_engine):
+        self.name = name
+        self.robot = robot
+        self.controlled_robot = robot
+        self.reward_engine = reward_engine
+        self.ep_rewards = {}
+        self.total_reward = 0
+        self.total_scored = 0
+        self.inputs = None
+        self.begin_step(None)
+
+    def reset(self):
+        self.total_reward = 0
+        self.total_scored = 0
+        self.ep_rewards = self.reward_engine.reset(self)
+
+    def begin_step(self, action):
+        if action is not None:
+            self.inputs = action_to_inputs(action)
+        self.events = None
+
+    def end_step(self, events):
+        # events: the robot's simulation.RobotCounters for the step
+        self.events = events
+        self.total_scored += events.scored
+
+class MultiFrcEnv(FrcEnv):
+    def __init__(self, render_mode=None, config_path="config.json", ml_config_path="ml_config.json", mode="3v3", controlled=None):
+        # mode: "3v3" (every configured robot) or "1v1" (first robot of each alliance)
+        # controlled: agent names driven by actions (default: all); the others run RobotAI if they are is_ai
+        super(MultiFrcEnv, self).__init__(render_mode, config_path, ml_config_path)
+        self.mode = mode
+        # Recorded start states are 1v1 FrcEnv layouts
+        self.start_states = None
+
+        self.possible_agents = [f"{alliance}_{i + 1}" for alliance, i, _ in lineup(self.sim_config, mode)]
+        self.controlled_agents = list(controlled) if controlled is not None else list(self.possible_agents)
+        for name in self.controlled_agents:
+            if name not in self.possible_agents:
+                raise ValueError(f"Unknown agent '{name}' (agents: {', '.join(self.possible_agents)})")
+        self.agents = []
+        self.slots = []
+
+        # PettingZoo-style spaces: observation_space(agent) / action_space(agent) methods replace FrcEnv's
+        # attributes; the shared per-agent spaces stay available as single_*_space
+        self.single_observation_space = self.observation_space
+        self.single_action_space = self.action_space
+        del self.observation_space, self.action_space
+        self.observation_spaces = {name: self.single_observation_space for name in self.controlled_agents}
+        self.action_spaces = {name: self.single_action_space for name in self.controlled_agents}
+
+    def observation_space(self, agent):
+        return self.observation_spaces[agent]
+
+    def action_space(self, agent):
+        return self.action_spaces[agent]
+
+    @property
+    def num_agents(self):
+        return len(self.controlled_agents)
+
+    def _build_world(self):
+        # The standard kick-off (Simulation.from_config, same as headless_runner); controlled robots get an
+        # AgentSlot instead of their RobotAI, the others keep a RobotAI only if they are is_ai
+        world = Simulation.from_config(self.sim_config, self.mode)
+        self.field, self.pieces, self.robots, self.robot_ais = world.field, world.pieces, world.robots, world.robot_ais
+        self.slots = []
+        rew_cfg = self.ml_config['reward_shaping']
+        for robot, (alliance, i, _) in zip(self.robots, lineup(self.sim_config, self.mode)):
+            name = f"{alliance}_{i + 1}"
+            if name in self.controlled_agents:
+                self.robot_ais.pop(robot, None)
+                self.slots.append(AgentSlot(name, robot, RewardEngine(rew_cfg, self.extra_reward_components)))
+        # Slots follow controlled_agents order (= batch row order)
+        self.slots.sort(key=lambda slot: self.controlled_agents.index(slot.name))
+        self._slot_by_robot = {slot.robot: slot for slot in self.slots}
+        self.controlled_robot = self.slots[0].robot if self.slots else None
+
+        self.all_robots = list(self.robots)
+        self.start_state = sim_state.capture_world(0, self.pieces, self.robots, self.robot_ais)
+
+    def reset_batch(self, seed=None, options=None):
+        # gym.Env.reset seeds np_random; FrcEnv.reset's single-agent path is skipped
+        super(FrcEnv, self).reset(seed=seed)
+        if self.field is None:
+            self._build_world()
+        else:
+            sim_state.apply_world(self.start_state, self.pieces, self.robots, self.robot_ais)
+            for robot in self.robots:
+                robot.ai_tick_timer = self.np_random.uniform(0, 1.0/robot.ai_update_rate) # Desync robots
+
+        self.sim.reset()
+        self.total_reward = 0
+        for slot in self.slots:
+            slot.reset()
+        self.last_can_score = {"red": True, "blue": True}
+        if self.opponent_pool is not None:
+            self.opponent = self.opponent_pool.sample(self.np_random)
+
+        snap = options.get('snapshot') if options else None
+        if snap is not None:
+            self.restore(snap, restore_rng=False)
+        self.agents = list(self.controlled_agents)
+        return self._get_batch_obs()
+
+    def reset(self, seed=None, options=None):
+        obs = self.reset_batch(seed=seed, options=options)
+        return self._to_dict(obs), {name: {} for name in self.agents}
+
+    def _opponent_robots(self):
+        # Uncontrolled robots on alliances with no controlled agent (teammates keep the heuristic AI)
+        alliances = {slot.robot.alliance for slot in self.slots}
+        return [r for r in self.robots if r in self.robot_ais and r.alliance not in alliances]
+
+    def _get_batch_obs(self, contexts=None):
+        obs = np.zeros((len(self.slots),) + self.single_observation_space.shape, dtype=np.float32)
+        with self.profiler.timer("observation"):
+            for i, slot in enumerate(self.slots):
+                obs[i] = get_observation(
+                    slot.robot, self.field, self.pieces, self.sim_config,
+                    self.game_time, self.match_duration,
+                    sorted_fuels=contexts[i].sorted_fuels if contexts is not None else None
+                )
+        return obs
+
+    def _to_dict(self, batch):
+        return {slot.name: batch[i] for i, slot in enumerate(self.slots)}
+
+    def step_batch(self, actions):
+        # actions: (n_agents, 6) in controlled_agents order
+        # Returns obs (n_agents, 48), rewards (n_agents,), terminated, truncated, infos (list of dicts)
+        truncated = False
+        for slot, action in zip(self.slots, actions):
+            slot.begin_step(action)
+        # Self-play opponents: one batched forward pass for all of them, held for the step
+        inputs = self._get_opponent_inputs()
+        for slot in self.slots:
+            inputs[slot.robot] = slot.inputs
+        self.sim.step(self.frames_per_step, inputs, on_frame=self._render_frame if self.render_mode == "human" else None)
+        terminated = self.sim.finished
+        can_score = self.last_can_score = dict(self.sim.last_can_score)
+        for slot in self.slots:
+            slot.end_step(self.sim.counters[slot.robot])
+
+        rewards = np.zeros(len(self.slots), dtype=np.float32)
+        contexts = []
+        infos = []
+        with self.profiler.timer("reward"):
+            for i, slot in enumerate(self.slots):
+                ctx = StepContext(
+                    slot.robot, self.field, self.pieces, self.sim_config,
+                    action=actions[i],
+                    can_score=can_score[slot.robot.alliance],
+                    scored=slot.events.scored,
+                    passed=slot.events.passed,
+                    dumped=slot.events.dumped,
+                    fouls=slot.events.fouls,
+                    dist_traveled=slot.events.dist,
+                    stashed_red=self.sim.step_stashed["red"],
+                    stashed_blue=self.sim.step_stashed["blue"],
+                    env=slot
+                )
+                rewards[i] = slot.reward_engine.compute(ctx)
+                slot.total_reward += rewards[i]
+                contexts.append(ctx)
+                infos.append({'scored': slot.total_scored})
+        self.total_reward = sum(slot.total_reward for slot in self.slots)
+
+        if terminated or truncated:
+            perf = self.profiler.scalars()
+            self.profiler.reset()
+            for slot, info in zip(self.slots, infos):
+                info.update(slot.ep_rewards)
+                if self.opponent_pool is not None:
+                    info['opponent'] = self.opponent.name if self.opponent is not None else "heuristic"
+                    info['result'] = self._match_result(slot.robot.alliance)
+                info.update(perf)
+
+        return self._get_batch_obs(contexts), rewards, terminated, truncated, infos
+
+    def step(self, actions):
+        batch = np.stack([np.asarray(actions[slot.name], dtype=np.float32) for slot in self.slots])
+        obs, rewards, terminated, truncated, infos = self.step_batch(batch)
+        names = [slot.name for slot in self.slots]
+        result = (
+            self._to_dict(obs),
+            {name: float(rewards[i]) for i, name in enumerate(names)},
+            {name: terminated for name in names},
+            {name: truncated for name in names},
+            {name: infos[i] for i, name in enumerate(names)}
+        )
+        if terminated or truncated:
+            self.agents = []
+        return result
+
+    def snapshot(self):
+        snap = sim_state.capture_world(self.game_time, self.pieces, self.robots, self.robot_ais)
+        snap.update({
+            'match_duration': self.match_duration,
+            'last_can_score': dict(self.last_can_score),
+            'match_scores': self.match_scores,
+            'sim': self.sim.get_state(),
+            'agents': {slot.name: {
+                'total_reward': slot.total_reward,
+                'total_scored': slot.total_scored,
+                'rewards': slot.reward_engine.get_state()
+            } for slot in self.slots},
+            'rng': dict(sim_state.capture_rng(), env=self.np_random.bit_generator.state)
+        })
+        return snap
+
+    def restore(self, snap, restore_rng=True):
+        if self.field is None:
+            self._build_world()
+        self.game_time = sim_state.apply_world(snap, self.pieces, self.robots, self.robot_ais)
+        self.match_duration = snap.get('match_duration', self.match_duration)
+        self.last_can_score = dict(snap.get('last_can_score', {"red": True, "blue": True}))
+        self.sim.set_state(snap.get('sim', {'scores': snap.get('match_scores', {"red": 0, "blue": 0})}))
+        agents = snap.get('agents', {})
+        for slot in self.slots:
+            state = agents.get(slot.name)
+            if state is None:
+                slot.reset()
+                continue
+            slot.total_reward = state['total_reward']
+            slot.total_scored = state['total_scored']
+            slot.reward_engine.set_state(state['rewards'])
+        self.total_reward = sum(slot.total_reward for slot in self.slots)
+        if restore_rng and 'rng' in snap:
+            sim_state.restore_rng(snap['rng'])
+            self.np_random.bit_generator.state = snap['rng']['env']
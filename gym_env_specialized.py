@@ -1,16 +1,20 @@
 import gymnasium as gym
 from gymnasium import spaces
-import numpy as np
 import json
 import os
+import random
 from gym_env import FrcEnv
 from ml_utils import get_observation
+from scenario_bank import ScenarioBank, generate_layouts
 
 class SpecializedFrcEnv(FrcEnv):
     """
     A specialized environment for training Station Workers (Janitors, Lobbers).
     Allows for 'Target Zones' where the robot is rewarded for proximity and stay.
     """
+    # Station terms (see rewards.py): proximity nudge toward the target zone + forbidden-zone stay penalty
+    extra_reward_components = ("station_proximity_reward", "zone_boundary_penalty")
+
     def __init__(self, render_mode=None, config_path="config.json", ml_config_path="ml_config.json", mode="janitor"):
         super(SpecializedFrcEnv, self).__init__(render_mode, config_path, ml_config_path)
         self.mode = mode # 'janitor' or 'lobber'
@@ -24,112 +28,80 @@ class SpecializedFrcEnv(FrcEnv):
         else: # lobber
             self.target_x = self.sim_config['field']['width_inches'] * 0.5 # Near center (neutral)
             self.target_y = self.sim_config['field']['length_inches'] * 0.5
+        self._target_surf = None # Station marker, built on first render
+        
+        # Pre-generated lab layouts (python scenario_bank.py), memory-mapped read-only and shared by all workers
+        self.scenario_bank = ScenarioBank.open(self.ml_config['env_params'].get('scenario_bank_dir'), self.mode)
+        
+        # The lab always starts from its own layouts (FrcEnv's mid-match start states don't apply)
+        self.start_states = None
+        # Solo lab: no opponents to drive
+        self.opponent_pool = None
         
         self.disable_outposts = True
         # Specialized "Scoring Lab" settings
         self.match_duration = 30 # Turbo matches (30s)
-
-    def _get_can_score(self, alliance):
-        # Lobbers are for passing, not scoring. Disabling scoring forces stashing rewards.
+        # Lobbers are for passing, not scoring. Closed hubs force stashing rewards.
         if self.mode == "lobber":
-            return False
-        return super()._get_can_score(alliance)
+            self.sim.phase_rule = "closed"
 
-    def _get_obs(self):
+    def _get_obs(self, ctx=None):
         # We pass target_x and target_y as the new 'Strategic' features to replace redundant ones
-        return get_observation(
-            self.controlled_robot, 
-            self.field, 
-            self.pieces, 
-            self.sim_config, 
-            self.game_time, 
-            self.match_duration, 
-            can_score=self._get_can_score(self.controlled_robot.alliance),
-            can_pass=(self.mode == "lobber"),
-            target_x=self.target_x,
-            target_y=self.target_y
-        )
+        with self.profiler.timer("observation"):
+            return get_observation(
+                self.controlled_robot, 
+                self.field, 
+                self.pieces, 
+                self.sim_config, 
+                self.game_time, 
+                self.match_duration, 
+                can_score=self._get_can_score(self.controlled_robot.alliance),
+                can_pass=(self.mode == "lobber"),
+                target_x=self.target_x,
+                target_y=self.target_y,
+                sorted_fuels=ctx.sorted_fuels if ctx is not None else None
+            )
 
     def reset(self, seed=None, options=None):
-        # 1. Standard Reset
-        obs, info = super().reset(seed=seed, options=options)
-        self.match_duration = 30.0 # Force override again after super.reset
+        if options and options.get('snapshot') is not None:
+            # Recorded lab state: the full FrcEnv restore path
+            return super().reset(seed=seed, options=options)
+
+        # Only seed the env RNG here - the lab never needs FrcEnv's standard field or blue bot
+        gym.Env.reset(self, seed=seed)
+        if self.field is None:
+            self._build_world()
         
-        # 2. Lab Isolation: Remove other robots
-        # (FrcEnv.reset adds a Red 1 and potentially opponents)
+        # 1. Lab Isolation: only the controlled robot, back at its kick-off state
+        self.controlled_robot = self.all_robots[0]
         self.robots = [self.controlled_robot]
+        self.controlled_robot.set_state(self.start_state['robots'][0])
+        self.controlled_robot.ai_tick_timer = random.uniform(0, 1.0/self.controlled_robot.ai_update_rate)
         
-        # 3. Lab Fuel: Clear standard scatter and spawn concentrated piles
-        from game_piece import Fuel
-        self.pieces.fuels = [] # Wipe the field
-        
-        field_w = self.sim_config['field']['width_inches']
-        field_h = self.sim_config['field']['length_inches']
-        divider_x = self.sim_config['field']['divider_x']
-        
-        if self.mode == "janitor":
-            # Piles in the Alliance Zone (X: 0 to divider_x)
-            num_balls = np.random.randint(50, 80)
-            for _ in range(num_balls):
-                rx = np.random.uniform(20, divider_x - 10)
-                ry = np.random.uniform(20, field_h - 20)
-                f = Fuel(rx, ry, self.pieces.ppi, "lab")
-                f.bounces = 1 # Safe to pick up
-                self.pieces.fuels.append(f)
+        # 2. Lab Fuel: concentrated piles, bulk-loaded from the pre-generated scenario bank when available
+        if self.scenario_bank is not None:
+            positions = self.scenario_bank.sample(self.np_random)
         else:
-            # Piles in the Neutral Zone (X: divider_x to field_w - divider_x)
-            num_balls = np.random.randint(70, 100)
-            for _ in range(num_balls):
-                # Neutral zone is the middle chunk
-                rx = np.random.uniform(divider_x + 10, (field_w - divider_x) - 10)
-                ry = np.random.uniform(20, field_h - 20)
-                f = Fuel(rx, ry, self.pieces.ppi, "lab")
-                f.bounces = 1
-                self.pieces.fuels.append(f)
-                
-        return self._get_obs(), info
-
-    def step(self, action):
-        # Execute the standard step
-        obs, reward, terminated, truncated, info = super(SpecializedFrcEnv, self).step(action)
+            layouts, counts = generate_layouts(self.mode, 1, self.sim_config['field'])
+            positions = layouts[0, :counts[0]]
+        self.pieces.load_layout(positions, source="lab")
         
-        # Add Specialized Station Rewards
-        robot = self.controlled_robot
-        dist_to_target = np.sqrt((robot.x - self.target_x)**2 + (robot.y - self.target_y)**2)
-        field_width = self.sim_config['field']['width_inches']
-        
-        # 1. Proximity Reward (Small nudge to stay in zone)
-        # Max reward of +0.5 per step when at the center, dropping to 0 when far away
-        prox_reward = 0.5 * (1.0 - min(1.0, dist_to_target / (field_width * 0.3)))
-        reward += prox_reward
-        
-        # 2. Hard Boundary Penalty (Optional: to really discourage leaving)
-        if self.mode == "janitor":
-            if robot.x > self.sim_config['field']['divider_x']:
-                reward -= 5.0 # Penalty for crossing into neutral zone
-        if self.mode == "lobber":
-            if (robot.alliance == "red" and robot.x < self.sim_config['field']['divider_x']) or \
-               (robot.alliance == "blue" and robot.x > self.sim_config['field']['divider_x']):
-                reward -= 20.0 # Heavy penalty for crossing into alliance/scoring zone
+        self._reset_episode()
+        self.match_duration = 30.0 # Turbo matches (30s)
+        return self._get_obs(), {}
 
-        return obs, reward, terminated, truncated, info
-
-    def render(self):
-        # First call the base render to draw the field/robots
-        res = super().render()
-        if self.render_mode is not None and self.screen is not None:
-            import pygame
-            ppi = self.sim_config['field']['pixels_per_inch']
-            
-            # Draw Target Station (Vibrant cyan/yellow pulse)
+    def _draw_overlay(self):
+        # Drawn by FrcEnv.render before the frame is shown / copied out
+        import pygame
+        ppi = self.sim_config['field']['pixels_per_inch']
+        
+        # Draw Target Station (Vibrant cyan/yellow pulse)
+        if self._target_surf is None:
             color = (0, 255, 255, 100) if self.mode == "lobber" else (255, 255, 0, 100)
-            target_surf = pygame.Surface((100, 100), pygame.SRCALPHA)
-            pygame.draw.circle(target_surf, color, (50, 50), 40)
-            self.screen.blit(target_surf, (int(self.target_x * ppi) - 50, int(self.target_y * ppi) - 50))
-            
-            # Draw Mode Label
-            if hasattr(self, 'font'):
-                label = self.font.render(f"MODE: {self.mode.upper()}", True, (255, 255, 255))
-                self.screen.blit(label, (self.screen.get_width() // 2 - label.get_width() // 2, 50))
-
-        return res
+            self._target_surf = pygame.Surface((100, 100), pygame.SRCALPHA)
+            pygame.draw.circle(self._target_surf, color, (50, 50), 40)
+        self.screen.blit(self._target_surf, (int(self.target_x * ppi) - 50, int(self.target_y * ppi) - 50))
+        
+        # Draw Mode Label
+        label = self.font.render(f"MODE: {self.mode.upper()}", True, (255, 255, 255))
+        self.screen.blit(label, (self.screen.get_width() // 2 - label.get_width() // 2, 50))
@@ -5,15 +5,18 @@ import time
 import math
 import random
 import json
+import multiprocessing as mp
+
+import numpy as np
 
 # Force Pygame to use dummy driver for headless operation
 os.environ["SDL_VIDEODRIVER"] = "dummy"
 
 import pygame
-from robot import Robot
-from field import Field
-from game_piece import GamePieceManager
-from ai import RobotAI
+from simulation import Simulation, lineup
+from perf import NULL_PROFILER, Profiler, profiling_config
+from match_stats import BatchJournal, BatchStats, ResultWriter
+from match_cache import DEFAULT_DIR as CACHE_DIR, MatchCache, config_hash
 
 def resource_path(relative_path):
     """ Get absolute path to resource """
@@ -23,120 +26,168 @@ def resource_path(relative_path):
         base_path = os.path.abspath(".")
     return os.path.join(base_path, relative_path)
 
-def run_match(config, match_id, mode="3v3", verbose=False):
-    ppi = config['field']['pixels_per_inch']
-    field_width_in = config['field']['width_inches']
-    field_height_in = config['field']['length_inches']
-    
-    field = Field(config['field'])
-    pieces = GamePieceManager(config, ppi)
-    
-    # Initialize robots
-    robots = []
-    robot_ais = {}
-    
-    red_all = config['red_alliance'] if mode == "3v3" else [config['red_alliance'][0]]
-    blue_all = config['blue_alliance'] if mode == "3v3" else [config['blue_alliance'][0]]
-    
-    # Red Alliance
-    for i, r_cfg in enumerate(red_all):
-        spacing = field_height_in / (len(red_all) + 1)
-        y_pos = spacing * (i + 1)
-        robot = Robot(100, y_pos, r_cfg, "red")
-        robot.holding = min(8, robot.capacity)
-        robots.append(robot)
-        if r_cfg.get('is_ai'):
-            robot_ais[robot] = RobotAI("red", r_cfg.get('drivetrain') == "tank", r_cfg.get('model_path'))
-...
-        if b_cfg.get('is_ai'):
-            robot_ais[robot] = RobotAI("blue", b_cfg.get('drivetrain') == "tank", b_cfg.get('model_path'))
-    
-    pieces.spawn_initial(config)
-    
-    # (AI initialization moved into the robot loops above)
-        
-    scores = {"red": 0, "blue": 0}
-    penalty_scores = {"red": 0, "blue": 0}
-    game_time = 0
-    dt = 1/60.0
-    match_duration = 160
-    
-    auto_winner = None
-    stage_alliances = ["red", "blue", "red", "blue"] # Default
-    
-    keys = [False] * 512
-    dummy_ctrl = {'up': 0, 'down': 0, 'left': 0, 'right': 0, 'rotate_l': 0, 'rotate_r': 0, 'shoot_key': 0, 'pass_key': 0}
-    
-    last_phase = ""
+def run_match(config, match_id, mode="3v3", verbose=False, profiler=NULL_PROFILER, recorder=None, quiet=False):
+    # recorder: optional frame hook(game_time, pieces, robots, robot_ais), e.g. start_states.IntervalRecorder
+    sim = Simulation.from_config(config, mode, profiler=profiler)
+
+    def print_phase(clock):
+        print(f"  [{int(sim.game_time)}s] Phase: {clock.phase} | Score: R:{sim.scores['red']} B:{sim.scores['blue']}")
+
+    def on_frame(sim):
+        if not sim.finished:
+            recorder(sim.game_time, sim.pieces, sim.robots, sim.robot_ais)
+
     start_real = time.perf_counter()
-    
-    while game_time < match_duration:
-        # Match Phases
-        active_alliance = "both"
-        if 0 <= game_time < 20: 
-            phase = "AUTO"
-            active_alliance = "both"
-        elif 20 <= game_time < 30: 
-            phase = "TRANSITION"
-            active_alliance = "both"
-            if auto_winner is None:
-                if scores["red"] > scores["blue"]: auto_winner = "red"
-                elif scores["blue"] > scores["red"]: auto_winner = "blue"
-                else: auto_winner = "tie"
-                
-                if auto_winner == "red":
-                    stage_alliances = ["blue", "red", "blue", "red"]
-                elif auto_winner == "blue":
-                    stage_alliances = ["red", "blue", "red", "blue"]
-        
-        elif 30 <= game_time < 130:
-            stage_idx = int((game_time - 30) // 25)
-            phase = f"TELEOP STAGE {stage_idx + 1}"
-            active_alliance = stage_alliances[stage_idx]
-        elif 130 <= game_time < 160: 
-            phase = "ENDGAME"
-            active_alliance = "both"
-        else: phase = "FINISHED"
-
-        if verbose and phase != last_phase:
-            print(f"  [{int(game_time)}s] Phase: {phase} | Score: R:{scores['red']} B:{scores['blue']}")
-            last_phase = phase
-
-        for robot in robots:
-            can_score = (active_alliance == "both") or (active_alliance == robot.alliance)
-            
-            ai_inputs = None
-            if robot in robot_ais:
-                ai_inputs = robot_ais[robot].update(robot, field, pieces, can_score, robots, game_time, match_duration, config)
-            
-            if robot.update(dt, keys, dummy_ctrl, field, game_time, robots, pieces, can_score, ai_inputs):
-                if can_score:
-                    scores[robot.alliance] += 1
-                    pieces.recycle_fuel(robot, config['field'])
-        
-        pieces.update(robots, game_time, config)
-        
-        # Process Penalties (+15 for opponent gained by this alliance)
-        for foul_alliance, amount in pieces.penalties:
-            other = "blue" if foul_alliance == "red" else "red"
-            penalty_scores[other] += amount
-        
-        game_time += dt
-        
-    end_real = time.perf_counter()
-    duration = end_real - start_real
-    
-    red_total = scores['red'] + penalty_scores['red']
-    blue_total = scores['blue'] + penalty_scores['blue']
-    
-    print(f"Match {match_id:2d}: RED {red_total:3d} (+{penalty_scores['red']}P) - BLUE {blue_total:3d} (+{penalty_scores['blue']}P) ({duration:.2f}s)")
-    return {"scores": scores, "penalties": penalty_scores}, duration
+    if verbose:
+        print_phase(sim.clock)
+        sim.clock.on("phase", print_phase)
+    sim.run(on_frame if recorder is not None else None)
+    duration = time.perf_counter() - start_real
+    profiler.count("match_wall_ms", duration * 1000.0)
+
+    robot_stats = []
+    for robot, (alliance, i, r_cfg) in zip(sim.robots, lineup(config, mode)):
+        c = sim.counters[robot]
+        robot_stats.append({'name': r_cfg.get('name', f"{alliance.capitalize()} {i + 1}"), 'alliance': alliance,
+                            'scored': c.scored, 'passed': c.passed, 'dumped': c.dumped, 'fouls': c.fouls,
+                            'holding_at_end': robot.holding})
+    result = {
+        "scores": sim.scores, "penalties": sim.penalty_scores, "phase_scores": sim.phase_scores,
+        "passed": sim.passed, "stashed": sim.stashed, "robots": robot_stats
+    }
+    if not quiet:
+        print(match_line(match_id, result, duration))
+    return result, duration
+
+def match_line(match_id, result, duration):
+    # duration None: a reused result (not played by this run)
+    scores, penalties = result['scores'], result['penalties']
+    red_total = scores['red'] + penalties['red']
+    blue_total = scores['blue'] + penalties['blue']
+    played = "cached" if duration is None else f"{duration:.2f}s"
+    return f"Match {match_id:2d}: RED {red_total:3d} (+{penalties['red']}P) - BLUE {blue_total:3d} (+{penalties['blue']}P) ({played})"
+
+def seed_match(seed):
+    # The sim draws from both global RNGs; one seed per match makes every match replayable on its own
+    random.seed(seed)
+    np.random.seed(seed)
+
+# Parallel batches: each pool worker sets up pygame and the configs once (_init_worker) and then plays
+# many matches. Match i always runs with seed base_seed + i, so a batch gives the same results with
+# any number of workers; results stream back in completion order. A job names one of several configs,
+# so a parameter sweep (sweep.py) shares a single pool across all of its variants.
+_worker = {}
+
+def _init_worker(configs, mode, verbose, profile):
+    # SDL would otherwise turn SIGTERM into a QUIT event and Pool.terminate() could not stop the worker
+    os.environ["SDL_NO_SIGNAL_HANDLERS"] = "1"
+    pygame.init()
+    pygame.display.set_mode((1, 1))
+    _worker.update(configs=configs, mode=mode, verbose=verbose, profile=profile)
+
+def _run_worker_match(job):
+    # job: (config index, match_id, seed) -> (*job, result, duration, profiler summary or None)
+    index, match_id, seed = job
+    seed_match(seed)
+    profiler = Profiler() if _worker['profile'] else NULL_PROFILER
+    result, duration = run_match(_worker['configs'][index], match_id, _worker['mode'], _worker['verbose'], profiler, quiet=True)
+    return index, match_id, seed, result, duration, (profiler.summary() if profiler.enabled else None)
+
+def run_jobs(configs, jobs, mode="3v3", workers=1, verbose=False, profiler=NULL_PROFILER, cache=None):
+    # jobs: [(config index, match_id, seed)]. Yields (index, match_id, seed, result, duration, cached) as
+    # matches finish; closing the generator stops the batch. With a match_cache.MatchCache, cached
+    # matches are yielded first (cached=True, duration as stored) and only the rest are simulated (and stored)
+    if cache is not None:
+        digests = [config_hash(c) for c in configs]
+        keys = {}
+        missing = []
+        for job in jobs:
+            key = keys[job] = cache.key(digests[job[0]], mode, job[2])
+            hit = cache.get(key)
+            if hit is None:
+                missing.append(job)
+            else:
+                yield (*job, *hit, True)
+        for index, match_id, match_seed, result, duration, _ in run_jobs(configs, missing, mode, workers, verbose, profiler):
+            cache.put(keys[(index, match_id, match_seed)], result, duration)
+            yield index, match_id, match_seed, result, duration, False
+        return
+    if not jobs:
+        return
+    if workers <= 1:
+        for index, match_id, match_seed in jobs:
+            seed_match(match_seed)
+            result, duration = run_match(configs[index], match_id, mode, verbose, profiler, quiet=True)
+            yield index, match_id, match_seed, result, duration, False
+        return
+    ctx = mp.get_context("forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn")
+    # Several matches per task keeps the queue overhead negligible next to a match
+    chunksize = max(1, min(8, len(jobs) // (workers * 4)))
+    pool = ctx.Pool(workers, initializer=_init_worker, initargs=(configs, mode, verbose, profiler.enabled))
+    try:
+        for index, match_id, match_seed, result, duration, summary in pool.imap_unordered(_run_worker_match, jobs, chunksize):
+            if summary is not None:
+                profiler.merge(summary)
+            yield index, match_id, match_seed, result, duration, False
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+def run_batch(config, runs, mode="3v3", seed=0, workers=1, verbose=False, profiler=NULL_PROFILER, cache=None, skip=()):
+    # Yields (match_id, seed, result, duration, source) as matches finish, source "simulated" or "cache";
+    # closing the generator stops the batch. skip: match_ids that are already done (--resume)
+    jobs = [(0, i + 1, seed + i) for i in range(runs) if i + 1 not in skip]
+    batch = run_jobs([config], jobs, mode, workers, verbose, profiler, cache)
+    try:
+        for _, match_id, match_seed, result, duration, cached in batch:
+            yield match_id, match_seed, result, duration, "cache" if cached else "simulated"
+    finally:
+        batch.close()
+
+def in_order(batch):
+    # Re-sequences run_batch output by match_id, so records, running statistics and the --until-ci
+    # stopping point are the same for any number of workers
+    pending = {}
+    next_id = 1
+    for item in batch:
+        pending[item[0]] = item
+        while next_id in pending:
+            yield pending.pop(next_id)
+            next_id += 1
+
+def _journaled(batch, journal, done):
+    # Journaled matches first (source "journal": not simulated by this run), then new ones, each logged
+    # as soon as it finishes
+    for match_id in sorted(done):
+        yield (match_id, *done[match_id], "journal")
+    for item in batch:
+        if journal is not None:
+            journal.append(*item[:4])
+        yield item
 
 def main():
     parser = argparse.ArgumentParser(description="FRC Strategy Simulator - Headless Batch Runner")
     parser.add_argument("--runs", type=int, default=1, help="Number of match simulations to run")
     parser.add_argument("--mode", type=str, default="3v3", choices=["1v1", "3v3"], help="Match mode (1v1 or 3v3)")
     parser.add_argument("--verbose", action="store_true", help="Print detailed phase transitions for each match")
+    parser.add_argument("--profile", action="store_true", help="Time simulation subsystems (overrides config 'profiling.enabled')")
+    parser.add_argument("--profile-json", type=str, help="Write the profiling report to this JSON file")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes to spread the matches over")
+    parser.add_argument("--seed", type=int, help="Base seed (match i uses seed + i; default: time based, printed)")
+    parser.add_argument("--out", type=str, help="Stream per-match records to this .jsonl (or flattened .csv) file")
+    parser.add_argument("--until-ci", type=float, help="Stop once the --ci-metric confidence interval half-width is at most this "
+                        "(win rate as a fraction, score diff in points); --runs becomes the maximum")
+    parser.add_argument("--ci-metric", type=str, default="win_rate", choices=BatchStats.METRICS, help="Metric for --until-ci")
+    parser.add_argument("--confidence", type=float, default=0.95, help="Confidence level of the reported intervals")
+    parser.add_argument("--min-runs", type=int, default=30, help="Matches before --until-ci may stop the batch")
+    parser.add_argument("--cache", type=str, nargs='?', const=CACHE_DIR, help=f"Reuse/store match results in this directory (default: {CACHE_DIR})")
+    parser.add_argument("--cache-max-mb", type=float, default=500, help="Cache size cap (least recently used entries are evicted)")
+    parser.add_argument("--journal", type=str, help="Append every finished match to this journal (needed for --resume)")
+    parser.add_argument("--resume", action="store_true", help="Continue the batch in --journal: skip its matches, rebuild the summary from it")
+    parser.add_argument("--report-every", type=int, default=0, help="Print running statistics every N matches")
     args = parser.parse_args()
 
     pygame.init()
@@ -145,43 +196,86 @@ def main():
     with open(resource_path('config.json'), 'r') as f:
         config = json.load(f)
 
-    print(f"Starting {args.runs} Batch Simulation Run(s)...")
+    prof_cfg = profiling_config(config)
+    profiler = Profiler() if (args.profile or prof_cfg.get('enabled', False)) else NULL_PROFILER
+
+    seed = args.seed
+    journal = BatchJournal(args.journal) if args.journal else None
+    done = {}
+    if args.resume:
+        if journal is None:
+            print("Error: --resume needs the --journal of the batch to continue.")
+            sys.exit(1)
+        header, done, valid_bytes = journal.load()
+        if header is None:
+            print(f"Error: {args.journal} is missing or has no batch header.")
+            sys.exit(1)
+        seed = header['seed'] if seed is None else seed
+        if (seed, args.mode, config_hash(config)) != (header['seed'], header['mode'], header['config']):
+            print(f"Error: {args.journal} was written with seed {header['seed']}, mode {header['mode']} and a different "
+                  f"config.json hash than this run; results would not be comparable.")
+            sys.exit(1)
+        done = {m: v for m, v in done.items() if m <= args.runs}
+        journal.open(valid_bytes=valid_bytes)
+    elif journal is not None:
+        if os.path.exists(args.journal):
+            print(f"Error: {args.journal} exists. Use --resume to continue it or remove it.")
+            sys.exit(1)
+    seed = seed if seed is not None else int(time.time()) % 100000
+    if journal is not None and not args.resume:
+        journal.open(header={'seed': seed, 'mode': args.mode, 'config': config_hash(config)})
+
+    workers = max(1, min(args.workers, args.runs - len(done)))
+    print(f"Starting {args.runs} Batch Simulation Run(s) on {workers} worker(s), seed {seed}...")
+    if done:
+        print(f"Resuming: {len(done)} matches already in {args.journal}")
     print("-" * 40)
     
-    all_results = []
+    cache = MatchCache(args.cache, args.cache_max_mb) if args.cache else None
+    stats = BatchStats(args.confidence)
+    writer = ResultWriter(args.out) if args.out else None
     total_start = time.perf_counter()
     
-    for i in range(args.runs):
-        # Set unique seed for each match to ensure variability if random is used
-        random.seed(time.time() + i)
-        score, dur = run_match(config, i + 1, args.mode, args.verbose)
-        all_results.append(score)
+    batch = run_batch(config, args.runs, args.mode, seed, workers, args.verbose, profiler, cache, skip=done)
+    try:
+        for match_id, match_seed, result, dur, source in in_order(_journaled(batch, journal, done)):
+            # Cached matches were not played by this batch: their stored wall time is not reported
+            wall = None if source == "cache" else dur
+            if match_id not in done:
+                print(match_line(match_id, result, wall))
+            stats.add(result, source)
+            if writer is not None:
+                writer.write(dict(match_id=match_id, seed=match_seed, mode=args.mode,
+                                  wall_s=round(wall, 3) if wall is not None else None, **result))
+            if args.report_every and stats.n % args.report_every == 0:
+                print(stats.progress_line())
+            if args.until_ci is not None and stats.n >= args.min_runs and stats.ci_half_width(args.ci_metric) <= args.until_ci:
+                print(f"Stopping: {args.ci_metric} CI half-width {stats.ci_half_width(args.ci_metric):.3g} <= {args.until_ci} after {stats.n} matches")
+                break
+    finally:
+        batch.close()
+        if writer is not None:
+            writer.close()
+        if journal is not None:
+            journal.close()
         
     total_end = time.perf_counter()
     total_dur = total_end - total_start
     
-    # Calculate Stats
-    red_scores = [r['scores']['red'] + r['penalties']['red'] for r in all_results]
-    blue_scores = [r['scores']['blue'] + r['penalties']['blue'] for r in all_results]
-    red_penalties = [r['penalties']['red'] for r in all_results]
-    blue_penalties = [r['penalties']['blue'] for r in all_results]
-    
-    red_wins = sum(1 for r in all_results if (r['scores']['red'] + r['penalties']['red']) > (r['scores']['blue'] + r['penalties']['blue']))
-    blue_wins = sum(1 for r in all_results if (r['scores']['blue'] + r['penalties']['blue']) > (r['scores']['red'] + r['penalties']['red']))
-    ties = len(all_results) - red_wins - blue_wins
-    
-    print("-" * 40)
-    print("SUMMARY STATISTICS")
-    print(f"Total Matches: {args.runs}")
-    print(f"Total Time:    {total_dur:.2f}s ({ (args.runs * 160) / total_dur:.1f}x real-time)")
-    print("-" * 20)
-    print(f"RED WINS:  {red_wins} ({red_wins/args.runs*100:.1f}%)")
-    print(f"BLUE WINS: {blue_wins} ({blue_wins/args.runs*100:.1f}%)")
-    if ties > 0: print(f"TIES:      {ties} ({ties/args.runs*100:.1f}%)")
-    print("-" * 20)
-    print(f"RED Score:  Avg: {sum(red_scores)/args.runs:.1f} (Avg Pen: {sum(red_penalties)/args.runs:.1f}) | Max: {max(red_scores)}")
-    print(f"BLUE Score: Avg: {sum(blue_scores)/args.runs:.1f} (Avg Pen: {sum(blue_penalties)/args.runs:.1f}) | Max: {max(blue_scores)}")
-    print("=" * 40)
+    print(stats.summary(total_dur))
+    if cache is not None:
+        cache.prune(drop_stale=False)
+        print(f"Cache: {cache.hits} matches reused, {cache.stored} simulated and stored ({args.cache})")
+    if writer is not None:
+        print(f"Match records written to {args.out}")
+
+    if profiler.enabled:
+        print(profiler.report("PROFILE (all matches)"))
+        print("=" * 40)
+        report_path = args.profile_json or prof_cfg.get('report_path')
+        if report_path:
+            profiler.save_json(report_path, extra={'matches': stats.n, 'mode': args.mode, 'total_s': total_dur, 'workers': workers})
+            print(f"Profile report written to {report_path}")
 
     pygame.quit()
 
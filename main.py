@@ -5,10 +5,10 @@ import os
 import sys
 import argparse
 import glob
-from robot import Robot
 from field import Field
 from game_piece import GamePieceManager
-from ai import RobotAI
+from simulation import Simulation
+from sim_state import save_snapshot
 
 def resource_path(relative_path):
     """ Get absolute path to resource, works for dev and for PyInstaller """
@@ -19,10 +19,14 @@ def resource_path(relative_path):
         base_path = os.path.abspath(".")
     return os.path.join(base_path, relative_path)
 
+# HUD phase colors ("TELEOP STAGE n" -> "TELEOP STAGE")
+PHASE_COLORS = {"AUTO": (255, 255, 0), "TRANSITION": (255, 165, 0), "TELEOP STAGE": (0, 255, 0), "ENDGAME": (255, 0, 255)}
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--test-latest", action="store_true", help="Test the latest model as Red 1 in 1v1 mode")
     parser.add_argument("--model", type=str, help="Path to a specific model .zip file to test")
+    parser.add_argument("--record", type=str, metavar="DIR", help="Record human-driven robots (observation + equivalent action) for bc_pretrain.py")
     args = parser.parse_args()
 
     pygame.init()
@@ -30,6 +34,16 @@ def main():
     with open(resource_path('config.json'), 'r') as f:
         config = json.load(f)
     
+    # Human demonstrations for behavioral cloning (demonstrations.py), sampled at the env's decision rate
+    recorder = None
+    if args.record:
+        from demonstrations import DemoRecorder, keyboard_action
+        from ml_utils import get_observation
+        with open(resource_path('ml_config.json'), 'r') as f:
+            frames_per_step = json.load(f)['env_params']['frames_per_step']
+        recorder = DemoRecorder(args.record, frames_per_step=frames_per_step)
+        print(f"Recording human play to {args.record}")
+    
     ppi = config['field']['pixels_per_inch']
     field_width_in = config['field']['width_inches']
     field_height_in = config['field']['length_inches']
@@ -39,6 +53,9 @@ def main():
     hud_height = 140 
     screen = pygame.display.set_mode((field_width, field_height + hud_height))
     pygame.display.set_caption("4907 Strategy Sim - Custom Robot Battle")
+    # The field is drawn straight into its part of the window: a cached background per hub light state
+    # (Field.get_background), then pieces and robots. Nothing is allocated per frame
+    field_surf = screen.subsurface((0, hud_height, field_width, field_height))
     
     clock = pygame.time.Clock()
     font = pygame.font.SysFont("Arial", 18)
@@ -103,61 +120,18 @@ def main():
             config['red_alliance'][0]['model_path'] = target_model
             config['red_alliance'][0]['is_ai'] = True
     
-    # Initialize robots (will be populated on Start)
-    robots = []
-    robot_ais = {}
-    
-    scores = {"red": 0, "blue": 0}
-    penalty_scores = {"red": 0, "blue": 0}
-    game_time = 0
-    auto_winner = None
-    stage_alliances = ["red", "blue", "red", "blue"] # Default
+    controls = {"red": red_ctrl, "blue": blue_ctrl}
+    # Match simulation (robots are spawned on Start; the menu shows an empty one)
+    sim = Simulation(config, field, pieces)
     
     def init_match():
-        nonlocal robots, robot_ais, scores, penalty_scores, game_time, auto_winner, stage_alliances
-        robots = []
-        robot_ais = {}
-        scores = {"red": 0, "blue": 0}
-        penalty_scores = {"red": 0, "blue": 0}
-        game_time = 0
-        auto_winner = None
-        stage_alliances = ["red", "blue", "red", "blue"]
-        
-        red_all = config['red_alliance'] if match_mode == "3v3" else [config['red_alliance'][0]]
-        blue_all = config['blue_alliance'] if match_mode == "3v3" else [config['blue_alliance'][0]]
-        
-        # Red Alliance
-        for i, r_cfg in enumerate(red_all):
-            spacing = field_height_in / (len(red_all) + 1)
-            y_pos = spacing * (i + 1)
-            robot = Robot(100, y_pos, r_cfg, "red")
-            robot.holding = min(8, robot.capacity)
-            robots.append(robot)
-            if r_cfg.get('is_ai'):
-                robot_ais[robot] = RobotAI("red", r_cfg.get('drivetrain') == "tank", r_cfg.get('model_path'))
-                
-        # Blue Alliance
-        for i, b_cfg in enumerate(blue_all):
-            spacing = field_height_in / (len(blue_all) + 1)
-            y_pos = spacing * (i + 1)
-            robot = Robot(field_width_in - 100, y_pos, b_cfg, "blue")
-            robot.holding = min(8, robot.capacity)
-            robots.append(robot)
-            if b_cfg.get('is_ai'):
-                robot_ais[robot] = RobotAI("blue", b_cfg.get('drivetrain') == "tank", b_cfg.get('model_path'))
-        
-        # Reset Game Pieces
-        pieces.reset(config)
+        nonlocal sim
+        sim = Simulation.from_config(config, match_mode, field, pieces)
     
     # Game State
-    scores = {"red": 0, "blue": 0}
-    game_time = 0
     paused = False
     last_abs_time = time.time()
     
-    # Match Logic State
-    auto_winner = None
-    stage_alliances = ["red", "blue", "red", "blue"] # Default
     tuning_targets = ["bounciness", "friction"]
     target_idx = 0
     
@@ -191,17 +165,22 @@ def main():
                 if event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_SPACE:
                         paused = not paused
+                    if event.key == pygame.K_F5: # Save the match state for whatif.py
+                        path = os.path.join("whatif_states", f"match_{int(sim.game_time)}s.pkl")
+                        os.makedirs("whatif_states", exist_ok=True)
+                        save_snapshot(path, sim.snapshot())
+                        print(f"Match state saved to {path} (python whatif.py --state {path} --alt ...)")
                     if event.key == pygame.K_7: # Reset to Menu
+                        if recorder: recorder.end_match()
                         sim_state = "MENU"
-                        game_time = 0
-                        scores = {"red": 0, "blue": 0}
+                        sim.reset()
                 
-                if event.type == pygame.MOUSEBUTTONDOWN and game_time >= 160:
+                if event.type == pygame.MOUSEBUTTONDOWN and sim.finished:
                     mx, my = event.pos
                     if field_width//2 - 150 <= mx <= field_width//2 + 150 and field_height//2 + 50 + hud_height <= my <= field_height//2 + 110 + hud_height:
+                        if recorder: recorder.end_match()
                         sim_state = "MENU"
-                        game_time = 0
-                        scores = {"red": 0, "blue": 0}
+                        sim.reset()
                 
                 if event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_LEFTBRACKET: target_idx = (target_idx - 1) % len(tuning_targets)
@@ -213,62 +192,23 @@ def main():
                     if event.key == pygame.K_EQUALS: # Plus key
                         setattr(pieces, tvar, min(1.0, getattr(pieces, tvar) + 0.01))
         
-        if sim_state == "PLAYING" and not paused:
-            game_time += dt
-            
-            # Match State Machine
-            if 0 <= game_time < 20: 
-                active_alliance = "both"
-            elif 20 <= game_time < 30: 
-                active_alliance = "both"
-                if auto_winner is None:
-                    if scores["red"] > scores["blue"]: auto_winner = "red"
-                    elif scores["blue"] > scores["red"]: auto_winner = "blue"
-                    else: auto_winner = "tie"
-                    
-                    # Update Stage Alliances: Winner goes second (Stage 2 & 4)
-                    if auto_winner == "red":
-                        stage_alliances = ["blue", "red", "blue", "red"]
-                    elif auto_winner == "blue":
-                        stage_alliances = ["red", "blue", "red", "blue"]
-                    # If tie, stay with default [red, blue, red, blue]
-            
-            elif 30 <= game_time < 130:
-                stage_idx = int((game_time - 30) // 25)
-                active_alliance = stage_alliances[stage_idx]
-            elif 130 <= game_time < 160: 
-                active_alliance = "both"
-            else: 
-                active_alliance = None
-            
+        if sim_state == "PLAYING" and not paused and not sim.finished:
             keys = pygame.key.get_pressed()
+            record = recorder is not None and recorder.due()
             
-            # Update Robots
-            for robot in robots:
-                ctrl = red_ctrl if robot.alliance == "red" else blue_ctrl
-                can_score = (active_alliance == "both") or (active_alliance == robot.alliance)
-                
-                ai_inputs = None
-                if robot in robot_ais:
-                    ai_inputs = robot_ais[robot].update(robot, field, pieces, can_score, robots, game_time, 160, config)
-                
-                update_res = robot.update(dt, keys, ctrl, field, game_time, robots, pieces, can_score, ai_inputs)
-                if isinstance(update_res, dict) and update_res.get('scored'):
-                    if can_score:
-                        scores[robot.alliance] += 1
-                        pieces.recycle_fuel(robot, config['field'])
-                
-                # Check for manual dump
-                if not ai_inputs and keys[ctrl['dump_key']]:
-                    if robot.dump(game_time, pieces):
-                        pieces.spawn_dump(robot.x, robot.y)
+            # Observations before the input is applied, as FrcEnv sees them
+            demo_obs = {}
+            if record:
+                for robot in sim.robots:
+                    if robot not in sim.robot_ais:
+                        demo_obs[robot] = get_observation(robot, field, pieces, config, sim.game_time, sim.match_duration)
+            
+            # One frame: robots (AI or keyboard), fuel, scoring and penalties
+            sim.step(1, keys=keys, controls=controls, dt=dt)
             
-            # Update Game Pieces
-            pieces.update(robots, game_time, config)
-            # Process Penalties (+15 for opponent)
-            for foul_alliance, amount in pieces.penalties:
-                other = "blue" if foul_alliance == "red" else "red"
-                penalty_scores[other] += amount
+            for robot, obs in demo_obs.items():
+                ctrl = controls[robot.alliance]
+                recorder.add(obs, keyboard_action(keys, ctrl, robot, dumped=keys[ctrl['dump_key']]))
         
         # --- DRAWING ---
         screen.fill((20, 20, 20))
@@ -301,12 +241,10 @@ def main():
             screen.blit(instr, (field_width//2 - instr.get_width()//2, 450))
 
         else: # PLAYING
-            field_surf = pygame.Surface((field_width, field_height))
-            field.draw(field_surf, active_alliance)
+            field_surf.blit(field.get_background(sim.active_alliance(), screen), (0, 0))
             pieces.draw(field_surf)
-            for robot in robots:
+            for robot in sim.robots:
                 robot.draw(field_surf, ppi, font)
-            screen.blit(field_surf, (0, hud_height))
             
             # HUD remains (only drawn in PLAYING state)
             hud_bg = pygame.Rect(0, 0, field_width, hud_height)
@@ -314,13 +252,10 @@ def main():
         pygame.draw.line(screen, (100, 100, 100), (0, hud_height), (field_width, hud_height), 2)
         
         # Timer and Phase
-        screen.blit(font.render(f"TIME: {int(game_time)}s", True, (255, 255, 255)), (20, 10))
-        phase_name = "MATCH OVER"
-        phase_color = (200, 200, 200)
-        if 0 <= game_time < 20: phase_name, phase_color = "AUTO", (255, 255, 0)
-        elif 20 <= game_time < 30: phase_name, phase_color = "TRANSITION", (255, 165, 0)
-        elif 30 <= game_time < 130: phase_name, phase_color = f"TELEOP STAGE {int((game_time-30)//25)+1}", (0, 255, 0)
-        elif 130 <= game_time < 160: phase_name, phase_color = "ENDGAME", (255, 0, 255)
+        screen.blit(font.render(f"TIME: {int(sim.game_time)}s", True, (255, 255, 255)), (20, 10))
+        phase_name = sim.phase()[0]
+        phase_color = PHASE_COLORS.get(phase_name.rsplit(" ", 1)[0], (200, 200, 200))
+        if phase_name == "FINISHED": phase_name = "MATCH OVER"
         
         phase_surf = bold_font.render(f"PHASE: {phase_name}", True, phase_color)
         screen.blit(phase_surf, (20, 35))
@@ -329,22 +264,22 @@ def main():
         # Scores
         score_x_anchor = 250
         # Red HUD
-        red_total = scores['red'] + penalty_scores['red']
+        red_total = sim.scores['red'] + sim.penalty_scores['red']
         red_main = huge_font.render(f"RED: {red_total}", True, (255, 50, 50))
-        red_foul = font.render(f"(+{penalty_scores['red']} Foul)", True, (255, 150, 150))
+        red_foul = font.render(f"(+{sim.penalty_scores['red']} Foul)", True, (255, 150, 150))
         screen.blit(red_foul, (score_x_anchor, 10))
         screen.blit(red_main, (score_x_anchor, 30))
         
         # Blue HUD
-        blue_total = scores['blue'] + penalty_scores['blue']
+        blue_total = sim.scores['blue'] + sim.penalty_scores['blue']
         blue_main = huge_font.render(f"BLUE: {blue_total}", True, (50, 150, 255))
-        blue_foul = font.render(f"(+{penalty_scores['blue']} Foul)", True, (150, 200, 255))
+        blue_foul = font.render(f"(+{sim.penalty_scores['blue']} Foul)", True, (150, 200, 255))
         screen.blit(blue_foul, (score_x_anchor + 220, 10))
         screen.blit(blue_main, (score_x_anchor + 220, 30))
         
         # Robot Status / Controls (Alliance Summaries)
-        red_main = next((r for r in robots if r.alliance == "red"), None)
-        blue_main = next((r for r in robots if r.alliance == "blue"), None)
+        red_main = next((r for r in sim.robots if r.alliance == "red"), None)
+        blue_main = next((r for r in sim.robots if r.alliance == "blue"), None)
         
         if red_main:
             r_shoot = "ON" if red_main.auto_shoot_enabled else "OFF"
@@ -369,20 +304,20 @@ def main():
         screen.blit(font.render(tuning_text, True, (200, 200, 200)), (30, 68))
         
         # Controls (Moved to bottom)
-        controls_text = "RED: WASD + Q E V B | BLUE: ARROWS + < > / SHIFT | R: Reset"
-        screen.blit(font.render(controls_text, True, (180, 180, 180)), (field_width - 550, 105))
+        controls_text = "RED: WASD + Q E V B | BLUE: ARROWS + < > / SHIFT | R: Reset | F5: Save state"
+        screen.blit(font.render(controls_text, True, (180, 180, 180)), (field_width - 680, 105))
         
         # AI Recovery Status
         is_recovering = False
-        for robot in robots:
-            if robot in robot_ais and robot_ais[robot].recovery_timer > 0:
+        for robot in sim.robots:
+            if robot in sim.robot_ais and sim.robot_ais[robot].recovery_timer > 0:
                 is_recovering = True
                 break
         if is_recovering:
             screen.blit(bold_font.render("AI RECOVERING...", True, (255, 255, 0)), (20, 105))
 
         # End of Match Button
-        if sim_state == "PLAYING" and game_time >= 160:
+        if sim_state == "PLAYING" and sim.finished:
             btn_rect = (field_width//2 - 150, field_height//2 + 50 + hud_height, 300, 60)
             pygame.draw.rect(screen, (50, 50, 150), btn_rect, border_radius=10)
             pygame.draw.rect(screen, (200, 200, 200), btn_rect, 2, border_radius=10)
@@ -392,6 +327,9 @@ def main():
         pygame.display.flip()
         clock.tick(60)
 
+    if recorder:
+        recorder.close()
+        print(f"Recorded {recorder.total_rows} samples to {args.record}")
     pygame.quit()
 
 if __name__ == "__main__":
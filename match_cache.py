@@ -0,0 +1,186 @@
+import os
+import ast
+import json
+import time
+import hashlib
+import argparse
+
+# Match Result Cache
+# Headless matches are deterministic given (config, mode, seed) and the simulation code, so their
+# results can be reused: headless_runner / sweep.py look every match up here before simulating it.
+#   key     = sha256 of the normalized config (comments and profiling dropped, keys sorted, the
+#             contents hash of every existing model_path), the mode and the seed
+#   version = sha256 of the simulation sources (sim_sources(): SIM_ROOTS and every repo module they
+#             import, e.g. ml_utils.py via ai.py for model-driven robots); any edit starts a new namespace
+#   layout  <cache_dir>/<version>/<key[:2]>/<key>.json  {"result": ..., "duration": ...}
+# Entries are written atomically by the main process only. prune() evicts least recently used entries
+# (hits touch the file's mtime) until the cache fits max_mb; runs call it with drop_stale=False so
+# switching branches back and forth keeps both versions, --clean also drops every other code version.
+#   python match_cache.py                 (entries and size per code version)
+#   python match_cache.py --clean --max-mb 200
+
+SIM_ROOTS = ("simulation.py", "ai.py", "headless_runner.py")
+NON_SIM_KEYS = ("_comment", "profiling", "match_mode")
+DEFAULT_DIR = "match_cache"
+
+_file_hashes = {}
+
+def file_hash(path):
+    h = _file_hashes.get(path)
+    if h is None:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        h = _file_hashes[path] = digest.hexdigest()
+    return h
+
+def sim_sources(base_dir, roots=SIM_ROOTS):
+    # SIM_ROOTS plus the repo modules they import, transitively (imports inside functions included)
+    sources, todo = [], list(roots)
+    while todo:
+        name = todo.pop(0)
+        if name in sources:
+            continue
+        sources.append(name)
+        with open(os.path.join(base_dir, name), "r", encoding="utf-8") as f:
+            tree = ast.parse(f.read(), name)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                modules = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and node.level == 0:
+                modules = [node.module]
+            else:
+                continue
+            for module in modules:
+                path = module.split(".")[0] + ".py"
+                if path not in sources and os.path.exists(os.path.join(base_dir, path)):
+                    todo.append(path)
+    return sorted(sources)
+
+def code_version(base_dir=None):
+    base_dir = base_dir or os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha256()
+    for name in sim_sources(base_dir):
+        digest.update(name.encode())
+        digest.update(file_hash(os.path.join(base_dir, name)).encode())
+    return digest.hexdigest()[:16]
+
+def normalize_config(config):
+    config = {k: v for k, v in config.items() if k not in NON_SIM_KEYS}
+    for alliance in ("red_alliance", "blue_alliance"):
+        robots = []
+        for robot in config.get(alliance, []):
+            robot = dict(robot)
+            # The loaded policy matters, not where it lives
+            if robot.get('is_ai') and robot.get('model_path') and os.path.exists(robot['model_path']):
+                robot['model_path'] = file_hash(robot['model_path'])
+            robots.append(robot)
+        config[alliance] = robots
+    return config
+
+def config_hash(config):
+    text = json.dumps(normalize_config(config), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(text.encode()).hexdigest()
+
+class MatchCache:
+    def __init__(self, cache_dir=DEFAULT_DIR, max_mb=500, version=None):
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.version = version or code_version()
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+
+    def key(self, config_digest, mode, seed):
+        # config_digest: config_hash(config), computed once per config
+        return hashlib.sha256(f"{config_digest}|{mode}|{seed}".encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, self.version, key[:2], key + ".json")
+
+    def get(self, key):
+        # -> (result, duration) or None
+        path = self._path(key)
+        try:
+            with open(path, "r") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.misses += 1
+            return None
+        os.utime(path)
+        self.hits += 1
+        return entry['result'], entry['duration']
+
+    def put(self, key, result, duration):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "w") as f:
+            json.dump({'result': result, 'duration': duration, 'created': time.time()}, f)
+        os.replace(path + ".tmp", path)
+        self.stored += 1
+
+    def entries(self):
+        # -> [(path, version, size, mtime)]
+        out = []
+        if not os.path.isdir(self.cache_dir):
+            return out
+        for version in os.listdir(self.cache_dir):
+            for root, _, files in os.walk(os.path.join(self.cache_dir, version)):
+                for name in files:
+                    path = os.path.join(root, name)
+                    st = os.stat(path)
+                    out.append((path, version, st.st_size, st.st_mtime))
+        return out
+
+    def prune(self, drop_stale=True):
+        # -> (entries removed, bytes freed)
+        entries = self.entries()
+        removed, freed = 0, 0
+        keep = []
+        for path, version, size, mtime in entries:
+            if drop_stale and version != self.version:
+                os.remove(path)
+                removed += 1
+                freed += size
+            else:
+                keep.append((path, size, mtime))
+        total = sum(size for _, size, _ in keep)
+        for path, size, _ in sorted(keep, key=lambda e: e[2]):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+            removed += 1
+            freed += size
+        self._remove_empty_dirs()
+        return removed, freed
+
+    def _remove_empty_dirs(self):
+        if not os.path.isdir(self.cache_dir):
+            return
+        for root, dirs, files in os.walk(self.cache_dir, topdown=False):
+            if root != self.cache_dir and not os.listdir(root):
+                os.rmdir(root)
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or clean the headless match result cache")
+    parser.add_argument("--dir", type=str, default=DEFAULT_DIR)
+    parser.add_argument("--max-mb", type=float, default=500)
+    parser.add_argument("--clean", action="store_true", help="Drop stale code versions and enforce --max-mb")
+    args = parser.parse_args()
+
+    cache = MatchCache(args.dir, args.max_mb)
+    if args.clean:
+        removed, freed = cache.prune()
+        print(f"Removed {removed} entries ({freed / 1e6:.1f} MB)")
+    per_version = {}
+    for _, version, size, _ in cache.entries():
+        n, b = per_version.get(version, (0, 0))
+        per_version[version] = (n + 1, b + size)
+    print(f"Cache {args.dir} (current code version {cache.version}):")
+    for version, (n, b) in sorted(per_version.items()):
+        print(f"  {version}{' *' if version == cache.version else '  '}  {n:7d} matches  {b / 1e6:8.1f} MB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import math
+import bisect
+
+# Match Clock
+# The phase schedule compiled into a boundary table once per match, so the frame loop only compares
+# game_time against the next boundary instead of re-deriving the phase through if-chains:
+#   0 AUTO | 20 TRANSITION | 30, 55, 80, 105 TELEOP STAGE 1-4 | 130 ENDGAME | 160 FINISHED
+# can_score(alliance) and the hub lights are cached per phase. Callbacks fire as boundaries are crossed:
+#   "auto_winner"  at 20s under the "match" rule; the handler calls set_auto_winner() with the result
+#   "outpost"      the first frame after field.outpost_dump_time (the outposts empty onto the field)
+#   "phase"        every phase change
+#   "hub_switch"   phase changes that change which hubs are active
+# Callbacks take the clock. Phase rules are the ones in simulation.py ("match", "fixed", "open", "closed").
+
+MATCH_DURATION = 160
+DEFAULT_STAGES = ("red", "blue", "red", "blue")
+# (phase, start time, teleop stage index or None = both hubs)
+PHASE_TIMELINE = (
+    ("AUTO", 0, None),
+    ("TRANSITION", 20, None),
+    ("TELEOP STAGE 1", 30, 0),
+    ("TELEOP STAGE 2", 55, 1),
+    ("TELEOP STAGE 3", 80, 2),
+    ("TELEOP STAGE 4", 105, 3),
+    ("ENDGAME", 130, None),
+    ("FINISHED", MATCH_DURATION, None),
+)
+AUTO_END = 20
+EVENTS = ("auto_winner", "outpost", "phase", "hub_switch")
+
+_OPEN = {"red": True, "blue": True}
+_CLOSED = {"red": False, "blue": False}
+
+class MatchClock:
+    def __init__(self, phase_rule="match", outpost_time=30.0):
+        self.phase_rule = phase_rule
+        self.outpost_time = outpost_time
+        self.callbacks = {name: [] for name in EVENTS}
+        self._phase_starts = [start for _, start, _ in PHASE_TIMELINE]
+        # (time, kind, phase index); at equal times the auto winner is settled before the phase changes.
+        # The outpost releases strictly after outpost_time, i.e. at the next float up
+        events = [(start, 1, "phase", i) for i, (_, start, _) in enumerate(PHASE_TIMELINE) if start > 0]
+        if phase_rule == "match":
+            events.append((AUTO_END, 0, "auto_winner", None))
+        events.append((math.nextafter(outpost_time, math.inf), 2, "outpost", None))
+        self._events = [(t, kind, arg) for t, _, kind, arg in sorted(events, key=lambda e: e[:2])]
+        self._times = [e[0] for e in self._events]
+        self.reset()
+
+    def on(self, event, callback):
+        if event not in self.callbacks:
+            raise ValueError(f"Unknown clock event '{event}' (expected one of {', '.join(EVENTS)})")
+        self.callbacks[event].append(callback)
+
+    def reset(self, stage_alliances=DEFAULT_STAGES, auto_winner=None):
+        self.auto_winner = auto_winner
+        self.stage_alliances = list(stage_alliances)
+        self.seek(0.0)
+
+    def seek(self, game_time):
+        # Jump to game_time (snapshot restores) without firing the callbacks of skipped boundaries
+        self.time = game_time
+        self._next = bisect.bisect_right(self._times, game_time)
+        self.next_time = self._times[self._next] if self._next < len(self._times) else math.inf
+        self._set_phase(max(0, bisect.bisect_right(self._phase_starts, game_time) - 1))
+
+    def advance(self, game_time):
+        # Fires every boundary reached by game_time; callers skip the call while game_time < next_time
+        self.time = game_time
+        while game_time >= self.next_time:
+            _, kind, arg = self._events[self._next]
+            self._next += 1
+            self.next_time = self._times[self._next] if self._next < len(self._times) else math.inf
+            if kind == "phase":
+                active = self.active
+                self._set_phase(arg)
+                self._fire("phase")
+                if self.active != active:
+                    self._fire("hub_switch")
+            else:
+                self._fire(kind)
+
+    def _fire(self, event):
+        for callback in self.callbacks[event]:
+            callback(self)
+
+    def set_auto_winner(self, winner):
+        # Winner of auto goes second: its hub is active in teleop stages 2 and 4 (tie keeps the default)
+        self.auto_winner = winner
+        if winner == "red":
+            self.stage_alliances = ["blue", "red", "blue", "red"]
+        elif winner == "blue":
+            self.stage_alliances = list(DEFAULT_STAGES)
+        self._set_phase(self.phase_index)
+
+    def _set_phase(self, index):
+        self.phase_index = index
+        self.phase, _, stage = PHASE_TIMELINE[index]
+        if self.phase == "FINISHED":
+            active = None
+        else:
+            active = "both" if stage is None else self.stage_alliances[stage]
+        if self.phase_rule == "open":
+            self.active = "both"
+            self.can = _OPEN
+        elif self.phase_rule == "closed":
+            self.active = active
+            self.can = _CLOSED
+        else:
+            self.active = active
+            self.can = {"red": active == "both" or active == "red", "blue": active == "both" or active == "blue"}
+
+    def can_score(self, alliance):
+        return self.can[alliance]
@@ -0,0 +1,244 @@
+import os
+import csv
+import json
+import math
+
+# Batch Match Statistics
+# headless_runner streams one record per match (run_match's result plus match_id, seed and wall time)
+# into a ResultWriter and a BatchStats. Nothing is kept per match in memory: BatchStats holds running
+# sums (Welford for means/variances) and reports normal-approximation confidence intervals for the
+# mean scores and the red-minus-blue score difference, and a Wilson interval for the red win rate
+# (ties count as half a win). ci_half_width() is what --until-ci stops on.
+#   .jsonl  one JSON object per match, nested as run_match returns it
+#   .csv    the same record flattened (phase_scores.AUTO.red, robots.0.scored, ...) for spreadsheets/pandas
+
+MATCH_SECONDS = 160
+
+def z_score(confidence):
+    # Two-sided normal quantile (inverse error function by bisection, stdlib only)
+    lo, hi = 0.0, 10.0
+    for _ in range(60):
+        mid = (lo + hi) / 2
+        if math.erf(mid / math.sqrt(2)) < confidence:
+            lo = mid
+        else:
+            hi = mid
+    return (lo + hi) / 2
+
+def wilson_interval(successes, n, z):
+    if n == 0:
+        return 0.0, 1.0
+    p = successes / n
+    denom = 1 + z * z / n
+    center = (p + z * z / (2 * n)) / denom
+    half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denom
+    return max(0.0, center - half), min(1.0, center + half)
+
+class RunningMean:
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.max = None
+
+    def add(self, x):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+        self.max = x if self.max is None else max(self.max, x)
+
+    def std(self):
+        return math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else 0.0
+
+    def interval(self, z):
+        half = z * self.std() / math.sqrt(self.n) if self.n > 1 else float('inf')
+        return self.mean - half, self.mean + half
+
+class BatchStats:
+    METRICS = ("win_rate", "score_diff")
+
+    def __init__(self, confidence=0.95):
+        self.confidence = confidence
+        self.z = z_score(confidence)
+        self.red_wins = 0
+        self.blue_wins = 0
+        self.ties = 0
+        self.red = RunningMean()
+        self.blue = RunningMean()
+        self.red_pen = RunningMean()
+        self.blue_pen = RunningMean()
+        self.diff = RunningMean()
+        self.phase = {} # phase -> (red RunningMean, blue RunningMean)
+        self.sim_seconds = 0.0 # Simulated by this run only (the real-time factor)
+        self.sources = {} # source -> matches: "simulated" here, or reused (e.g. "cache")
+
+    @property
+    def n(self):
+        return self.diff.n
+
+    def add(self, result, source="simulated"):
+        # source: where the result came from; only "simulated" matches count towards the real-time factor
+        red = result['scores']['red'] + result['penalties']['red']
+        blue = result['scores']['blue'] + result['penalties']['blue']
+        if red > blue: self.red_wins += 1
+        elif blue > red: self.blue_wins += 1
+        else: self.ties += 1
+        self.red.add(red)
+        self.blue.add(blue)
+        self.red_pen.add(result['penalties']['red'])
+        self.blue_pen.add(result['penalties']['blue'])
+        self.diff.add(red - blue)
+        for phase, s in result.get('phase_scores', {}).items():
+            r, b = self.phase.setdefault(phase, (RunningMean(), RunningMean()))
+            r.add(s['red'])
+            b.add(s['blue'])
+        self.sources[source] = self.sources.get(source, 0) + 1
+        if source == "simulated":
+            self.sim_seconds += MATCH_SECONDS
+
+    def win_rate_interval(self):
+        return wilson_interval(self.red_wins + 0.5 * self.ties, self.n, self.z)
+
+    def ci_half_width(self, metric):
+        lo, hi = self.win_rate_interval() if metric == "win_rate" else self.diff.interval(self.z)
+        return (hi - lo) / 2
+
+    def progress_line(self):
+        lo, hi = self.win_rate_interval()
+        d_lo, d_hi = self.diff.interval(self.z)
+        return (f"  [{self.n} matches] red win rate {(self.red_wins + 0.5 * self.ties) / self.n * 100:.1f}% "
+                f"[{lo * 100:.1f}, {hi * 100:.1f}]  score diff {self.diff.mean:+.1f} [{d_lo:+.1f}, {d_hi:+.1f}]")
+
+    def summary(self, total_dur):
+        n = self.n
+        pct = int(round(self.confidence * 100))
+        lo, hi = self.win_rate_interval()
+        d_lo, d_hi = self.diff.interval(self.z)
+        simulated = self.sources.get("simulated", 0)
+        if simulated and total_dur > 0:
+            speed = f"{simulated} simulated, {self.sim_seconds / total_dur:.1f}x real-time"
+        else:
+            speed = "no matches simulated"
+        lines = [
+            "-" * 40,
+            "SUMMARY STATISTICS",
+            f"Total Matches: {n}",
+            f"Total Time:    {total_dur:.2f}s ({speed})",
+        ]
+        reused = [f"{count} from {source}" for source, count in self.sources.items() if source != "simulated"]
+        if reused:
+            lines.append(f"Reused:        {', '.join(reused)}")
+        lines += [
+            "-" * 20,
+            f"RED WINS:  {self.red_wins} ({self.red_wins/n*100:.1f}%)",
+            f"BLUE WINS: {self.blue_wins} ({self.blue_wins/n*100:.1f}%)",
+        ]
+        if self.ties > 0: lines.append(f"TIES:      {self.ties} ({self.ties/n*100:.1f}%)")
+        lines += [
+            "-" * 20,
+            f"RED Score:  Avg: {self.red.mean:.1f} (Avg Pen: {self.red_pen.mean:.1f}) | Max: {self.red.max}",
+            f"BLUE Score: Avg: {self.blue.mean:.1f} (Avg Pen: {self.blue_pen.mean:.1f}) | Max: {self.blue.max}",
+            "-" * 20,
+            f"{pct}% CI  Red win rate: [{lo * 100:.1f}%, {hi * 100:.1f}%]  Score diff (R-B): {self.diff.mean:+.1f} [{d_lo:+.1f}, {d_hi:+.1f}]",
+        ]
+        if self.phase:
+            lines.append("Avg fuel scored per phase (RED / BLUE):")
+            for phase, (r, b) in self.phase.items():
+                lines.append(f"  {phase:<16s} {r.mean:6.1f} / {b.mean:6.1f}")
+        lines.append("=" * 40)
+        return "\n".join(lines)
+
+def flatten(record, prefix=""):
+    out = {}
+    items = record.items() if isinstance(record, dict) else enumerate(record)
+    for k, v in items:
+        key = f"{prefix}{k}"
+        if isinstance(v, (dict, list)):
+            out.update(flatten(v, key + "."))
+        else:
+            out[key] = v
+    return out
+
+class ResultWriter:
+    """
+    Appends match records to a .jsonl or .csv file as they arrive (flushed per match, so a
+    partially finished batch is still readable). The CSV header comes from the first record.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.is_csv = path.endswith(".csv")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._f = open(path, "w", newline="" if self.is_csv else None)
+        self._csv = None
+
+    def write(self, record):
+        if self.is_csv:
+            row = flatten(record)
+            if self._csv is None:
+                self._csv = csv.DictWriter(self._f, fieldnames=list(row.keys()), extrasaction='ignore')
+                self._csv.writeheader()
+            self._csv.writerow(row)
+        else:
+            self._f.write(json.dumps(record) + "\n")
+        self._f.flush()
+
+    def close(self):
+        self._f.close()
+
+class BatchJournal:
+    """
+    Append-only progress log of a headless batch (JSONL, one fsync'd line per finished match):
+      {"type": "batch", "seed", "mode", "config"}                  header, config = match_cache.config_hash
+      {"type": "match", "match_id", "seed", "result", "duration"}  in completion order
+    load() tolerates a torn last line from a killed process; resuming truncates it away and
+    appends after the last complete record.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._f = None
+
+    def load(self):
+        # -> (header or None, {match_id: (seed, result, duration)}, bytes of complete lines)
+        header, done, valid = None, {}, 0
+        try:
+            with open(self.path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        break
+                    valid += len(line)
+                    if rec.get('type') == "batch":
+                        header = rec
+                    elif rec.get('type') == "match":
+                        done[rec['match_id']] = (rec['seed'], rec['result'], rec['duration'])
+        except FileNotFoundError:
+            pass
+        return header, done, valid
+
+    def open(self, header=None, valid_bytes=None):
+        # New journal: pass header. Resume: pass valid_bytes from load()
+        if valid_bytes is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._f = open(self.path, "wb")
+            self._append(dict(type="batch", **header))
+        else:
+            self._f = open(self.path, "r+b")
+            self._f.truncate(valid_bytes)
+            self._f.seek(valid_bytes)
+
+    def _append(self, record):
+        self._f.write((json.dumps(record) + "\n").encode())
+        self._f.flush()
+        os.fsync(self._f.fileno())
+
+    def append(self, match_id, seed, result, duration):
+        self._append({'type': "match", 'match_id': match_id, 'seed': seed, 'result': result, 'duration': duration})
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
@@ -1,7 +1,92 @@
+import os
+import json
 import numpy as np
 import math
 
-def get_observation(robot, field, pieces, sim_config, game_time, match_duration, can_score=False, can_pass=False, target_x=None, target_y=None):
+AFFINITY_LAYOUTS = ("none", "packed", "spread")
+
+def tuned_config_path(path="ml_config.json"):
+    # autotune.py output next to the config it was tuned from: ml_config.json -> ml_config.tuned.json
+    return os.path.splitext(path)[0] + ".tuned.json"
+
+def tuned_env_key(env_kind, mode=None):
+    # Which env a tuned config was measured on: "frc" or "specialized:<mode>"
+    return f"specialized:{mode}" if env_kind == "specialized" else env_kind
+
+def load_ml_config(path="ml_config.json", use_tuned=True, env=None):
+    # ml_config.json with the training_params autotune.py measured for this machine applied on top.
+    # env: tuned_env_key() of the caller's env; the tuned values only apply to the env they were measured on
+    with open(path, "r") as f:
+        ml_config = json.load(f)
+    tuned_path = tuned_config_path(path)
+    if use_tuned and env is not None and os.path.exists(tuned_path):
+        with open(tuned_path, "r") as f:
+            tuned = json.load(f)
+        cpus = len(available_cores())
+        if tuned.get('machine', {}).get('cpus', cpus) != cpus:
+            print(f"Warning: {tuned_path} was tuned on a {tuned['machine']['cpus']}-core machine (this one has {cpus}); ignoring it.")
+        elif tuned.get('env') != env:
+            print(f"Note: {tuned_path} was tuned for the {tuned.get('env')} env (this is {env}); ignoring it.")
+        else:
+            overrides = tuned.get('training_params', {})
+            ml_config['training_params'].update(overrides)
+            print(f"Using tuned training_params from {tuned_path}: {overrides}")
+    return ml_config
+
+def available_cores():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+def worker_cores(rank, n_workers, layout, cores=None):
+    # CPU(s) for env worker `rank` under an affinity layout (None = leave it to the OS scheduler).
+    # packed: consecutive cores after the learner's core 0; spread: evenly spaced over all cores.
+    if layout == "none":
+        return None
+    cores = cores if cores is not None else available_cores()
+    if layout == "packed":
+        return [cores[(rank + 1) % len(cores)]]
+    if layout == "spread":
+        stride = max(1, len(cores) // (n_workers + 1))
+        return [cores[((rank + 1) * stride) % len(cores)]]
+    raise ValueError(f"Unknown affinity layout '{layout}' (expected one of {AFFINITY_LAYOUTS})")
+
+def pin_worker(rank, n_workers, layout):
+    cores = worker_cores(rank, n_workers, layout)
+    if cores is not None and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+
+def sort_fuels_by_distance(robot, pieces):
+    # [(dist_sq, dx_rel, dy_rel, fuel)] for every live fuel, nearest first.
+    # dx_rel/dy_rel are rotated into the robot frame (+X is Front (Intake), +Y is Left).
+    rad = math.radians(robot.angle)
+    c, s = math.cos(-rad), math.sin(-rad)
+    fuels = []
+    for fuel in pieces.fuels:
+        if not fuel.collected:
+            dx_field = fuel.x - robot.x
+            dy_field = fuel.y - robot.y
+            dist_sq = dx_field**2 + dy_field**2
+            # Rotate into robot frame
+            dx_rel = dx_field * c - dy_field * s
+            dy_rel = dx_field * s + dy_field * c
+            fuels.append((dist_sq, dx_rel, dy_rel, fuel))
+    
+    fuels.sort(key=lambda x: x[0])
+    return fuels
+
+def action_to_inputs(action):
+    # Map a 6-dim policy action to robot inputs (States, not Toggles)
+    return {
+        'x': action[0],
+        'y': action[1],
+        'rot': action[2],
+        'shoot_state': action[3] > 0.5,
+        'pass_state': action[4] > 0.5,
+        'dump_state': action[5] > 0.5
+    }
+
+def get_observation(robot, field, pieces, sim_config, game_time, match_duration, can_score=False, can_pass=False, target_x=None, target_y=None, sorted_fuels=None):
     is_red = robot.alliance == "red"
     width = sim_config['field']['width_inches']
     height = sim_config['field']['length_inches']
@@ -23,18 +108,8 @@ def get_observation(robot, field, pieces, sim_config, game_time, match_duration,
     c, s = math.cos(-rad), math.sin(-rad)
 
     # 2. Closest Fuel - 20 features (Indices 6-25)
-    fuels = []
-    for fuel in pieces.fuels:
-        if not fuel.collected:
-            dx_field = fuel.x - robot.x
-            dy_field = fuel.y - robot.y
-            dist_sq = dx_field**2 + dy_field**2
-            # Rotate into robot frame
-            dx_rel = dx_field * c - dy_field * s
-            dy_rel = dx_field * s + dy_field * c
-            fuels.append((dist_sq, dx_rel, dy_rel, fuel))
-    
-    fuels.sort(key=lambda x: x[0])
+    # (sorted_fuels may be handed in from the env's per-step StepContext to avoid a second scan)
+    fuels = sorted_fuels if sorted_fuels is not None else sort_fuels_by_distance(robot, pieces)
     obs_fuel = []
     for i in range(5):
         if i < len(fuels):
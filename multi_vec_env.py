@@ -0,0 +1,176 @@
+import time
+import multiprocessing as mp
+
+import numpy as np
+from stable_baselines3.common.vec_env.base_vec_env import VecEnv, CloudpickleWrapper
+
+# Parameter-Sharing VecEnv for MultiFrcEnv
+# Each sim (one MultiFrcEnv per worker process) contributes one VecEnv slot per controlled agent,
+# so SB3 sees num_envs = workers * agents and a single PPO policy learns from every robot at once.
+# Slot order: [worker 0 agents..., worker 1 agents..., ...]. Each agent's info gets the Monitor-style
+# 'episode' entry plus 'scored' / rew_* / perf_* at match end, so TensorboardCallback works unchanged.
+
+class _SimRunner:
+    # Runs one MultiFrcEnv and applies the VecEnv conventions (auto-reset, terminal_observation, episode stats)
+    def __init__(self, env):
+        self.env = env
+        self.steps = 0
+        self.t_start = time.time()
+
+    def handle(self, cmd, data):
+        env = self.env
+        if cmd == "step":
+            obs, rewards, terminated, truncated, infos = env.step_batch(data)
+            self.steps += 1
+            done = terminated or truncated
+            if done:
+                elapsed = round(time.time() - self.t_start, 6)
+                for i, (info, slot) in enumerate(zip(infos, env.slots)):
+                    info['terminal_observation'] = obs[i]
+                    info['TimeLimit.truncated'] = truncated and not terminated
+                    info['episode'] = {'r': round(float(slot.total_reward), 6), 'l': self.steps, 't': elapsed}
+                obs = env.reset_batch()
+                self.steps = 0
+            return obs, rewards, done, infos
+        if cmd == "reset":
+            seed, options = data
+            self.steps = 0
+            return env.reset_batch(seed=seed, options=options)
+        if cmd == "get_spaces":
+            return env.single_observation_space, env.single_action_space, env.num_agents
+        if cmd == "env_method":
+            name, args, kwargs = data
+            return getattr(env, name)(*args, **kwargs)
+        if cmd == "get_attr":
+            return getattr(env, data)
+        if cmd == "set_attr":
+            return setattr(env, data[0], data[1])
+        if cmd == "render":
+            return env.render()
+        if cmd == "close":
+            return env.close()
+        raise NotImplementedError(f"`{cmd}` is not implemented in the worker")
+
+def _worker(remote, parent_remote, env_fn_wrapper):
+    parent_remote.close()
+    runner = _SimRunner(env_fn_wrapper.var())
+    try:
+        while True:
+            cmd, data = remote.recv()
+            remote.send(runner.handle(cmd, data))
+            if cmd == "close":
+                remote.close()
+                break
+    except (EOFError, KeyboardInterrupt):
+        pass
+
+class MultiAgentVecEnv(VecEnv):
+    def __init__(self, env_fns, use_subprocess=True, start_method=None):
+        # env_fns: callables returning MultiFrcEnv; use_subprocess=False runs them in this process (debugging)
+        self.use_subprocess = use_subprocess
+        self.waiting = False
+        self.closed = False
+        if use_subprocess:
+            ctx = mp.get_context(start_method or ("forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"))
+            self.remotes, work_remotes = zip(*[ctx.Pipe() for _ in env_fns])
+            self.processes = []
+            for work_remote, remote, env_fn in zip(work_remotes, self.remotes, env_fns):
+                process = ctx.Process(target=_worker, args=(work_remote, remote, CloudpickleWrapper(env_fn)), daemon=True)
+                process.start()
+                self.processes.append(process)
+                work_remote.close()
+        else:
+            self.runners = [_SimRunner(env_fn()) for env_fn in env_fns]
+
+        self.n_sims = len(env_fns)
+        observation_space, action_space, self.agents_per_sim = self._call(0, "get_spaces", None)
+        super().__init__(self.n_sims * self.agents_per_sim, observation_space, action_space)
+
+    # --- worker plumbing ---
+    def _send(self, sim, cmd, data):
+        if self.use_subprocess:
+            self.remotes[sim].send((cmd, data))
+        else:
+            self._results[sim] = self.runners[sim].handle(cmd, data)
+
+    def _recv(self, sim):
+        if self.use_subprocess:
+            return self.remotes[sim].recv()
+        return self._results.pop(sim)
+
+    def _call(self, sim, cmd, data):
+        self._results = {}
+        self._send(sim, cmd, data)
+        return self._recv(sim)
+
+    def _call_all(self, cmd, data_per_sim):
+        self._results = {}
+        for sim, data in enumerate(data_per_sim):
+            self._send(sim, cmd, data)
+        return [self._recv(sim) for sim in range(self.n_sims)]
+
+    def _sims(self, indices):
+        # VecEnv slot indices -> the sims that own them (in order, without repeats)
+        return sorted({i // self.agents_per_sim for i in self._get_indices(indices)})
+
+    # --- VecEnv API ---
+    def reset(self):
+        # A sim is seeded from its first agent slot
+        data = [(self._seeds[sim * self.agents_per_sim], self._options[sim * self.agents_per_sim]) for sim in range(self.n_sims)]
+        obs = self._call_all("reset", data)
+        self._reset_seeds()
+        self._reset_options()
+        return np.concatenate(obs)
+
+    def step_async(self, actions):
+        actions = np.asarray(actions).reshape(self.n_sims, self.agents_per_sim, -1)
+        self._results = {}
+        for sim in range(self.n_sims):
+            self._send(sim, "step", actions[sim])
+        self.waiting = True
+
+    def step_wait(self):
+        results = [self._recv(sim) for sim in range(self.n_sims)]
+        self.waiting = False
+        obs = np.concatenate([r[0] for r in results])
+        rewards = np.concatenate([r[1] for r in results])
+        dones = np.repeat([r[2] for r in results], self.agents_per_sim)
+        infos = [info for r in results for info in r[3]]
+        return obs, rewards, dones, infos
+
+    def close(self):
+        if self.closed:
+            return
+        if self.use_subprocess:
+            if self.waiting:
+                for remote in self.remotes:
+                    remote.recv()
+            for remote in self.remotes:
+                remote.send(("close", None))
+            for remote in self.remotes:
+                remote.recv()
+            for process in self.processes:
+                process.join()
+        else:
+            for runner in self.runners:
+                runner.handle("close", None)
+        self.closed = True
+
+    def get_images(self):
+        return [self._call(sim, "render", None) for sim in range(self.n_sims)]
+
+    def get_attr(self, attr_name, indices=None):
+        values = {sim: self._call(sim, "get_attr", attr_name) for sim in self._sims(indices)}
+        return [values[i // self.agents_per_sim] for i in self._get_indices(indices)]
+
+    def set_attr(self, attr_name, value, indices=None):
+        for sim in self._sims(indices):
+            self._call(sim, "set_attr", (attr_name, value))
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        # Called once per sim; every agent slot of that sim gets the same result
+        values = {sim: self._call(sim, "env_method", (method_name, method_args, method_kwargs)) for sim in self._sims(indices)}
+        return [values[i // self.agents_per_sim] for i in self._get_indices(indices)]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]
@@ -0,0 +1,224 @@
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+
+import numpy as np
+
+# Self-Play Opponent Pool
+# Frozen PPO policies exported from ml_models/ checkpoints into a pool directory:
+#   <pool_dir>/<name>.npy   float32, every policy-net layer + action_net flattened into one vector
+#   <pool_dir>/index.json   layer layout per policy + learner results against it
+# Workers np.load(..., mmap_mode='r') the .npy files, so all SubprocVecEnv workers share one read-only
+# copy of each policy (no torch needed in the workers). Opponents are sampled by learner win rate
+# (prioritized fictitious self-play: the policies we still lose to come up more often). The training
+# callback exports new checkpoints and writes the results; workers notice the new index on reset.
+#
+# ml_config.json env_params.self_play:
+#   {"enabled": true, "pool_dir": "ml_models/opponent_pool", "sources": ["ml_models"],
+#    "max_policies": 20, "pfsp_power": 2.0, "heuristic_prob": 0.2}
+
+INDEX_NAME = "index.json"
+
+def _index_path(pool_dir):
+    return os.path.join(pool_dir, INDEX_NAME)
+
+def load_index(pool_dir):
+    try:
+        with open(_index_path(pool_dir), 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'policies': {}}
+
+def save_index(pool_dir, index):
+    # Atomic replace so workers never read a half-written index
+    path = _index_path(pool_dir)
+    with open(path + ".tmp", 'w') as f:
+        json.dump(index, f, indent=4)
+    os.replace(path + ".tmp", path)
+
+class NumpyPolicy:
+    """
+    Deterministic forward pass of an SB3 MlpPolicy actor (Tanh hidden layers -> action_net mean),
+    evaluated for a whole batch of observations at once. Weights are views into the pool memmap.
+    """
+    def __init__(self, name, flat, layers):
+        self.name = name
+        self.layers = []
+        for w_off, rows, cols, b_off in layers:
+            w = flat[w_off:w_off + rows * cols].reshape(rows, cols)
+            b = flat[b_off:b_off + rows]
+            self.layers.append((w, b))
+
+    def __call__(self, obs):
+        # obs: (n, 48) -> actions (n, 6), clipped to the Box bounds like PPO.predict
+        x = np.asarray(obs, dtype=np.float32)
+        for w, b in self.layers[:-1]:
+            x = np.tanh(x @ w.T + b)
+        w, b = self.layers[-1]
+        return np.clip(x @ w.T + b, -1.0, 1.0)
+
+def policy_arrays(policy):
+    # policy: SB3 ActorCriticPolicy (e.g. model.policy) -> (flat float32 weights, layer layout) of the actor path
+    state = {k: v.detach().cpu().numpy().astype(np.float32) for k, v in policy.state_dict().items()}
+    n_hidden = len([k for k in state if k.startswith("mlp_extractor.policy_net.") and k.endswith(".weight")])
+    keys = [f"mlp_extractor.policy_net.{2 * i}" for i in range(n_hidden)] + ["action_net"]
+
+    chunks, layers, offset = [], [], 0
+    for key in keys:
+        w, b = state[f"{key}.weight"], state[f"{key}.bias"]
+        layers.append([offset, w.shape[0], w.shape[1], offset + w.size])
+        chunks += [w.ravel(), b]
+        offset += w.size + b.size
+    return np.concatenate(chunks), layers
+
+def export_policy(policy, pool_dir, name, source=None):
+    flat, layers = policy_arrays(policy)
+    os.makedirs(pool_dir, exist_ok=True)
+    path = os.path.join(pool_dir, f"{name}.npy")
+    np.save(path + ".tmp.npy", flat)
+    os.replace(path + ".tmp.npy", path)
+    return {'file': f"{name}.npy", 'layers': layers, 'source': source, 'added': time.time(), 'games': 0, 'wins': 0.0}
+
+def export_checkpoint(model_path, pool_dir, name=None):
+    from stable_baselines3 import PPO
+    name = name or os.path.splitext(os.path.basename(model_path))[0]
+    model = PPO.load(model_path, device="cpu")
+    return name, export_policy(model.policy, pool_dir, name, source=os.path.abspath(model_path))
+
+def sync_pool(pool_dir, sources, max_policies=20, index=None):
+    # Export checkpoints under `sources` that are not in the pool yet, keeping the newest max_policies.
+    # Returns (index, names added).
+    index = index if index is not None else load_index(pool_dir)
+    known = {entry.get('source') for entry in index['policies'].values()}
+    pool_abs = os.path.abspath(pool_dir)
+    found = []
+    for src in sources:
+        for path in glob.glob(os.path.join(src, "**", "*.zip"), recursive=True):
+            path = os.path.abspath(path)
+            if path not in known and not path.startswith(pool_abs):
+                found.append((os.path.getmtime(path), path))
+    added = []
+    for _, path in sorted(found)[-max_policies:]:
+        # Unique name: run folder + checkpoint file
+        name = f"{os.path.basename(os.path.dirname(path))}_{os.path.splitext(os.path.basename(path))[0]}"
+        try:
+            name, entry = export_checkpoint(path, pool_dir, name)
+        except Exception as e:
+            print(f"Warning: could not add {path} to the opponent pool: {e}")
+            continue
+        index['policies'][name] = entry
+        added.append(name)
+
+    # Retire the oldest policies past the cap (workers holding a memmap keep a valid view until they refresh)
+    names = sorted(index['policies'], key=lambda n: index['policies'][n]['added'])
+    for name in names[:max(0, len(names) - max_policies)]:
+        entry = index['policies'].pop(name)
+        try:
+            os.remove(os.path.join(pool_dir, entry['file']))
+        except FileNotFoundError:
+            pass
+    if added or len(names) > max_policies:
+        save_index(pool_dir, index)
+    return index, added
+
+def record_results(pool_dir, results, index=None):
+    # results: [(opponent name, learner result)] with result 1.0 win / 0.5 draw / 0.0 loss
+    index = index if index is not None else load_index(pool_dir)
+    changed = False
+    for name, result in results:
+        entry = index['policies'].get(name)
+        if entry is not None:
+            entry['games'] += 1
+            entry['wins'] += result
+            changed = True
+    if changed:
+        save_index(pool_dir, index)
+    return index
+
+def win_rate(entry):
+    # Learner win rate with a one-win / one-loss prior (new policies start at 0.5)
+    return (entry['wins'] + 1.0) / (entry['games'] + 2.0)
+
+class OpponentPool:
+    """
+    Worker-side view of the pool: re-reads index.json when it changes, memory-maps new policies and
+    samples one per episode (None = heuristic RobotAI).
+    """
+    def __init__(self, pool_dir, pfsp_power=2.0, heuristic_prob=0.2):
+        self.pool_dir = pool_dir
+        self.pfsp_power = pfsp_power
+        self.heuristic_prob = heuristic_prob
+        self.policies = {}
+        self.index = {'policies': {}}
+        self._index_mtime = None
+
+    def refresh(self):
+        try:
+            mtime = os.path.getmtime(_index_path(self.pool_dir))
+        except FileNotFoundError:
+            return
+        if mtime == self._index_mtime:
+            return
+        self._index_mtime = mtime
+        self.index = load_index(self.pool_dir)
+        entries = self.index['policies']
+        for name in list(self.policies):
+            if name not in entries:
+                del self.policies[name]
+        for name, entry in entries.items():
+            if name not in self.policies:
+                try:
+                    flat = np.load(os.path.join(self.pool_dir, entry['file']), mmap_mode='r')
+                except FileNotFoundError:
+                    continue # Retired between the index write and now
+                self.policies[name] = NumpyPolicy(name, flat, entry['layers'])
+
+    def sample(self, rng):
+        # rng: numpy Generator (the env's np_random)
+        self.refresh()
+        if not self.policies or rng.random() < self.heuristic_prob:
+            return None
+        names = list(self.policies)
+        entries = self.index['policies']
+        w = np.array([(1.0 - win_rate(entries[n])) ** self.pfsp_power for n in names]) + 1e-6
+        return self.policies[names[int(rng.choice(len(names), p=w / w.sum()))]]
+
+def self_play_config(ml_config):
+    return ml_config['env_params'].get('self_play', {})
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the self-play opponent pool")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    add = sub.add_parser("add", help="Export one checkpoint into the pool")
+    add.add_argument("model", type=str)
+    add.add_argument("--name", type=str)
+    sub.add_parser("sync", help="Export new checkpoints from env_params.self_play.sources")
+    sub.add_parser("list", help="Show pool policies and learner win rates")
+    args = parser.parse_args()
+
+    with open("ml_config.json", "r") as f:
+        sp_cfg = self_play_config(json.load(f))
+    pool_dir = sp_cfg.get('pool_dir', os.path.join("ml_models", "opponent_pool"))
+
+    if args.cmd == "add":
+        if not os.path.exists(args.model):
+            print(f"Error: Specified model path {args.model} not found.")
+            sys.exit(1)
+        index = load_index(pool_dir)
+        name, entry = export_checkpoint(args.model, pool_dir, args.name)
+        index['policies'][name] = entry
+        save_index(pool_dir, index)
+        print(f"Added {name} to {pool_dir}")
+    elif args.cmd == "sync":
+        _, added = sync_pool(pool_dir, sp_cfg.get('sources', ["ml_models"]), sp_cfg.get('max_policies', 20))
+        print(f"Added {len(added)} policies: {', '.join(added) or '-'}")
+    else:
+        index = load_index(pool_dir)
+        for name, entry in sorted(index['policies'].items(), key=lambda kv: kv[1]['added']):
+            print(f"  {name:<48} games {entry['games']:5d}  learner win rate {win_rate(entry):.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+import os
+import json
+import time
+import shutil
+import collections
+import multiprocessing as mp
+
+import numpy as np
+
+from ml_utils import available_cores
+
+# Population-Based Training (train_specialized.py --pbt K)
+# K PPO members train side by side, each in its own process with a small SubprocVecEnv. Every
+# `interval_steps` (per member) they report a fitness and their weights to the coordinator (the main
+# process) over a pipe. The bottom `exploit_fraction` of the population copies policy + optimizer state
+# from a random top member (in memory, no zip round trip) and perturbs the inherited hyperparameters
+# and reward_shaping terms by one of `perturb_factors`.
+# Fitness has to be comparable across members whose reward weights differ, so it is an episode info key
+# that does not depend on them: fuel scored (janitor) or fuel stashed into our zone (lobber).
+# Cores are packed per member: the learner gets the first core of its block, the env workers the rest.
+#
+# ml_config.json training_params.pbt:
+#   {"members": 4, "envs_per_member": 6, "interval_steps": 250000, "exploit_fraction": 0.25,
+#    "perturb_factors": [0.8, 1.2], "hyperparams": ["learning_rate", "ent_coef", "gamma"],
+#    "reward_keys": [...], "fitness": {"janitor": "scored", "lobber": "stashed"}, "fitness_window": 20}
+
+HPARAM_BOUNDS = {
+    'learning_rate': (1e-5, 1e-2),
+    'ent_coef': (0.0, 0.1),
+    'gamma': (0.9, 0.9999),
+}
+
+def pbt_config(ml_config):
+    return ml_config['training_params'].get('pbt', {})
+
+def plan_cores(n_members, envs_per_member, cores=None):
+    # One block of (1 learner + envs_per_member) cores per member. If the machine is too small the
+    # blocks wrap around and members share cores (still runs, just oversubscribed).
+    cores = cores if cores is not None else available_cores()
+    per = envs_per_member + 1
+    if n_members * per > len(cores):
+        print(f"Warning: PBT wants {n_members} x {per} cores but only {len(cores)} are available; members will share cores.")
+    return [[cores[(m * per + j) % len(cores)] for j in range(per)] for m in range(n_members)]
+
+def _pin(cores):
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+
+def perturb(hparams, rew_cfg, cfg, rng):
+    # Multiply the listed hyperparameters / reward terms by a random factor (gamma on its horizon 1 - gamma)
+    factors = cfg.get('perturb_factors', [0.8, 1.2])
+    new_hparams = dict(hparams)
+    for key in cfg.get('hyperparams', list(HPARAM_BOUNDS)):
+        value = hparams[key]
+        f = float(rng.choice(factors))
+        value = 1.0 - (1.0 - value) * f if key == 'gamma' else value * f
+        lo, hi = HPARAM_BOUNDS.get(key, (-np.inf, np.inf))
+        new_hparams[key] = float(np.clip(value, lo, hi))
+    new_rew = dict(rew_cfg)
+    for key in cfg.get('reward_keys', []):
+        if key in new_rew:
+            new_rew[key] = float(new_rew[key] * rng.choice(factors))
+    return new_hparams, new_rew
+
+def _make_env(mode, rank, cores, seed=0):
+    def _init():
+        from stable_baselines3.common.monitor import Monitor
+        from gym_env_specialized import SpecializedFrcEnv
+        _pin([cores[rank % len(cores)]])
+        env = SpecializedFrcEnv(render_mode=None, mode=mode)
+        env.reset(seed=seed + rank)
+        return Monitor(env)
+    return _init
+
+def _member_main(member_id, conn, mode, cores, n_envs, train_cfg, hparams, rew_cfg, log_dir, run_id, run_model_dir):
+    # One population member: owns its envs and PPO model, trains an interval, reports, obeys the coordinator
+    import torch as th
+    from stable_baselines3 import PPO
+    from stable_baselines3.common.vec_env import SubprocVecEnv
+    from stable_baselines3.common.callbacks import BaseCallback
+    from train_specialized import TensorboardCallback
+    from checkpoint_store import CheckpointStore, _clone
+
+    cfg = train_cfg.get('pbt', {})
+    fitness_key = cfg.get('fitness', {}).get(mode, "scored" if mode == "janitor" else "stashed")
+    recent = collections.deque(maxlen=cfg.get('fitness_window', 20))
+
+    class FitnessCallback(BaseCallback):
+        def _on_step(self) -> bool:
+            for info in self.locals['infos']:
+                if 'episode' in info:
+                    recent.append(info.get(fitness_key, 0))
+            return True
+
+    env_cores = cores[1:] or cores
+    env = SubprocVecEnv([_make_env(mode, i, env_cores, seed=1000 * member_id) for i in range(n_envs)])
+    # The learner keeps the first core of the block (env workers pinned themselves above)
+    _pin(cores[:1])
+    th.set_num_threads(1)
+
+    model = PPO(
+        "MlpPolicy",
+        env,
+        verbose=0,
+        learning_rate=hparams['learning_rate'],
+        n_steps=train_cfg['n_steps'],
+        batch_size=train_cfg['batch_size'],
+        ent_coef=hparams['ent_coef'],
+        gamma=hparams['gamma'],
+        policy_kwargs=dict(net_arch=[256, 256]),
+        tensorboard_log=log_dir
+    )
+    env.env_method("set_reward_weights", rew_cfg)
+
+    member_name = f"m{member_id}"
+    store = CheckpointStore(
+        os.path.join(run_model_dir, member_name),
+        name_prefix=f"{run_id}_{member_name}",
+        keep_last=train_cfg.get('checkpoint_keep_last', 3),
+        keep_every=train_cfg.get('checkpoint_keep_every', 10)
+    )
+    callbacks = [FitnessCallback(), TensorboardCallback()]
+    interval = cfg.get('interval_steps', 250000)
+    rounds = conn.recv()
+    for r in range(rounds):
+        model.learn(total_timesteps=interval, callback=callbacks, tb_log_name=f"{run_id}_{member_name}",
+                    reset_num_timesteps=(r == 0))
+        fitness = float(np.mean(recent)) if recent else float("-inf")
+        model.logger.record("pbt/fitness", fitness)
+        for key, value in hparams.items():
+            model.logger.record(f"pbt/{key}", value)
+        for key in cfg.get('reward_keys', []):
+            if key in rew_cfg:
+                model.logger.record(f"pbt/{key}", rew_cfg[key])
+        model.logger.dump(model.num_timesteps)
+        store.save(model, model.num_timesteps, fitness if recent else None)
+
+        state = (_clone(model.policy.state_dict()), _clone(model.policy.optimizer.state_dict()))
+        conn.send((model.num_timesteps, fitness, state))
+        cmd = conn.recv()
+        if cmd[0] == "exploit":
+            _, (policy_state, optim_state), hparams, rew_cfg = cmd
+            model.policy.load_state_dict(policy_state)
+            model.policy.optimizer.load_state_dict(optim_state)
+            model.learning_rate = hparams['learning_rate']
+            model._setup_lr_schedule()
+            model.ent_coef = hparams['ent_coef']
+            model.gamma = model.rollout_buffer.gamma = hparams['gamma']
+            env.env_method("set_reward_weights", rew_cfg)
+            # Episodes so far belong to the old weights
+            recent.clear()
+
+    store.close()
+    model.save(os.path.join(run_model_dir, member_name, f"{run_id}_{member_name}_final"))
+    env.close()
+    conn.send("done")
+
+def _recv(conn, member_id):
+    try:
+        return conn.recv()
+    except EOFError:
+        raise RuntimeError(f"PBT member m{member_id} exited unexpectedly (see its traceback above)")
+
+def _save_history(path, history):
+    with open(path + ".tmp", 'w') as f:
+        json.dump(history, f, indent=4)
+    os.replace(path + ".tmp", path)
+
+def run_pbt(mode, ml_config, run_id, run_model_dir, log_dir, n_members=None, envs_per_member=None, seed=0):
+    train_cfg = ml_config['training_params']
+    cfg = pbt_config(ml_config)
+    n_members = n_members or cfg.get('members', 4)
+    envs_per_member = envs_per_member or cfg.get('envs_per_member', 6)
+    interval = cfg.get('interval_steps', 250000)
+    # total_timesteps is the budget of the whole population
+    rounds = max(1, int(np.ceil(train_cfg['total_timesteps'] / (n_members * interval))))
+    n_exploit = int(n_members * cfg.get('exploit_fraction', 0.25)) if n_members > 1 else 0
+    if n_members > 1:
+        n_exploit = max(1, n_exploit)
+    rng = np.random.default_rng(seed)
+
+    # Member 0 starts from ml_config, the others from a perturbed copy of it
+    base_hparams = {
+        'learning_rate': float(train_cfg['learning_rate']),
+        'ent_coef': float(train_cfg.get('ent_coef', 0.0)),
+        'gamma': float(train_cfg['gamma']),
+    }
+    base_rew = dict(ml_config['reward_shaping'])
+    members = [{'hparams': dict(base_hparams), 'rewards': dict(base_rew)}]
+    for _ in range(1, n_members):
+        hparams, rew_cfg = perturb(base_hparams, base_rew, cfg, rng)
+        members.append({'hparams': hparams, 'rewards': rew_cfg})
+
+    layout = plan_cores(n_members, envs_per_member)
+    print(f"--- Population-Based Training ---")
+    print(f"Members: {n_members} x {envs_per_member} envs, {rounds} rounds of {interval} steps")
+    for m, cores in enumerate(layout):
+        print(f"  m{m}: learner core {cores[0]}, env cores {cores[1:]}")
+    print(f"---------------------------------")
+
+    ctx = mp.get_context("forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn")
+    conns, processes = [], []
+    for m in range(n_members):
+        parent, child = ctx.Pipe()
+        process = ctx.Process(target=_member_main, args=(
+            m, child, mode, layout[m], envs_per_member, train_cfg,
+            members[m]['hparams'], members[m]['rewards'], log_dir, run_id, run_model_dir))
+        process.start()
+        child.close()
+        parent.send(rounds)
+        conns.append(parent)
+        processes.append(process)
+
+    history_path = os.path.join(run_model_dir, "pbt.json")
+    history = {'mode': mode, 'members': n_members, 'interval_steps': interval, 'rounds': []}
+    for r in range(rounds):
+        t_start = time.time()
+        reports = [_recv(conn, m) for m, conn in enumerate(conns)]
+        fitness = [rep[1] for rep in reports]
+        ranked = sorted(range(n_members), key=lambda m: fitness[m])
+        bottom, top = ranked[:n_exploit], ranked[n_members - n_exploit:]
+        entry = {'round': r, 'members': []}
+        for m in range(n_members):
+            if m in bottom:
+                src = int(rng.choice(top))
+                hparams, rew_cfg = perturb(members[src]['hparams'], members[src]['rewards'], cfg, rng)
+                members[m] = {'hparams': hparams, 'rewards': rew_cfg}
+                conns[m].send(("exploit", reports[src][2], hparams, rew_cfg))
+                print(f"PBT round {r}: m{m} ({fitness[m]:.2f}) <- m{src} ({fitness[src]:.2f})")
+            else:
+                src = None
+                conns[m].send(("continue",))
+            entry['members'].append({'member': m, 'timesteps': reports[m][0], 'fitness': fitness[m],
+                                     'source': src, 'hparams': members[m]['hparams'],
+                                     'rewards': {k: members[m]['rewards'][k] for k in cfg.get('reward_keys', []) if k in members[m]['rewards']}})
+        entry['wait_s'] = round(time.time() - t_start, 3)
+        history['rounds'].append(entry)
+        _save_history(history_path, history)
+
+    for m, conn in enumerate(conns):
+        _recv(conn, m)
+    for process in processes:
+        process.join()
+
+    # The last round's fittest member becomes the run's best model (watch / resume use it as usual)
+    last = history['rounds'][-1]['members']
+    best = max(last, key=lambda e: e['fitness'])['member']
+    best_model_path = os.path.join(run_model_dir, "best_model")
+    os.makedirs(best_model_path, exist_ok=True)
+    shutil.copyfile(os.path.join(run_model_dir, f"m{best}", f"{run_id}_m{best}_final.zip"),
+                    os.path.join(best_model_path, "best_model.zip"))
+    print(f"PBT complete! Best member m{best}, copied to {best_model_path}")
+    return history
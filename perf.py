@@ -0,0 +1,160 @@
+import json
+import time
+
+# Lightweight hot-path instrumentation.
+# Usage:
+#   prof = make_profiler(enabled)
+#   with prof.timer("pieces_update"):
+#       pieces.update(...)
+#   prof.count("fuel", len(pieces.fuels))
+# When disabled, make_profiler() returns a shared NullProfiler whose timer() hands back
+# one reusable no-op context manager, so instrumented code costs a method call per site.
+
+class _Timer:
+    __slots__ = ('stats', 'start')
+
+    def __init__(self, stats):
+        self.stats = stats # [calls, total_s, max_s]
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        stats = self.stats
+        stats[0] += 1
+        stats[1] += elapsed
+        if elapsed > stats[2]:
+            stats[2] = elapsed
+        return False
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class Profiler:
+    enabled = True
+
+    def __init__(self):
+        self.timers = {}   # name -> _Timer
+        self.counters = {} # name -> [events, total]
+
+    def timer(self, name):
+        t = self.timers.get(name)
+        if t is None:
+            t = self.timers[name] = _Timer([0, 0.0, 0.0])
+        return t
+
+    def count(self, name, amount=1):
+        c = self.counters.get(name)
+        if c is None:
+            c = self.counters[name] = [0, 0]
+        c[0] += 1
+        c[1] += amount
+
+    def reset(self):
+        self.timers = {}
+        self.counters = {}
+
+    def summary(self):
+        timers = {}
+        for name, t in self.timers.items():
+            calls, total, peak = t.stats
+            timers[name] = {
+                'calls': calls,
+                'total_ms': total * 1000.0,
+                'mean_ms': (total / calls) * 1000.0 if calls else 0.0,
+                'max_ms': peak * 1000.0
+            }
+        counters = {}
+        for name, (events, total) in self.counters.items():
+            counters[name] = {'events': events, 'total': total, 'mean': total / events if events else 0.0}
+        return {'timers': timers, 'counters': counters}
+
+    def merge(self, summary):
+        # Fold in a summary() from another profiler (e.g. a worker process)
+        for name, s in summary.get('timers', {}).items():
+            stats = self.timer(name).stats
+            stats[0] += s['calls']
+            stats[1] += s['total_ms'] / 1000.0
+            stats[2] = max(stats[2], s['max_ms'] / 1000.0)
+        for name, s in summary.get('counters', {}).items():
+            c = self.counters.setdefault(name, [0, 0])
+            c[0] += s['events']
+            c[1] += s['total']
+
+    def scalars(self, prefix="perf_"):
+        # Flat {key: value} view for info dicts / TensorBoard (mean ms per call, mean counter value)
+        out = {}
+        s = self.summary()
+        for name, t in s['timers'].items():
+            out[f"{prefix}{name}_ms"] = t['mean_ms']
+        for name, c in s['counters'].items():
+            out[f"{prefix}{name}"] = c['mean']
+        return out
+
+    def report(self, title="PERFORMANCE"):
+        s = self.summary()
+        lines = [title]
+        grand_total = sum(t['total_ms'] for t in s['timers'].values()) or 1.0
+        for name, t in sorted(s['timers'].items(), key=lambda kv: -kv[1]['total_ms']):
+            lines.append(f"  {name:<18} {t['total_ms']:10.1f} ms  {t['total_ms'] / grand_total * 100:5.1f}%  "
+                         f"calls: {t['calls']:8d}  mean: {t['mean_ms']:.4f} ms  max: {t['max_ms']:.3f} ms")
+        for name, c in sorted(s['counters'].items()):
+            lines.append(f"  {name:<18} total: {c['total']}  mean: {c['mean']:.1f}")
+        return "\n".join(lines)
+
+    def save_json(self, path, extra=None):
+        data = self.summary()
+        if extra:
+            data.update(extra)
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=4)
+
+class NullProfiler:
+    enabled = False
+
+    def timer(self, name):
+        return _NULL_TIMER
+
+    def count(self, name, amount=1):
+        pass
+
+    def reset(self):
+        pass
+
+    def summary(self):
+        return {'timers': {}, 'counters': {}}
+
+    def merge(self, summary):
+        pass
+
+    def scalars(self, prefix="perf_"):
+        return {}
+
+    def report(self, title="PERFORMANCE"):
+        return f"{title}\n  (profiling disabled)"
+
+    def save_json(self, path, extra=None):
+        pass
+
+NULL_PROFILER = NullProfiler()
+
+def make_profiler(enabled):
+    return Profiler() if enabled else NULL_PROFILER
+
+def profiling_config(sim_config):
+    # config.json: "profiling": {"enabled": false, "report_path": "perf_report.json"}
+    cfg = sim_config.get('profiling', {})
+    if isinstance(cfg, bool):
+        cfg = {'enabled': cfg}
+    return cfg
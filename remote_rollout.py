@@ -0,0 +1,466 @@
+import os
+import sys
+import json
+import time
+import pickle
+import socket
+import struct
+import argparse
+import subprocess
+
+import numpy as np
+from stable_baselines3.common.vec_env.base_vec_env import VecEnv
+
+# Remote Rollout Workers
+# Lets the learner step envs that live on other machines (or other local processes). Each worker
+# process hosts n_envs FrcEnv / SpecializedFrcEnv instances in its own local VecEnv and connects to the
+# learner; RemoteVecEnv on the learner side is an SB3 VecEnv whose slots are spread over the connected
+# workers, so PPO runs unchanged:
+#   learner:  python train.py --remote tcp://0.0.0.0:5555 --remote_envs 28
+#   worker:   python remote_rollout.py worker --connect tcp://learner-host:5555 --n_envs 14
+#   local:    python train.py --remote unix:///tmp/frc.sock --remote_envs 8 --spawn_workers 2
+#
+# Wire format: every message is a 9-byte header struct "<4sBI" (magic b"FRC1", type, payload length)
+# followed by the payload. The per-step messages are raw little-endian arrays:
+#   STEP   float32 actions (n, act_dim)
+#   RESULT "<HH" (n, n_done) | float32 obs (n, obs_dim) | float32 rewards (n) | uint8 dones (n)
+#          | uint16 done indices (n_done) | float32 terminal obs (n_done, obs_dim) | JSON infos of the done envs
+# Only finished episodes carry an info dict (Monitor 'episode', 'scored', rew_*); mid-episode infos are empty.
+# HELLO / CALL / REPLY (spaces, env_method, get_attr, ...) are pickled: workers and learner must trust
+# each other, so keep the port on the cluster network.
+#
+# Backpressure: each worker has exactly one request in flight. It only simulates after it receives a
+# STEP, and the learner only sends the next STEP after reading the RESULT, so a slow worker or link
+# stalls the learner instead of queueing transitions. A worker that doesn't answer within step_timeout
+# counts as lost.
+# Reconnects: a worker that loses the learner retries the connection with a fixed delay (e.g. the
+# learner restarted to resume training). If the learner loses a worker, it waits up to
+# reconnect_timeout for a worker with the same n_envs and gives it the lost slots. The interrupted
+# episodes end as truncated (bootstrapped from the last observation) with info['worker_reconnected'].
+
+MAGIC = b"FRC1"
+HEADER = struct.Struct("<4sBI")
+RESULT_HEAD = struct.Struct("<HH")
+SEED = struct.Struct("<q")
+
+MSG_HELLO = 1
+MSG_WELCOME = 2
+MSG_REJECT = 3
+MSG_RESET = 4
+MSG_OBS = 5
+MSG_STEP = 6
+MSG_RESULT = 7
+MSG_CALL = 8
+MSG_REPLY = 9
+MSG_CLOSE = 10
+
+def parse_address(address):
+    # "tcp://host:port", "host:port" or "unix:///path/to.sock" -> (socket family, sockaddr)
+    if address.startswith("unix://"):
+        return socket.AF_UNIX, address[len("unix://"):]
+    if address.startswith("tcp://"):
+        address = address[len("tcp://"):]
+    host, port = address.rsplit(":", 1)
+    return socket.AF_INET, (host or "0.0.0.0", int(port))
+
+def _configure(sock):
+    if sock.family == socket.AF_INET:
+        # Small request/response messages: don't let Nagle hold them back
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+
+def send_msg(sock, msg_type, payload=b""):
+    sock.sendall(HEADER.pack(MAGIC, msg_type, len(payload)) + payload)
+
+def _recv_exact(sock, n):
+    buf = bytearray(n)
+    view = memoryview(buf)
+    got = 0
+    while got < n:
+        k = sock.recv_into(view[got:], n - got)
+        if k == 0:
+            raise ConnectionError("connection closed by peer")
+        got += k
+    return buf
+
+def recv_msg(sock):
+    magic, msg_type, length = HEADER.unpack(_recv_exact(sock, HEADER.size))
+    if magic != MAGIC:
+        raise ConnectionError(f"bad magic {magic!r} (not a rollout peer?)")
+    return msg_type, (_recv_exact(sock, length) if length else b"")
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def encode_result(obs, rewards, dones, infos):
+    done_idx = np.flatnonzero(dones).astype(np.uint16)
+    obs = np.asarray(obs, dtype=np.float32).reshape(len(dones), -1)
+    terminal = np.array([infos[i]['terminal_observation'] for i in done_idx], dtype=np.float32).reshape(len(done_idx), obs.shape[1])
+    extra = [{k: v for k, v in infos[i].items() if k != 'terminal_observation'} for i in done_idx]
+    return b"".join([
+        RESULT_HEAD.pack(len(dones), len(done_idx)),
+        obs.tobytes(),
+        np.asarray(rewards, dtype=np.float32).tobytes(),
+        np.asarray(dones, dtype=np.uint8).tobytes(),
+        done_idx.tobytes(),
+        terminal.tobytes(),
+        json.dumps(extra, default=_json_default).encode()
+    ])
+
+def decode_result(payload, obs_shape):
+    obs_size = int(np.prod(obs_shape))
+    n, n_done = RESULT_HEAD.unpack_from(payload, 0)
+    offset = RESULT_HEAD.size
+    obs = np.frombuffer(payload, np.float32, n * obs_size, offset).reshape((n,) + tuple(obs_shape))
+    offset += obs.nbytes
+    rewards = np.frombuffer(payload, np.float32, n, offset)
+    offset += rewards.nbytes
+    dones = np.frombuffer(payload, np.uint8, n, offset).astype(bool)
+    offset += n
+    done_idx = np.frombuffer(payload, np.uint16, n_done, offset)
+    offset += done_idx.nbytes
+    terminal = np.frombuffer(payload, np.float32, n_done * obs_size, offset).reshape((n_done,) + tuple(obs_shape))
+    offset += terminal.nbytes
+    infos = [{} for _ in range(n)]
+    for j, info in enumerate(json.loads(bytes(payload[offset:]))):
+        info['terminal_observation'] = terminal[j]
+        infos[done_idx[j]] = info
+    return obs, rewards, dones, infos
+
+# --- worker side ---
+
+def _make_env(env_kind, mode, rank, seed):
+    def _init():
+        from stable_baselines3.common.monitor import Monitor
+        if env_kind == "specialized":
+            from gym_env_specialized import SpecializedFrcEnv
+            env = SpecializedFrcEnv(render_mode=None, mode=mode)
+        else:
+            from gym_env import FrcEnv
+            env = FrcEnv(render_mode=None)
+        env.reset(seed=seed + rank)
+        return Monitor(env)
+    return _init
+
+class RolloutWorker:
+    """
+    Hosts n_envs envs (SubprocVecEnv when n_envs > 1) and serves one learner connection at a time.
+    """
+    def __init__(self, address, n_envs, env_kind="frc", mode="janitor", seed=0):
+        from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv
+        self.address = address
+        self.n_envs = n_envs
+        env_fns = [_make_env(env_kind, mode, i, seed) for i in range(n_envs)]
+        self.venv = SubprocVecEnv(env_fns) if n_envs > 1 else DummyVecEnv(env_fns)
+
+    def _connect(self):
+        family, sockaddr = parse_address(self.address)
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        try:
+            sock.connect(sockaddr)
+        except OSError:
+            sock.close()
+            raise
+        _configure(sock)
+        return sock
+
+    def serve(self, sock):
+        # One learner session. Returns True when the learner closed us down for good.
+        venv = self.venv
+        hello = {'n_envs': self.n_envs, 'observation_space': venv.observation_space,
+                 'action_space': venv.action_space, 'host': socket.gethostname(), 'pid': os.getpid()}
+        send_msg(sock, MSG_HELLO, pickle.dumps(hello))
+        msg_type, payload = recv_msg(sock)
+        if msg_type == MSG_REJECT:
+            raise ConnectionError(f"rejected by learner: {bytes(payload).decode()}")
+        print(f"Connected to learner {self.address} (slots {struct.unpack('<I', payload)[0]}..+{self.n_envs})")
+
+        while True:
+            msg_type, payload = recv_msg(sock)
+            if msg_type == MSG_STEP:
+                actions = np.frombuffer(payload, dtype=np.float32).reshape(self.n_envs, -1)
+                obs, rewards, dones, infos = venv.step(actions)
+                send_msg(sock, MSG_RESULT, encode_result(obs, rewards, dones, infos))
+            elif msg_type == MSG_RESET:
+                seed = SEED.unpack(payload)[0]
+                if seed >= 0:
+                    venv.seed(seed)
+                obs = venv.reset()
+                send_msg(sock, MSG_OBS, np.asarray(obs, dtype=np.float32).tobytes())
+            elif msg_type == MSG_CALL:
+                kind, name, args, kwargs, indices = pickle.loads(payload)
+                try:
+                    if kind == "env_method":
+                        result = venv.env_method(name, *args, indices=indices, **kwargs)
+                    elif kind == "get_attr":
+                        result = venv.get_attr(name, indices)
+                    elif kind == "set_attr":
+                        result = venv.set_attr(name, args, indices)
+                    else: # env_is_wrapped
+                        result = venv.env_is_wrapped(name, indices)
+                except Exception as e:
+                    result = e
+                send_msg(sock, MSG_REPLY, pickle.dumps(result))
+            elif msg_type == MSG_CLOSE:
+                send_msg(sock, MSG_CLOSE)
+                return True
+            else:
+                raise ConnectionError(f"unexpected message type {msg_type}")
+
+    def run(self, reconnect_delay=2.0, max_wait=None):
+        # Serve learners until one sends CLOSE; lost or refused connections are retried every reconnect_delay
+        # seconds (max_wait: give up after this many seconds without a learner, None = never)
+        waiting_since = time.time()
+        try:
+            while True:
+                try:
+                    sock = self._connect()
+                except OSError:
+                    if max_wait is not None and time.time() - waiting_since > max_wait:
+                        print(f"No learner at {self.address} for {max_wait}s, exiting.")
+                        return
+                    time.sleep(reconnect_delay)
+                    continue
+                try:
+                    if self.serve(sock):
+                        return
+                except (ConnectionError, OSError) as e:
+                    print(f"Lost learner connection ({e}), reconnecting...")
+                    time.sleep(reconnect_delay)
+                finally:
+                    sock.close()
+                waiting_since = time.time()
+        finally:
+            self.venv.close()
+
+# --- learner side ---
+
+class _Remote:
+    def __init__(self, sock, n_envs, name):
+        self.sock = sock
+        self.n_envs = n_envs
+        self.name = name
+        self.start = 0 # first VecEnv slot
+        self.failed = None # exception from the last send, handled in step_wait
+
+class RemoteVecEnv(VecEnv):
+    def __init__(self, address, num_envs, accept_timeout=300.0, step_timeout=60.0, reconnect_timeout=120.0):
+        # Listens on `address` and blocks until workers with num_envs envs in total have connected
+        self.address = address
+        self.step_timeout = step_timeout
+        self.reconnect_timeout = reconnect_timeout
+        family, sockaddr = parse_address(address)
+        if family == socket.AF_UNIX and os.path.exists(sockaddr):
+            os.remove(sockaddr)
+        self._unix_path = sockaddr if family == socket.AF_UNIX else None
+        self.server = socket.socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_INET:
+            self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(sockaddr)
+        self.server.listen()
+        self.observation_space = None
+        self.action_space = None
+
+        print(f"Waiting for rollout workers on {address} ({num_envs} envs)...")
+        self.workers = []
+        filled = 0
+        deadline = time.time() + accept_timeout
+        while filled < num_envs:
+            worker = self._accept(deadline, filled, max_envs=num_envs - filled)
+            filled += worker.n_envs
+            self.workers.append(worker)
+            print(f"  {worker.name}: {worker.n_envs} envs ({filled}/{num_envs})")
+
+        self.closed = False
+        self.waiting = False
+        self._last_obs = None
+        super().__init__(num_envs, self.observation_space, self.action_space)
+
+    def _accept(self, deadline, start, max_envs=None, exact_envs=None):
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise RuntimeError(f"Timed out waiting for rollout workers on {self.address}")
+            self.server.settimeout(remaining)
+            try:
+                sock, addr = self.server.accept()
+            except socket.timeout:
+                continue
+            _configure(sock)
+            sock.settimeout(self.step_timeout)
+            try:
+                msg_type, payload = recv_msg(sock)
+                if msg_type != MSG_HELLO:
+                    raise ConnectionError(f"expected HELLO, got {msg_type}")
+                hello = pickle.loads(payload)
+                n = hello['n_envs']
+                reason = None
+                if (max_envs is not None and n > max_envs) or (exact_envs is not None and n != exact_envs):
+                    reason = f"{n} envs don't fit the free slots ({exact_envs or max_envs})"
+                elif self.observation_space is not None and \
+                        (hello['observation_space'].shape != self.observation_space.shape or
+                         hello['action_space'].shape != self.action_space.shape):
+                    reason = "observation/action spaces differ from the other workers"
+                if reason:
+                    send_msg(sock, MSG_REJECT, reason.encode())
+                    sock.close()
+                    print(f"Rejected worker {hello['host']}:{hello['pid']}: {reason}")
+                    continue
+                if self.observation_space is None:
+                    self.observation_space = hello['observation_space']
+                    self.action_space = hello['action_space']
+                send_msg(sock, MSG_WELCOME, struct.pack("<I", start))
+                worker = _Remote(sock, n, f"{hello['host']}:{hello['pid']}")
+                worker.start = start
+                return worker
+            except (ConnectionError, OSError) as e:
+                print(f"Dropped connection from {addr}: {e}")
+                sock.close()
+
+    def _reset_worker(self, worker, seed=None):
+        send_msg(worker.sock, MSG_RESET, SEED.pack(-1 if seed is None else seed))
+        msg_type, payload = recv_msg(worker.sock)
+        if msg_type != MSG_OBS:
+            raise ConnectionError(f"expected OBS, got {msg_type}")
+        return np.frombuffer(payload, dtype=np.float32).reshape((worker.n_envs,) + self.observation_space.shape)
+
+    def _replace(self, i, error):
+        # Hand worker i's slots to a new worker -> the new worker's reset observations
+        lost = self.workers[i]
+        lost.sock.close()
+        print(f"Rollout worker {lost.name} lost ({error}); waiting up to {self.reconnect_timeout:.0f}s for a replacement...")
+        worker = self._accept(time.time() + self.reconnect_timeout, lost.start, exact_envs=lost.n_envs)
+        self.workers[i] = worker
+        print(f"  {worker.name} took over envs {worker.start}..{worker.start + worker.n_envs - 1}")
+        return self._reset_worker(worker)
+
+    def reset(self):
+        obs = []
+        for i, worker in enumerate(self.workers):
+            try:
+                obs.append(self._reset_worker(worker, self._seeds[worker.start]))
+            except (ConnectionError, OSError) as e:
+                obs.append(self._replace(i, e))
+        self._reset_seeds()
+        self._reset_options()
+        self._last_obs = np.concatenate(obs)
+        return self._last_obs
+
+    def step_async(self, actions):
+        actions = np.asarray(actions, dtype=np.float32)
+        for worker in self.workers:
+            try:
+                send_msg(worker.sock, MSG_STEP, actions[worker.start:worker.start + worker.n_envs].tobytes())
+                worker.failed = None
+            except OSError as e:
+                worker.failed = e
+        self.waiting = True
+
+    def step_wait(self):
+        results = []
+        for i, worker in enumerate(self.workers):
+            try:
+                if worker.failed is not None:
+                    raise worker.failed
+                msg_type, payload = recv_msg(worker.sock)
+                if msg_type != MSG_RESULT:
+                    raise ConnectionError(f"expected RESULT, got {msg_type}")
+                results.append(decode_result(payload, self.observation_space.shape))
+            except (ConnectionError, OSError) as e:
+                # The interrupted episodes end as truncated, bootstrapped from their last observation
+                n = worker.n_envs
+                last = self._last_obs[worker.start:worker.start + n]
+                infos = [{'terminal_observation': last[j], 'TimeLimit.truncated': True, 'worker_reconnected': True}
+                         for j in range(n)]
+                results.append((self._replace(i, e), np.zeros(n, dtype=np.float32), np.ones(n, dtype=bool), infos))
+        self.waiting = False
+        obs = np.concatenate([r[0] for r in results])
+        rewards = np.concatenate([r[1] for r in results])
+        dones = np.concatenate([r[2] for r in results])
+        infos = [info for r in results for info in r[3]]
+        self._last_obs = obs
+        return obs, rewards, dones, infos
+
+    def _call(self, kind, name, args, kwargs, indices):
+        # Route a control call to the workers owning `indices`, results in index order
+        indices = list(self._get_indices(indices))
+        results = {}
+        for worker in self.workers:
+            local = [i - worker.start for i in indices if worker.start <= i < worker.start + worker.n_envs]
+            if not local:
+                continue
+            send_msg(worker.sock, MSG_CALL, pickle.dumps((kind, name, args, kwargs, local)))
+            msg_type, payload = recv_msg(worker.sock)
+            reply = pickle.loads(payload)
+            if isinstance(reply, Exception):
+                raise reply
+            for j, value in zip(local, reply):
+                results[worker.start + j] = value
+        return [results[i] for i in indices]
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        return self._call("env_method", method_name, method_args, method_kwargs, indices)
+
+    def get_attr(self, attr_name, indices=None):
+        if not self.workers:
+            raise AttributeError(attr_name)
+        return self._call("get_attr", attr_name, None, None, indices)
+
+    def set_attr(self, attr_name, value, indices=None):
+        # set_attr returns None per worker, nothing to collect
+        for worker in self.workers:
+            local = [i - worker.start for i in self._get_indices(indices) if worker.start <= i < worker.start + worker.n_envs]
+            if local:
+                send_msg(worker.sock, MSG_CALL, pickle.dumps(("set_attr", attr_name, value, None, local)))
+                recv_msg(worker.sock)
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return self._call("env_is_wrapped", wrapper_class, None, None, indices)
+
+    def close(self):
+        if self.closed:
+            return
+        for worker in self.workers:
+            try:
+                if self.waiting:
+                    recv_msg(worker.sock)
+                send_msg(worker.sock, MSG_CLOSE)
+                recv_msg(worker.sock)
+            except (ConnectionError, OSError):
+                pass
+            worker.sock.close()
+        self.server.close()
+        if self._unix_path and os.path.exists(self._unix_path):
+            os.remove(self._unix_path)
+        self.closed = True
+
+def spawn_local_workers(address, n_workers, total_envs, env_kind="frc", mode="janitor"):
+    # Worker processes on this machine (localhost testing, or to mix local and remote workers),
+    # total_envs split as evenly as possible
+    script = os.path.abspath(__file__)
+    counts = [total_envs // n_workers + (1 if i < total_envs % n_workers else 0) for i in range(n_workers)]
+    return [subprocess.Popen([sys.executable, script, "worker", "--connect", address, "--n_envs", str(n),
+                              "--env", env_kind, "--mode", mode, "--seed", str(1000 * i), "--max_wait", "60"])
+            for i, n in enumerate(counts) if n > 0]
+
+def main():
+    parser = argparse.ArgumentParser(description="Remote rollout worker for RemoteVecEnv learners")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    worker = sub.add_parser("worker", help="Host envs and serve a learner")
+    worker.add_argument("--connect", type=str, required=True, help="Learner address: tcp://host:port or unix:///path.sock")
+    worker.add_argument("--n_envs", type=int, default=os.cpu_count(), help="Envs hosted by this worker (default: one per core)")
+    worker.add_argument("--env", type=str, choices=["frc", "specialized"], default="frc")
+    worker.add_argument("--mode", type=str, choices=["janitor", "lobber"], default="janitor", help="SpecializedFrcEnv mode")
+    worker.add_argument("--seed", type=int, default=0)
+    worker.add_argument("--reconnect_delay", type=float, default=2.0, help="Seconds between connection attempts")
+    worker.add_argument("--max_wait", type=float, help="Exit after this many seconds without a learner (default: keep trying)")
+    args = parser.parse_args()
+
+    RolloutWorker(args.connect, args.n_envs, args.env, args.mode, args.seed).run(args.reconnect_delay, args.max_wait)
+
+if __name__ == "__main__":
+    main()
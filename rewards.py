@@ -0,0 +1,318 @@
+import math
+
+from ml_utils import sort_fuels_by_distance
+
+# Reward Engine
+# Every term in ml_config.json "reward_shaping" maps to a registered component (or is a secondary key
+# one of them also reads, e.g. lobber_boundary_penalty for zone_boundary_penalty). The env builds a
+# StepContext once per step (events summed over the frames + lazily cached geometry) and the engine
+# asks each component for its share. Per-term totals land in engine.totals, which is the env's
+# ep_rewards dict and ends up in TensorBoard under reward/.
+
+REWARD_COMPONENTS = {} # config key -> component class
+SECONDARY_KEYS = {} # extra config key a component reads in set_weight -> its main config key
+
+def reward_component(config_key, key, secondary_keys=()):
+    def register(cls):
+        cls.config_key = config_key
+        cls.key = key
+        REWARD_COMPONENTS[config_key] = cls
+        for extra in secondary_keys:
+            SECONDARY_KEYS[extra] = config_key
+        return cls
+    return register
+
+class StepContext:
+    """
+    Everything the reward terms (and the observation builder) need about the step that just ran.
+    Expensive values are computed on first use and shared by every reader.
+    """
+    def __init__(self, robot, field, pieces, sim_config, action=None, can_score=True,
+                 scored=0, passed=0, dumped=0, fouls=0, dist_traveled=0.0, stashed_red=0, stashed_blue=0, env=None):
+        self.robot = robot
+        self.field = field
+        self.pieces = pieces
+        self.sim_config = sim_config
+        self.action = action
+        self.can_score = can_score
+        self.scored = scored
+        self.passed = passed
+        self.dumped = dumped
+        self.fouls = fouls
+        self.dist_traveled = dist_traveled
+        self.stashed_red = stashed_red
+        self.stashed_blue = stashed_blue
+        self.env = env
+        self._sorted_fuels = None
+        self._hub_dist = None
+
+    @property
+    def sorted_fuels(self):
+        # [(dist_sq, dx_rel, dy_rel, fuel)] nearest first - same list get_observation consumes
+        if self._sorted_fuels is None:
+            self._sorted_fuels = sort_fuels_by_distance(self.robot, self.pieces)
+        return self._sorted_fuels
+
+    @property
+    def nearest_fuel_dist(self):
+        fuels = self.sorted_fuels
+        return math.sqrt(fuels[0][0]) if fuels else 9999
+
+    @property
+    def own_hub(self):
+        return self.field.hubs[0] if self.robot.alliance == "red" else self.field.hubs[1]
+
+    @property
+    def hub_dist(self):
+        if self._hub_dist is None:
+            hub = self.own_hub
+            self._hub_dist = ((hub['x'] - self.robot.x)**2 + (hub['y'] - self.robot.y)**2)**0.5
+        return self._hub_dist
+
+    @property
+    def stashed_delta(self):
+        # Fuel that crossed into our alliance zone during this step (summed over all frames)
+        return self.stashed_red if self.robot.alliance == "red" else self.stashed_blue
+
+    @property
+    def active(self):
+        # Robot is carrying or just released fuel
+        return self.robot.holding > 0 or self.scored > 0 or self.passed > 0 or self.dumped > 0
+
+    @property
+    def past_divider(self):
+        # Robot is on the far side of its own divider line (neutral zone or beyond)
+        divider_x = self.sim_config['field']['divider_x']
+        if self.robot.alliance == "red":
+            return self.robot.x > divider_x
+        return self.robot.x < self.sim_config['field']['width_inches'] - divider_x
+
+class RewardComponent:
+    config_key = None
+    key = None
+    default = 0.0
+    # Attributes carried between steps (saved in env snapshots)
+    state_fields = ()
+
+    def __init__(self, rew_cfg):
+        self.set_weight(rew_cfg)
+
+    def set_weight(self, rew_cfg):
+        self.weight = rew_cfg.get(self.config_key, self.default)
+
+    def reset(self, env):
+        pass
+
+    def __call__(self, ctx):
+        raise NotImplementedError
+
+@reward_component("score_reward", "rew_score")
+class ScoreReward(RewardComponent):
+    def __call__(self, ctx):
+        return ctx.scored * self.weight
+
+@reward_component("pickup_reward", "rew_pickup")
+class PickupReward(RewardComponent):
+    state_fields = ('last_holding',)
+
+    def reset(self, env):
+        self.last_holding = 0
+
+    def __call__(self, ctx):
+        # Net change = change in holding + (scores + passes + dumps)
+        # (prevents penalty for losing holding during intentional actions)
+        holding = ctx.robot.holding
+        rew = (holding - self.last_holding + ctx.scored + ctx.passed + ctx.dumped) * self.weight
+        self.last_holding = holding
+        return rew
+
+@reward_component("dump_penalty", "rew_dump")
+class DumpPenalty(RewardComponent):
+    def __call__(self, ctx):
+        return ctx.dumped * self.weight
+
+@reward_component("major_foul_penalty", "rew_foul")
+class MajorFoulPenalty(RewardComponent):
+    def __call__(self, ctx):
+        return ctx.fouls * self.weight
+
+@reward_component("time_penalty_per_step", "rew_time")
+class TimePenalty(RewardComponent):
+    def __call__(self, ctx):
+        return self.weight
+
+@reward_component("proximity_reward_factor", "rew_proximity")
+class FuelProximityReward(RewardComponent):
+    # Encouragement to move toward the nearest fuel while there is room in the hopper
+    state_fields = ('last_min_dist',)
+
+    def reset(self, env):
+        self.last_min_dist = 999.0
+
+    def __call__(self, ctx):
+        rew = 0.0
+        if ctx.robot.holding < ctx.robot.capacity:
+            min_dist = ctx.nearest_fuel_dist
+            if min_dist < 999:
+                dist_delta = self.last_min_dist - min_dist
+                if abs(dist_delta) < 100:
+                    rew = dist_delta * self.weight
+            self.last_min_dist = min_dist
+        else:
+            self.last_min_dist = 999.0
+        return rew
+
+@reward_component("hub_proximity_reward_factor", "rew_hub_proximity")
+class HubProximityReward(RewardComponent):
+    # Delta hub distance while carrying in a scoring phase.
+    # One-Way rewards were exploitable for 'wiggling'; config keeps this at 0.0 and relies on
+    # completion (score) and time penalty (hustle) instead.
+    state_fields = ('last_hub_dist',)
+
+    def reset(self, env):
+        self.last_hub_dist = 999.0
+
+    def __call__(self, ctx):
+        rew = 0.0
+        if ctx.active:
+            if ctx.can_score:
+                hub_delta = self.last_hub_dist - ctx.hub_dist
+                if abs(hub_delta) < 50:
+                    rew = hub_delta * self.weight
+            self.last_hub_dist = ctx.hub_dist
+        else:
+            self.last_hub_dist = 999.0
+        return rew
+
+@reward_component("stashing_reward_factor", "rew_stashing")
+class StashingReward(RewardComponent):
+    # Goal Line Stashing Reward for off-phase carrying
+    # (Carrying Progress * factor) + (Bonus per ball that JUST crossed) + (Pulse / Trigger bonus)
+    state_fields = ('last_robot_x',)
+
+    def reset(self, env):
+        self.last_robot_x = env.controlled_robot.x
+
+    def __call__(self, ctx):
+        rew = 0.0
+        robot = ctx.robot
+        if ctx.active and not ctx.can_score:
+            is_red = robot.alliance == "red"
+            field_cfg = ctx.sim_config['field']
+
+            # The "Goal Line" is 12 inches inside the alliance zone to clear bumps/trench
+            if is_red:
+                goal_line_x = field_cfg['divider_x'] - 12
+                dist_to_line = max(0, robot.x - goal_line_x)
+                last_dist_to_line = max(0, self.last_robot_x - goal_line_x)
+            else:
+                goal_line_x = (field_cfg['width_inches'] - field_cfg['divider_x']) + 12
+                dist_to_line = max(0, goal_line_x - robot.x)
+                last_dist_to_line = max(0, goal_line_x - self.last_robot_x)
+
+            # One-Way: Only reward getting closer to the goal line (factor is 0.0 to prevent 'inching' exploits)
+            progress = max(0, last_dist_to_line - dist_to_line)
+            trigger_bonus = (ctx.passed + ctx.dumped) * 10.0
+
+            rew = progress * self.weight + (ctx.stashed_delta * 200.0) + trigger_bonus
+
+            # Penalty for 'lazy dumping' on the wrong side of the divider
+            if ctx.dumped:
+                if (is_red and robot.x > field_cfg['divider_x']) or \
+                   (not is_red and robot.x < field_cfg['divider_x']):
+                    rew -= 20.0
+
+            if ctx.passed:
+                rew += 2.0
+        self.last_robot_x = robot.x
+        return rew
+
+@reward_component("steering_penalty_factor", "rew_steer")
+class SteeringPenalty(RewardComponent):
+    def __call__(self, ctx):
+        return abs(ctx.action[2]) * self.weight
+
+@reward_component("holding_reward_factor", "rew_holding")
+class HoldingReward(RewardComponent):
+    # Distance driven this step while carrying fuel
+    def __call__(self, ctx):
+        if ctx.robot.holding > 0:
+            return ctx.dist_traveled * self.weight
+        return 0.0
+
+# --- Specialized (Scoring Lab) terms: enabled by SpecializedFrcEnv, defaults match the lab constants ---
+
+@reward_component("station_proximity_reward", "rew_station")
+class StationProximityReward(RewardComponent):
+    # Small nudge to stay in the target zone: max at the station center, 0 when far away
+    default = 0.5
+
+    def __call__(self, ctx):
+        env = ctx.env
+        robot = ctx.robot
+        dist_to_target = math.sqrt((robot.x - env.target_x)**2 + (robot.y - env.target_y)**2)
+        field_width = ctx.sim_config['field']['width_inches']
+        return self.weight * (1.0 - min(1.0, dist_to_target / (field_width * 0.3)))
+
+@reward_component("zone_boundary_penalty", "rew_zone", secondary_keys=("lobber_boundary_penalty",))
+class ZoneBoundaryPenalty(RewardComponent):
+    # Per-step "stay" penalty for being in the forbidden zone (janitor: neutral, lobber: alliance)
+    def set_weight(self, rew_cfg):
+        self.janitor_weight = rew_cfg.get('zone_boundary_penalty', -5.0)
+        self.lobber_weight = rew_cfg.get('lobber_boundary_penalty', -20.0)
+
+    def __call__(self, ctx):
+        env = ctx.env
+        robot = ctx.robot
+        divider_x = ctx.sim_config['field']['divider_x']
+        if env.mode == "janitor":
+            if robot.x > divider_x:
+                return self.janitor_weight
+        elif env.mode == "lobber":
+            if (robot.alliance == "red" and robot.x < divider_x) or \
+               (robot.alliance == "blue" and robot.x > divider_x):
+                return self.lobber_weight
+        return 0.0
+
+class RewardEngine:
+    def __init__(self, rew_cfg, extra_components=()):
+        names = [k for k in rew_cfg if k in REWARD_COMPONENTS]
+        for k in rew_cfg:
+            if k not in REWARD_COMPONENTS and k not in SECONDARY_KEYS:
+                print(f"Warning: reward_shaping term '{k}' has no registered component and is ignored.")
+        names += [k for k in extra_components if k not in names]
+        self.components = [REWARD_COMPONENTS[name](rew_cfg) for name in names]
+        self.totals = {}
+
+    def set_weights(self, rew_cfg):
+        for comp in self.components:
+            comp.set_weight(rew_cfg)
+
+    def reset(self, env):
+        for comp in self.components:
+            comp.reset(env)
+        self.totals = {comp.key: 0.0 for comp in self.components}
+        return self.totals
+
+    def get_state(self):
+        return {
+            'totals': dict(self.totals),
+            'components': {c.key: {k: getattr(c, k) for k in c.state_fields} for c in self.components}
+        }
+
+    def set_state(self, state):
+        # Keep the same totals dict object (the env's ep_rewards points at it)
+        self.totals.clear()
+        self.totals.update(state['totals'])
+        for comp in self.components:
+            for k, v in state['components'].get(comp.key, {}).items():
+                setattr(comp, k, v)
+
+    def compute(self, ctx):
+        step_reward = 0.0
+        totals = self.totals
+        for comp in self.components:
+            value = comp(ctx)
+            totals[comp.key] += value
+            step_reward += value
+        return step_reward
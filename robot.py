@@ -51,6 +51,26 @@ class Robot:
         self.ai_tick_timer = random.uniform(0, 1.0/self.ai_update_rate) # Desync robots
         self.last_ai_inputs = None
         
+    # Dynamic state captured by get_state()/set_state() (everything else comes from the robot config)
+    STATE_FIELDS = (
+        'x', 'y', 'angle', 'vel_x_robot', 'vel_y_robot', 'rot_velocity', 'holding', 'last_shot_time',
+        'auto_shoot_enabled', 'auto_pass_enabled', 'intake_deploy_side', 'intake_transition_timer',
+        'penalty_timer', 'ai_tick_timer', 'disable_intake'
+    )
+
+    def get_state(self):
+        state = {k: getattr(self, k, False) for k in self.STATE_FIELDS}
+        state['last_ai_inputs'] = dict(self.last_ai_inputs) if self.last_ai_inputs else None
+        # Static identity, for tools that inspect snapshots (ignored by set_state)
+        state['alliance'] = self.alliance
+        state['capacity'] = self.capacity
+        return state
+
+    def set_state(self, state):
+        for k in self.STATE_FIELDS:
+            setattr(self, k, state[k])
+        self.last_ai_inputs = dict(state['last_ai_inputs']) if state['last_ai_inputs'] else None
+
     def check_shoot_range(self, field):
         target_hub = field.hubs[0] if self.alliance == "red" else field.hubs[1]
         dist = ((self.x - target_hub['x'])**2 + (self.y - target_hub['y'])**2)**0.5
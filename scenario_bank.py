@@ -0,0 +1,99 @@
+import os
+import json
+import argparse
+
+import numpy as np
+
+# Scenario Bank
+# Pre-generated "Scoring Lab" fuel layouts for SpecializedFrcEnv resets.
+# Stored as two .npy files per mode so every SubprocVecEnv worker can np.load(..., mmap_mode='r')
+# the same pages read-only instead of drawing balls one np.random.uniform call at a time:
+#   <dir>/<mode>.npy         float32 (N, max_balls, 2) - x/y, rows past the count are NaN
+#   <dir>/<mode>.counts.npy  int32   (N,)              - balls in each layout
+
+# Spawn rules per mode (same as the original on-the-fly lab reset)
+LAB_LAYOUTS = {
+    # Piles in the Alliance Zone (X: 0 to divider_x)
+    "janitor": {"count": (50, 80)},
+    # Piles in the Neutral Zone (X: divider_x to field_w - divider_x)
+    "lobber": {"count": (70, 100)}
+}
+
+def lab_bounds(mode, field_cfg):
+    field_w = field_cfg['width_inches']
+    field_h = field_cfg['length_inches']
+    divider_x = field_cfg['divider_x']
+    if mode == "janitor":
+        return (20, divider_x - 10), (20, field_h - 20)
+    return (divider_x + 10, (field_w - divider_x) - 10), (20, field_h - 20)
+
+def generate_layouts(mode, n, field_cfg, rng=np.random):
+    # Returns (layouts, counts) for n random lab layouts, fully vectorized
+    lo, hi = LAB_LAYOUTS[mode]['count']
+    (x0, x1), (y0, y1) = lab_bounds(mode, field_cfg)
+    counts = rng.randint(lo, hi, size=n).astype(np.int32)
+    layouts = np.empty((n, hi, 2), dtype=np.float32)
+    layouts[:, :, 0] = rng.uniform(x0, x1, size=(n, hi))
+    layouts[:, :, 1] = rng.uniform(y0, y1, size=(n, hi))
+    layouts[np.arange(hi)[None, :] >= counts[:, None]] = np.nan
+    return layouts, counts
+
+def bank_paths(bank_dir, mode):
+    return os.path.join(bank_dir, f"{mode}.npy"), os.path.join(bank_dir, f"{mode}.counts.npy")
+
+class ScenarioBank:
+    def __init__(self, bank_dir, mode):
+        layouts_path, counts_path = bank_paths(bank_dir, mode)
+        self.layouts = np.load(layouts_path, mmap_mode='r')
+        self.counts = np.load(counts_path, mmap_mode='r')
+        if len(self.layouts) != len(self.counts):
+            raise ValueError(f"Scenario bank {layouts_path} is corrupt: {len(self.layouts)} layouts, {len(self.counts)} counts")
+
+    def __len__(self):
+        return len(self.counts)
+
+    def sample(self, rng):
+        # rng: numpy Generator (e.g. env.np_random). Returns an (count, 2) x/y array.
+        i = int(rng.integers(len(self.counts)))
+        return np.array(self.layouts[i, :int(self.counts[i])])
+
+    @staticmethod
+    def open(bank_dir, mode):
+        # None if no bank has been generated for this mode (callers fall back to live generation)
+        if not bank_dir or not all(os.path.exists(p) for p in bank_paths(bank_dir, mode)):
+            return None
+        return ScenarioBank(bank_dir, mode)
+
+def build_bank(bank_dir, mode, count, field_cfg, seed=0):
+    os.makedirs(bank_dir, exist_ok=True)
+    layouts, counts = generate_layouts(mode, count, field_cfg, np.random.RandomState(seed))
+    layouts_path, counts_path = bank_paths(bank_dir, mode)
+    # Write to temp names first so running workers never map a half-written file
+    np.save(layouts_path + ".tmp.npy", layouts)
+    np.save(counts_path + ".tmp.npy", counts)
+    os.replace(layouts_path + ".tmp.npy", layouts_path)
+    os.replace(counts_path + ".tmp.npy", counts_path)
+    return layouts_path
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate Scoring Lab fuel layouts for SpecializedFrcEnv")
+    parser.add_argument("--mode", type=str, choices=["janitor", "lobber", "all"], default="all", help="Which lab to generate")
+    parser.add_argument("--count", type=int, default=10000, help="Layouts per mode")
+    parser.add_argument("--seed", type=int, default=0, help="Generator seed")
+    parser.add_argument("--out", type=str, help="Bank directory (default: ml_config env_params.scenario_bank_dir)")
+    args = parser.parse_args()
+
+    with open("config.json", "r") as f:
+        config = json.load(f)
+    with open("ml_config.json", "r") as f:
+        ml_config = json.load(f)
+    bank_dir = args.out or ml_config['env_params'].get('scenario_bank_dir', 'scenarios')
+
+    modes = ["janitor", "lobber"] if args.mode == "all" else [args.mode]
+    for i, mode in enumerate(modes):
+        path = build_bank(bank_dir, mode, args.count, config['field'], args.seed + i)
+        size_mb = os.path.getsize(path) / 1e6
+        print(f"{mode}: {args.count} layouts -> {path} ({size_mb:.1f} MB)")
+
+if __name__ == "__main__":
+    main()
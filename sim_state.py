@@ -0,0 +1,51 @@
+import pickle
+import random
+
+import numpy as np
+
+# Simulation Snapshots
+# A snapshot is a plain dict (numpy arrays + builtins) describing the dynamic state of a match:
+# game time, fuel, robots and their AIs. Static things (Field geometry, robot configs) are not
+# stored; restoring copies the values into existing objects, which must match the snapshot's layout
+# (same number/order of robots).
+
+SNAPSHOT_VERSION = 1
+
+def capture_rng():
+    return {'random': random.getstate(), 'numpy': np.random.get_state()}
+
+def restore_rng(state):
+    random.setstate(state['random'])
+    np.random.set_state(state['numpy'])
+
+def capture_world(game_time, pieces, robots, robot_ais):
+    return {
+        'version': SNAPSHOT_VERSION,
+        'game_time': game_time,
+        'pieces': pieces.get_state(),
+        'robots': [r.get_state() for r in robots],
+        # AI state is keyed by robot index so it survives a pickle round trip
+        'ais': {i: robot_ais[r].get_state() for i, r in enumerate(robots) if r in robot_ais}
+    }
+
+def apply_world(snap, pieces, robots, robot_ais):
+    if snap.get('version') != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version: {snap.get('version')}")
+    if len(snap['robots']) != len(robots):
+        raise ValueError(f"Snapshot has {len(snap['robots'])} robots, simulation has {len(robots)}")
+    pieces.set_state(snap['pieces'])
+    for robot, state in zip(robots, snap['robots']):
+        robot.set_state(state)
+    for i, state in snap['ais'].items():
+        robot = robots[int(i)]
+        if robot in robot_ais:
+            robot_ais[robot].set_state(state)
+    return snap['game_time']
+
+def save_snapshot(path, snap):
+    with open(path, 'wb') as f:
+        pickle.dump(snap, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+def load_snapshot(path):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
@@ -0,0 +1,300 @@
+from robot import Robot
+from field import Field
+from game_piece import GamePieceManager
+from ai import RobotAI
+from perf import NULL_PROFILER
+from match_clock import MatchClock, DEFAULT_STAGES, MATCH_DURATION
+import sim_state
+
+# Match Simulation
+# The one match loop behind main.py (live play), headless_runner (batch matches) and the gym envs.
+# Simulation owns the phase timeline, robot/AI updates, fuel physics, scoring and penalties; the
+# front ends only decide who drives which robot and what to do with the results:
+#   inputs    {robot: ai_inputs} for robots driven from outside (RL policy, self-play opponent)
+#   robot_ais RobotAI for the remaining AI robots
+#   keys      keyboard state + per-alliance control maps for everything else (main.py)
+# Each frame runs, in this order (the global RNG call order matches, so seeded matches replay):
+#   clock boundaries (match_clock.py) -> AI update -> robot update -> recycle scored fuel, for every
+#   robot; outpost release; fuel physics; penalties; clock.
+# Phase rules:
+#   "match"  auto winner decides the teleop stage order (the auto winner's hub is active second)
+#   "fixed"  stages always red, blue, red, blue (FrcEnv training)
+#   "open"   hubs always active (ml_config enforce_phases: false)
+#   "closed" hubs never active (lobber lab)
+
+PHASE_RULES = ("match", "fixed", "open", "closed")
+OTHER = {"red": "blue", "blue": "red"}
+
+NO_KEYS = [False] * 512
+NO_CONTROLS = {'up': 0, 'down': 0, 'left': 0, 'right': 0, 'rotate_l': 0, 'rotate_r': 0, 'shoot_key': 0, 'pass_key': 0, 'dump_key': 0}
+
+def lineup(config, mode="3v3"):
+    # -> [(alliance, index within alliance, robot config)] in spawn order; 1v1 plays each alliance's first robot
+    out = []
+    for alliance in ("red", "blue"):
+        cfgs = config[f'{alliance}_alliance']
+        if mode != "3v3":
+            cfgs = cfgs[:1]
+        out += [(alliance, i, cfg) for i, cfg in enumerate(cfgs)]
+    return out
+
+class RobotCounters:
+    """Per-robot events of the current step() call (dist in inches driven)."""
+    __slots__ = ('scored', 'passed', 'dumped', 'fouls', 'dist', 'x', 'y')
+
+    def __init__(self, robot):
+        self.scored = 0
+        self.passed = 0
+        self.dumped = 0
+        self.fouls = 0
+        self.dist = 0.0
+        self.x = robot.x
+        self.y = robot.y
+
+class Simulation:
+    def __init__(self, config, field=None, pieces=None, robots=None, robot_ais=None, phase_rule="match",
+                 match_duration=MATCH_DURATION, dt=1/60.0, disable_outposts=False, profiler=NULL_PROFILER):
+        self.config = config
+        self.field = field
+        self.pieces = pieces
+        self.robots = robots if robots is not None else []
+        self.robot_ais = robot_ais if robot_ais is not None else {}
+        self.mode = None # Lineup from from_config ("1v1" / "3v3"), needed to rebuild a snapshot()
+        self.game_time = 0.0
+        self.phase_rule = phase_rule
+        self.match_duration = match_duration
+        self.dt = dt
+        self.disable_outposts = disable_outposts
+        self.profiler = profiler
+        self.reset()
+
+    @property
+    def phase_rule(self):
+        return self.clock.phase_rule
+
+    @phase_rule.setter
+    def phase_rule(self, rule):
+        # A new rule recompiles the clock (at the current time, with the default stage order)
+        if rule not in PHASE_RULES:
+            raise ValueError(f"Unknown phase rule '{rule}' (expected one of {', '.join(PHASE_RULES)})")
+        self.clock = MatchClock(rule, self.config['field'].get('outpost_dump_time', 30.0))
+        self.clock.on("auto_winner", self._on_auto_winner)
+        self.clock.on("outpost", self._on_outpost)
+        self.seek(self.game_time)
+
+    @classmethod
+    def from_config(cls, config, mode="3v3", field=None, pieces=None, **kwargs):
+        # Standard kick-off: robots evenly spaced along their alliance walls with up to 8 preloaded fuel,
+        # RobotAI on every is_ai robot. A passed-in pieces manager is reset instead of rebuilt (main.py
+        # keeps its live physics tuning across matches)
+        field_cfg = config['field']
+        field = field or Field(field_cfg)
+        fresh = pieces is None
+        if fresh:
+            pieces = GamePieceManager(config, field_cfg['pixels_per_inch'])
+        roster = lineup(config, mode)
+        robots = []
+        robot_ais = {}
+        for alliance, i, cfg in roster:
+            spacing = field_cfg['length_inches'] / (sum(1 for a, _, _ in roster if a == alliance) + 1)
+            x = 100 if alliance == "red" else field_cfg['width_inches'] - 100
+            robot = Robot(x, spacing * (i + 1), cfg, alliance)
+            robot.holding = min(8, robot.capacity)
+            robots.append(robot)
+            if cfg.get('is_ai'):
+                robot_ais[robot] = RobotAI(alliance, cfg.get('drivetrain') == "tank", cfg.get('model_path'))
+        if fresh:
+            pieces.spawn_initial(config)
+        else:
+            pieces.reset(config)
+        sim = cls(config, field, pieces, robots, robot_ais, **kwargs)
+        sim.mode = mode
+        return sim
+
+    def snapshot(self):
+        # Whole-match state (world, scoreboard, clock) plus the config and mode that rebuild the same
+        # lineup, e.g. for forking continuations (whatif.py)
+        snap = sim_state.capture_world(self.game_time, self.pieces, self.robots, self.robot_ais)
+        snap.update({
+            'sim': self.get_state(),
+            # AI fuel awareness is refreshed by the next fuel update; carried so a fork's first frame matches
+            'grid_counts': [[gx, gy, c] for (gx, gy), c in self.pieces.grid_counts.items()],
+            'config': self.config,
+            'mode': self.mode
+        })
+        return snap
+
+    @classmethod
+    def from_snapshot(cls, snap, **kwargs):
+        sim = cls.from_config(snap['config'], snap['mode'], **kwargs)
+        sim.restore(snap)
+        return sim
+
+    def restore(self, snap):
+        # Copies a snapshot() back into the existing objects (same lineup); nothing is rebuilt
+        game_time = sim_state.apply_world(snap, self.pieces, self.robots, self.robot_ais)
+        self.pieces.grid_counts = {(gx, gy): c for gx, gy, c in snap.get('grid_counts', ())}
+        self.game_time = game_time
+        self.set_state(snap.get('sim', {}))
+
+    def reset(self, game_time=0.0):
+        # Clock and scoreboard only; the world (fuel, robots) is set up by the caller
+        self.clock.reset()
+        self.seek(game_time)
+        self.scores = {"red": 0, "blue": 0}          # fuel scored into an active hub
+        self.penalty_scores = {"red": 0, "blue": 0}  # points from opponent fouls
+        self.phase_scores = {}                       # phase -> {"red", "blue"} fuel scored
+        self.passed = {"red": 0, "blue": 0}
+        self.stashed = {"red": 0, "blue": 0}
+        self.last_can_score = {"red": True, "blue": True}
+        self.counters = {}
+        self.step_stashed = {"red": 0, "blue": 0}
+
+    def get_state(self):
+        return {
+            'scores': dict(self.scores),
+            'penalty_scores': dict(self.penalty_scores),
+            'phase_scores': {phase: dict(s) for phase, s in self.phase_scores.items()},
+            'passed': dict(self.passed),
+            'stashed': dict(self.stashed),
+            'auto_winner': self.clock.auto_winner,
+            'stage_alliances': list(self.clock.stage_alliances),
+            'last_can_score': dict(self.last_can_score)
+        }
+
+    def set_state(self, state):
+        # Missing keys keep their fresh-match values (older snapshots only carry some of them)
+        zero = {"red": 0, "blue": 0}
+        self.scores = dict(state.get('scores', zero))
+        self.penalty_scores = dict(state.get('penalty_scores', zero))
+        self.phase_scores = {phase: dict(s) for phase, s in state.get('phase_scores', {}).items()}
+        self.passed = dict(state.get('passed', zero))
+        self.stashed = dict(state.get('stashed', zero))
+        self.last_can_score = dict(state.get('last_can_score', {"red": True, "blue": True}))
+        self.clock.reset(state.get('stage_alliances', DEFAULT_STAGES), state.get('auto_winner'))
+        self.seek(self.game_time)
+
+    def seek(self, game_time):
+        # Move the match clock without replaying boundaries (resets, snapshot restores); an outpost
+        # that should already be out but is not is released on the next frame
+        self.game_time = game_time
+        self.clock.seek(game_time)
+        self._outpost_due = (self.pieces is not None and not self.pieces.outpost_released
+                             and game_time > self.clock.outpost_time)
+
+    @property
+    def finished(self):
+        return self.game_time >= self.match_duration
+
+    def totals(self):
+        # Alliance points: active-hub fuel + opponent fouls
+        return {a: self.scores[a] + self.penalty_scores[a] for a in ("red", "blue")}
+
+    def phase(self):
+        # -> (phase name, active hub: "red" / "blue" / "both" / None)
+        return self.clock.phase, self.clock.active
+
+    def active_alliance(self):
+        # Hub lights for rendering
+        return self.clock.active
+
+    def can_score(self, alliance):
+        return self.clock.can[alliance]
+
+    def _on_auto_winner(self, clock):
+        if self.scores["red"] > self.scores["blue"]:
+            clock.set_auto_winner("red")
+        elif self.scores["blue"] > self.scores["red"]:
+            clock.set_auto_winner("blue")
+        else:
+            clock.set_auto_winner("tie")
+
+    def _on_outpost(self, clock):
+        # Released just before this frame's fuel physics, where GamePieceManager.update used to check it
+        self._outpost_due = True
+
+    def step(self, n_frames=1, inputs=None, keys=NO_KEYS, controls=None, dt=None, on_frame=None):
+        # Runs up to n_frames frames (fewer if the match ends) and returns how many ran.
+        # inputs are held for every frame of the step; controls: {alliance: control map} for keyboard
+        # robots; on_frame(sim) is called after each frame. self.counters holds this step's per-robot
+        # events and self.step_stashed its stashed fuel
+        dt = self.dt if dt is None else dt
+        self.counters = {robot: RobotCounters(robot) for robot in self.robots}
+        self.step_stashed = {"red": 0, "blue": 0}
+        frames = 0
+        while frames < n_frames and self.game_time < self.match_duration:
+            self._frame(inputs, keys, controls, dt)
+            frames += 1
+            if on_frame is not None:
+                on_frame(self)
+        return frames
+
+    def run(self, on_frame=None):
+        # Plays out the rest of the match; self.counters then covers everything run here
+        return self.step(float('inf'), on_frame=on_frame)
+
+    def _frame(self, inputs, keys, controls, dt):
+        clock = self.clock
+        if self.game_time >= clock.next_time:
+            clock.advance(self.game_time)
+        can_score = self.last_can_score = clock.can
+
+        profiler = self.profiler
+        field, pieces, robots, config = self.field, self.pieces, self.robots, self.config
+        counters = self.counters
+        phase_score = self.phase_scores.setdefault(clock.phase, {"red": 0, "blue": 0})
+        for robot in robots:
+            alliance = robot.alliance
+            ok = can_score[alliance]
+            ai_inputs = inputs.get(robot) if inputs else None
+            if ai_inputs is None and robot in self.robot_ais:
+                with profiler.timer("ai_update"):
+                    ai_inputs = self.robot_ais[robot].update(robot, field, pieces, ok, robots, self.game_time, self.match_duration, config)
+            ctrl = controls[alliance] if controls else NO_CONTROLS
+
+            with profiler.timer("robot_update"):
+                res = robot.update(dt, keys, ctrl, field, self.game_time, robots, pieces, ok, ai_inputs)
+            if isinstance(res, dict):
+                c = counters[robot]
+                if res['scored']:
+                    # A launch only counts into an active hub; the fuel re-enters play either way
+                    if ok:
+                        self.scores[alliance] += res['scored']
+                        phase_score[alliance] += res['scored']
+                    pieces.recycle_fuel(robot, config['field'])
+                c.scored += res['scored']
+                c.passed += res['passed']
+                c.dumped += res['dumped']
+                self.passed[alliance] += res['passed']
+
+            # Manual dump (keyboard robots)
+            if ai_inputs is None and controls and keys[ctrl['dump_key']]:
+                if robot.dump(self.game_time, pieces):
+                    pieces.spawn_dump(robot.x, robot.y)
+
+        if self._outpost_due:
+            self._outpost_due = False
+            if not self.disable_outposts:
+                pieces.release_outpost(config)
+        with profiler.timer("pieces_update"):
+            pieces.update(robots, self.game_time, config)
+        profiler.count("fuel_on_field", len(pieces.fuels))
+        self.stashed["red"] += pieces.stashed_red
+        self.stashed["blue"] += pieces.stashed_blue
+        self.step_stashed["red"] += pieces.stashed_red
+        self.step_stashed["blue"] += pieces.stashed_blue
+
+        # Penalties: each foul gives the other alliance its points
+        for foul_alliance, amount in pieces.penalties:
+            self.penalty_scores[OTHER[foul_alliance]] += amount
+        for robot in pieces.foul_robots:
+            c = counters.get(robot)
+            if c is not None:
+                c.fouls += 1
+
+        self.game_time += dt
+        for robot in robots:
+            c = counters[robot]
+            c.dist += ((robot.x - c.x)**2 + (robot.y - c.y)**2)**0.5
+            c.x = robot.x
+            c.y = robot.y
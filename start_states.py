@@ -0,0 +1,184 @@
+import os
+import sys
+import json
+import pickle
+import bisect
+import argparse
+
+import numpy as np
+
+import sim_state
+from match_clock import PHASE_TIMELINE
+
+# Start-State Buffer
+# Mid-match sim snapshots (sim_state.capture_world / FrcEnv.snapshot) that FrcEnv.reset can start
+# episodes from, so training time goes to late-match situations instead of replaying every opening.
+# Each state is tagged with its match phase and a few situations for the controlled robot; sampling
+# weights come from ml_config.json env_params.start_states:
+#   {"path": "start_states.pkl", "prob": 0.5,
+#    "phase_weights": {"AUTO": 0.0, "TELEOP": 1.0, "ENDGAME": 2.0},
+#    "situation_weights": {"divider": 2.0, "behind_hub": 3.0}}
+
+# Curriculum buckets from the match clock's schedule: the teleop stages share one, FINISHED counts as ENDGAME
+_PHASE_STARTS = [start for _, start, _ in PHASE_TIMELINE]
+_PHASE_BUCKETS = [{"FINISHED": "ENDGAME"}.get(name, name.split(" ")[0]) for name, _, _ in PHASE_TIMELINE]
+
+def match_phase(game_time):
+    return _PHASE_BUCKETS[max(0, bisect.bisect_right(_PHASE_STARTS, game_time) - 1)]
+
+def classify_state(snap, sim_config):
+    field_cfg = sim_config['field']
+    robot = snap['robots'][snap.get('controlled_index', 0)]
+    is_red = robot['alliance'] == "red"
+    divider_x = field_cfg['divider_x'] if is_red else field_cfg['width_inches'] - field_cfg['divider_x']
+    hub_y = field_cfg['length_inches'] / 2
+
+    situations = []
+    # Near our divider line (bump / trench crossing)
+    if abs(robot['x'] - divider_x) < 30:
+        situations.append("divider")
+    # Neutral-zone side of our hub, where passes need the high lob over the net
+    if ((is_red and robot['x'] > divider_x) or (not is_red and robot['x'] < divider_x)) and abs(robot['y'] - hub_y) < 60:
+        situations.append("behind_hub")
+    if robot['holding'] > 0 and robot['holding'] >= 0.8 * robot['capacity']:
+        situations.append("loaded")
+    return match_phase(snap['game_time']), situations
+
+class StartStateBuffer:
+    def __init__(self, sim_config, phase_weights=None, situation_weights=None):
+        self.sim_config = sim_config
+        self.phase_weights = phase_weights or {}
+        self.situation_weights = situation_weights or {}
+        self.states = []
+        self.tags = []  # (phase, situations) per state
+        self._probs = None
+
+    def __len__(self):
+        return len(self.states)
+
+    def add(self, snap):
+        self.states.append(snap)
+        self.tags.append(classify_state(snap, self.sim_config))
+        self._probs = None
+
+    def weight(self, tag):
+        phase, situations = tag
+        w = self.phase_weights.get(phase, 1.0)
+        for s in situations:
+            w *= self.situation_weights.get(s, 1.0)
+        return w
+
+    def sample(self, rng):
+        # rng: numpy Generator (FrcEnv passes its np_random)
+        if self._probs is None:
+            w = np.array([self.weight(t) for t in self.tags], dtype=np.float64)
+            if w.sum() <= 0:
+                raise ValueError("All start states have zero sampling weight")
+            self._probs = w / w.sum()
+        return self.states[int(rng.choice(len(self.states), p=self._probs))]
+
+    def counts(self):
+        by_tag = {}
+        for phase, situations in self.tags:
+            for key in [phase] + [f"{phase}/{s}" for s in situations]:
+                by_tag[key] = by_tag.get(key, 0) + 1
+        return by_tag
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            pickle.dump({'version': sim_state.SNAPSHOT_VERSION, 'states': self.states}, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(path, sim_config, phase_weights=None, situation_weights=None):
+        buf = StartStateBuffer(sim_config, phase_weights, situation_weights)
+        with open(path, 'rb') as f:
+            data = pickle.load(f)
+        for snap in data['states']:
+            buf.add(snap)
+        return buf
+
+class IntervalRecorder:
+    # Frame hook for headless_runner.run_match(recorder=...): captures the world every `every` seconds
+    def __init__(self, buffer, every=5.0, start=30.0):
+        self.buffer = buffer
+        self.every = every
+        self.next_time = start
+
+    def __call__(self, game_time, pieces, robots, robot_ais):
+        if game_time >= self.next_time:
+            self.buffer.add(sim_state.capture_world(game_time, pieces, robots, robot_ais))
+            self.next_time += self.every
+
+def record_headless(buffer, config, matches, every, start, seed):
+    import random
+    from headless_runner import run_match
+    # 1v1 matches line up with FrcEnv's robots: [Red 1 (controlled), Blue 1]
+    for i in range(matches):
+        random.seed(seed + i)
+        np.random.seed(seed + i)
+        run_match(config, i + 1, "1v1", recorder=IntervalRecorder(buffer, every, start))
+
+def record_rollouts(buffer, model_path, episodes, every_steps, seed):
+    from stable_baselines3 import PPO
+    from gym_env import FrcEnv
+    env = FrcEnv(render_mode=None)
+    model = PPO.load(model_path)
+    for ep in range(episodes):
+        obs, _ = env.reset(seed=seed + ep)
+        done, step = False, 0
+        while not done:
+            action, _ = model.predict(obs, deterministic=False)
+            obs, _, terminated, truncated, _ = env.step(action)
+            done = terminated or truncated
+            step += 1
+            if step % every_steps == 0 and not done:
+                snap = env.snapshot()
+                snap.pop('rng') # Each restored episode keeps its own randomness
+                buffer.add(snap)
+        print(f"Episode {ep + 1}/{episodes}: {len(buffer)} states")
+
+def main():
+    parser = argparse.ArgumentParser(description="Record / inspect mid-match start states for FrcEnv curriculum resets")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    rec = sub.add_parser("record", help="Capture states from headless heuristic matches or model rollouts")
+    rec.add_argument("--out", type=str, default="start_states.pkl", help="Output buffer file")
+    rec.add_argument("--append", action="store_true", help="Add to an existing buffer instead of replacing it")
+    rec.add_argument("--matches", type=int, default=20, help="Headless 1v1 matches to record")
+    rec.add_argument("--every", type=float, default=5.0, help="Seconds between captures (headless)")
+    rec.add_argument("--start", type=float, default=30.0, help="First capture time in seconds (headless)")
+    rec.add_argument("--model", type=str, help="Record FrcEnv rollouts of this model instead of headless matches")
+    rec.add_argument("--episodes", type=int, default=10, help="Rollout episodes (with --model)")
+    rec.add_argument("--every_steps", type=int, default=50, help="Env steps between captures (with --model)")
+    rec.add_argument("--seed", type=int, default=0, help="Base seed")
+    info = sub.add_parser("info", help="Summarize a buffer by phase and situation")
+    info.add_argument("path", type=str)
+    args = parser.parse_args()
+
+    with open("config.json", "r") as f:
+        config = json.load(f)
+
+    if args.cmd == "info":
+        buf = StartStateBuffer.load(args.path, config)
+        print(f"{args.path}: {len(buf)} states")
+        for key, n in sorted(buf.counts().items()):
+            print(f"  {key:<24} {n}")
+        return
+
+    if args.append and os.path.exists(args.out):
+        buf = StartStateBuffer.load(args.out, config)
+    else:
+        buf = StartStateBuffer(config)
+
+    if args.model:
+        if not os.path.exists(args.model):
+            print(f"Error: Specified model path {args.model} not found.")
+            sys.exit(1)
+        record_rollouts(buf, args.model, args.episodes, args.every_steps, args.seed)
+    else:
+        record_headless(buf, config, args.matches, args.every, args.start, args.seed)
+
+    buf.save(args.out)
+    print(f"Saved {len(buf)} start states to {args.out}")
+
+if __name__ == "__main__":
+    main()
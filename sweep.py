@@ -0,0 +1,208 @@
+import os
+import csv
+import sys
+import json
+import time
+import argparse
+import itertools
+
+import numpy as np
+
+from headless_runner import resource_path, run_jobs
+from match_stats import BatchStats
+from match_cache import DEFAULT_DIR as CACHE_DIR, MatchCache
+
+# Robot Design Sweep
+# "What if Red 2 had 30 capacity / 200 speed / dual intake?" without hand-editing config.json: each
+# --param names one robot field and the values to try, the sweep expands them into variants (full grid
+# or a Latin hypercube sample) and plays --matches matches of every variant plus the unmodified
+# baseline, all on one headless_runner process pool. Every variant sees the same match seeds
+# (seed .. seed + matches - 1), so differences between variants are not drowned in match-to-match noise.
+#   --param red.2.capacity=20,30,40          listed values (numbers, true/false or strings)
+#   --param red.2.max_speed=150:250          range: --steps evenly spaced points in a grid, sampled in LHS
+#   --param blue.1.intake_type=single,dual
+# Robots are numbered from 1 within their alliance, like the "Red 2" names in config.json.
+#
+#   python sweep.py --param red.2.capacity=20,30,40 --param red.2.intake_type=single,dual --matches 50 --workers 24
+#   python sweep.py --param red.1.max_speed=120:220 --param red.1.shoot_rate=3:8 --method lhs --samples 20
+
+RANK_METRICS = ("win_rate", "score_diff", "score")
+
+def parse_value(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+def parse_param(spec):
+    # "red.2.capacity=20,30,40" -> {'name', 'alliance', 'index', 'field', 'values' | 'range'}
+    name, _, values = spec.partition("=")
+    parts = name.split(".")
+    if len(parts) != 3 or parts[0] not in ("red", "blue") or not parts[1].isdigit() or not values:
+        raise ValueError(f"Bad --param '{spec}' (expected e.g. red.2.capacity=20,30,40 or red.2.max_speed=150:250)")
+    param = {'name': name, 'alliance': parts[0], 'index': int(parts[1]) - 1, 'field': parts[2]}
+    if ":" in values and "," not in values:
+        lo, hi = (parse_value(v) for v in values.split(":", 1))
+        param['range'] = (lo, hi)
+        param['integer'] = isinstance(lo, int) and isinstance(hi, int)
+    else:
+        param['values'] = [parse_value(v) for v in values.split(",")]
+    return param
+
+def _range_value(param, u):
+    # u in [0, 1] -> a point of the parameter's range
+    lo, hi = param['range']
+    x = lo + u * (hi - lo)
+    return int(round(x)) if param['integer'] else round(x, 4)
+
+def grid_variants(params, steps):
+    axes = []
+    for p in params:
+        if 'values' in p:
+            axes.append(p['values'])
+        else:
+            points = [_range_value(p, k / (steps - 1)) if steps > 1 else _range_value(p, 0.5) for k in range(steps)]
+            axes.append(list(dict.fromkeys(points)))
+    return [dict(zip((p['name'] for p in params), combo)) for combo in itertools.product(*axes)]
+
+def lhs_variants(params, samples, rng):
+    # Latin hypercube: each parameter's range (or value list) is cut into `samples` strata and every
+    # stratum is used exactly once, in an independent random order per parameter
+    columns = []
+    for p in params:
+        u = (rng.permutation(samples) + rng.random(samples)) / samples
+        if 'values' in p:
+            columns.append([p['values'][min(int(x * len(p['values'])), len(p['values']) - 1)] for x in u])
+        else:
+            columns.append([_range_value(p, x) for x in u])
+    return [dict(zip((p['name'] for p in params), row)) for row in zip(*columns)]
+
+def apply_variant(base_config, params, variant):
+    config = json.loads(json.dumps(base_config))
+    for p in params:
+        config[f"{p['alliance']}_alliance"][p['index']][p['field']] = variant[p['name']]
+    return config
+
+def check_params(base_config, params, mode):
+    for p in params:
+        robots = base_config[f"{p['alliance']}_alliance"]
+        if p['index'] >= len(robots):
+            raise ValueError(f"{p['name']}: {p['alliance']} alliance has {len(robots)} robots")
+        if mode == "1v1" and p['index'] > 0:
+            print(f"Warning: {p['name']} has no effect in 1v1 (only robot 1 of each alliance plays).")
+        if p['field'] not in robots[p['index']]:
+            print(f"Warning: {p['name']} is not set in config.json; check the field name (Robot reads it with a default).")
+
+def side_view(stats, side):
+    # -> (win rate, win rate interval, mean score diff, diff interval, mean score) from `side`'s point of view
+    n = stats.n
+    wr = (stats.red_wins + 0.5 * stats.ties) / n
+    lo, hi = stats.win_rate_interval()
+    d_lo, d_hi = stats.diff.interval(stats.z)
+    if side == "red":
+        return wr, (lo, hi), stats.diff.mean, (d_lo, d_hi), stats.red.mean
+    return 1 - wr, (1 - hi, 1 - lo), -stats.diff.mean, (-d_hi, -d_lo), stats.blue.mean
+
+def run_sweep(base_config, params, variants, matches, mode="3v3", seed=0, workers=1, cache=None):
+    # -> [BatchStats] per variant (variant 0 is the baseline config)
+    configs = [base_config] + [apply_variant(base_config, params, v) for v in variants]
+    # Interleaved by match so every variant has results early on
+    jobs = [(v, i + 1, seed + i) for i in range(matches) for v in range(len(configs))]
+    stats = [BatchStats() for _ in configs]
+    done = 0
+    for index, _, _, result, _, _ in run_jobs(configs, jobs, mode, workers, cache=cache):
+        stats[index].add(result)
+        done += 1
+        if stats[index].n == matches:
+            label = "baseline" if index == 0 else f"variant {index}/{len(variants)}"
+            print(f"  {label} done ({done}/{len(jobs)} matches)")
+    return stats
+
+def ranked_rows(params, variants, stats, side, metric):
+    rows = []
+    for index, (variant, s) in enumerate(zip([None] + variants, stats)):
+        wr, (lo, hi), diff, (d_lo, d_hi), score = side_view(s, side)
+        row = {'variant': "baseline" if variant is None else index}
+        row.update(variant or {p['name']: "-" for p in params})
+        row.update(matches=s.n, win_rate=round(wr, 4), win_rate_lo=round(lo, 4), win_rate_hi=round(hi, 4),
+                   score_diff=round(diff, 2), score_diff_lo=round(d_lo, 2), score_diff_hi=round(d_hi, 2),
+                   score=round(score, 2))
+        rows.append(row)
+    return sorted(rows, key=lambda r: -r[metric])
+
+def print_table(params, rows, side):
+    names = [p['name'] for p in params]
+    widths = [max(len(n), 8) for n in names]
+    header = f"{'#':>3s} {'variant':>8s} " + " ".join(f"{n:>{w}s}" for n, w in zip(names, widths))
+    header += f" | {side + ' win %':>10s} {'95% CI':>13s} | {'diff':>6s} {'95% CI':>15s} | {'score':>6s}"
+    print(header)
+    print("-" * len(header))
+    for rank, r in enumerate(rows, 1):
+        line = f"{rank:3d} {str(r['variant']):>8s} " + " ".join(f"{str(r[n]):>{w}s}" for n, w in zip(names, widths))
+        line += (f" | {r['win_rate'] * 100:9.1f}% [{r['win_rate_lo'] * 100:4.1f},{r['win_rate_hi'] * 100:5.1f}]"
+                 f" | {r['score_diff']:+6.1f} [{r['score_diff_lo']:+6.1f},{r['score_diff_hi']:+6.1f}] | {r['score']:6.1f}")
+        print(line)
+
+def write_rows(path, rows):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "w", newline="") as f:
+        if path.endswith(".csv"):
+            w = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+            w.writeheader()
+            w.writerows(rows)
+        else:
+            json.dump(rows, f, indent=4)
+    os.replace(path + ".tmp", path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep robot design parameters over headless matches")
+    parser.add_argument("--param", type=str, action="append", required=True, help="alliance.robot.field=v1,v2,... or =lo:hi (repeatable)")
+    parser.add_argument("--method", type=str, choices=["grid", "lhs"], default="grid")
+    parser.add_argument("--steps", type=int, default=3, help="Grid points per lo:hi range")
+    parser.add_argument("--samples", type=int, default=16, help="Latin hypercube variants")
+    parser.add_argument("--matches", type=int, default=20, help="Matches per variant")
+    parser.add_argument("--mode", type=str, default="3v3", choices=["1v1", "3v3"])
+    parser.add_argument("--seed", type=int, default=0, help="Match seeds are seed .. seed + matches - 1 for every variant")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--rank", type=str, choices=RANK_METRICS, default="win_rate")
+    parser.add_argument("--side", type=str, choices=["red", "blue"], help="Alliance whose results are ranked (default: the first --param's)")
+    parser.add_argument("--config", type=str, default=resource_path('config.json'))
+    parser.add_argument("--out", type=str, help="Write the ranked table to this .csv or .json file")
+    parser.add_argument("--cache", type=str, nargs='?', const=CACHE_DIR, help=f"Reuse/store match results in this directory (default: {CACHE_DIR})")
+    parser.add_argument("--cache-max-mb", type=float, default=500)
+    args = parser.parse_args()
+
+    with open(args.config, 'r') as f:
+        base_config = json.load(f)
+    try:
+        params = [parse_param(spec) for spec in args.param]
+        check_params(base_config, params, args.mode)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    side = args.side or params[0]['alliance']
+
+    if args.method == "grid":
+        variants = grid_variants(params, args.steps)
+    else:
+        variants = lhs_variants(params, args.samples, np.random.default_rng(args.seed))
+    workers = max(1, min(args.workers, (len(variants) + 1) * args.matches))
+    print(f"Sweeping {len(variants)} variants (+ baseline) x {args.matches} matches ({args.mode}) on {workers} worker(s)...")
+
+    cache = MatchCache(args.cache, args.cache_max_mb) if args.cache else None
+    start = time.perf_counter()
+    stats = run_sweep(base_config, params, variants, args.matches, args.mode, args.seed, workers, cache)
+    print(f"Done in {time.perf_counter() - start:.1f}s")
+    if cache is not None:
+        cache.prune(drop_stale=False)
+        print(f"Cache: {cache.hits} matches reused, {cache.stored} simulated and stored ({args.cache})")
+    print()
+
+    rows = ranked_rows(params, variants, stats, side, args.rank)
+    print_table(params, rows, side)
+    if args.out:
+        write_rows(args.out, rows)
+        print(f"\nResults written to {args.out}")
+
+if __name__ == "__main__":
+    main()
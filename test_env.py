@@ -1,5 +1,8 @@
+import json
+
 import numpy as np
 from gym_env import FrcEnv
+from headless_runner import run_match, seed_match
 
 def test_env():
     print("Initializing FRC Environment...")
@@ -25,5 +28,39 @@ def test_env():
         import traceback
         traceback.print_exc()
 
+def test_headless_match_is_pinned():
+    # Seeded headless matches are deterministic. These numbers pin the current config.json and sim code:
+    # if a change is meant to alter match play, update them; if not, the hot loop changed behaviour
+    with open('config.json', 'r') as f:
+        config = json.load(f)
+    seed_match(7)
+    result, _ = run_match(config, 1, "1v1", quiet=True)
+    assert result['scores'] == {'red': 146, 'blue': 54}
+    assert result['penalties'] == {'red': 0, 'blue': 0}
+    assert result['passed'] == {'red': 145, 'blue': 108}
+    assert result['stashed'] == {'red': 151, 'blue': 121}
+
+def test_snapshot_restore_replays():
+    # restore(snapshot()) rewinds the whole episode (world, scoreboard, clock, RNGs): the same actions
+    # must then give the same observations and rewards
+    env = FrcEnv(render_mode=None)
+    env.reset(seed=3)
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        env.step(rng.uniform(-1, 1, 6).astype(np.float32))
+    snap = env.snapshot()
+    actions = rng.uniform(-1, 1, (200, 6)).astype(np.float32)
+
+    def play():
+        return [env.step(action)[:2] for action in actions]
+
+    first = play()
+    env.restore(snap)
+    second = play()
+    env.close()
+    for (obs_a, rew_a), (obs_b, rew_b) in zip(first, second):
+        assert np.array_equal(obs_a, obs_b)
+        assert rew_a == rew_b
+
 if __name__ == "__main__":
     test_env()
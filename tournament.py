@@ -0,0 +1,227 @@
+import os
+import sys
+import glob
+import json
+import math
+import time
+import argparse
+
+from headless_runner import resource_path, run_jobs
+from match_cache import DEFAULT_DIR as CACHE_DIR, MatchCache
+
+# Tournament
+# Ranks PPO checkpoints and heuristic configs against each other. Every entrant fields a whole
+# alliance; a pairing plays --games headless matches with the sides alternating (game g: seed + g,
+# the first entrant is red in even games) on one headless_runner process pool.
+#   round-robin  every pair of entrants
+#   swiss        --rounds rounds; each pairs entrants of similar rating that have not met yet
+# Ratings are Elo (start 1500, --k per game) replayed over all games in schedule order, next to
+# win/draw/loss records. Matches go through the match cache by default: a game is keyed by its
+# merged config (models by file contents), mode and seed, so re-running with one more checkpoint
+# only plays that entrant's new pairings.
+# Entrants (--entrant, repeatable; NAME=SPEC to rename):
+#   heuristic          config.json's red alliance driven by the heuristic RobotAI
+#   path/to/model.zip  config.json's red alliance robots, all driven by this PPO model
+#   path/to/cfg.json   that config's red_alliance robots (heuristic unless they name a model_path)
+# --models GLOB adds every matching checkpoint.
+#
+#   python tournament.py --entrant heuristic --models "ml_models/**/best_model.zip" --mode 1v1 --games 10 --workers 24
+#   python tournament.py --entrant ml_models/PPO_18_frc_ppo_29414560_steps.zip --entrant fast=configs/fast.json --format swiss
+
+ELO_START = 1500.0
+
+def entrant_name(spec):
+    if spec == "heuristic":
+        return spec
+    stem = os.path.splitext(os.path.basename(spec))[0]
+    parent = os.path.basename(os.path.dirname(os.path.abspath(spec)))
+    # ml_models/PPO_22_janitor_v1/best_model.zip -> PPO_22_janitor_v1/best_model
+    return f"{parent}/{stem}" if stem in ("best_model", "model", "final_model") else stem
+
+def parse_entrant(text, base_config):
+    # -> (name, [robot configs])
+    name, sep, spec = text.partition("=")
+    if not sep or spec == "":
+        name, spec = None, text
+    if spec == "heuristic":
+        robots = [{k: v for k, v in r.items() if k != 'model_path'} for r in base_config['red_alliance']]
+    elif spec.endswith(".zip"):
+        if not os.path.exists(spec):
+            raise ValueError(f"Model {spec} not found")
+        robots = [dict(r, model_path=spec) for r in base_config['red_alliance']]
+    elif spec.endswith(".json"):
+        if not os.path.exists(spec):
+            raise ValueError(f"Config {spec} not found")
+        with open(spec, 'r') as f:
+            robots = json.load(f)['red_alliance']
+    else:
+        raise ValueError(f"Bad entrant '{text}' (expected heuristic, a .zip model or a .json config)")
+    name = name or entrant_name(spec)
+    # Tournament robots are all AI driven
+    return name, [dict(r, is_ai=True, name=f"{name} {i + 1}") for i, r in enumerate(robots)]
+
+def match_config(base_config, red, blue):
+    config = dict(base_config)
+    config['red_alliance'] = red
+    config['blue_alliance'] = blue
+    return config
+
+class EloTable:
+    def __init__(self, names, k=16.0):
+        self.k = k
+        self.rating = {n: ELO_START for n in names}
+        self.record = {n: [0, 0, 0] for n in names} # wins, draws, losses
+
+    def add(self, a, b, score_a):
+        # score_a: 1 win / 0.5 draw / 0 loss for a
+        expected = 1.0 / (1.0 + 10 ** ((self.rating[b] - self.rating[a]) / 400.0))
+        self.rating[a] += self.k * (score_a - expected)
+        self.rating[b] -= self.k * (score_a - expected)
+        for name, s in ((a, score_a), (b, 1.0 - score_a)):
+            self.record[name][0 if s == 1.0 else (1 if s == 0.5 else 2)] += 1
+
+    def ranked(self):
+        return sorted(self.rating, key=lambda n: (-self.rating[n], n))
+
+def game_score(result, a_is_red):
+    red = result['scores']['red'] + result['penalties']['red']
+    blue = result['scores']['blue'] + result['penalties']['blue']
+    mine, theirs = (red, blue) if a_is_red else (blue, red)
+    return 1.0 if mine > theirs else (0.5 if mine == theirs else 0.0), mine - theirs
+
+def play_pairings(base_config, entrants, pairings, games, mode, seed, workers, cache):
+    # -> {(a, b): [(game, score for a, margin for a)]} for entrant names a, b
+    configs, jobs, meta = [], [], []
+    for a, b in pairings:
+        configs.append(match_config(base_config, entrants[a], entrants[b]))
+        configs.append(match_config(base_config, entrants[b], entrants[a]))
+        for g in range(games):
+            index = len(configs) - 2 + (g % 2) # a is red in even games
+            jobs.append((index, len(meta) + 1, seed + g))
+            meta.append((a, b, g, g % 2 == 0))
+    out = {pair: [] for pair in pairings}
+    for _, match_id, _, result, _, _ in run_jobs(configs, jobs, mode, workers, cache=cache):
+        a, b, g, a_is_red = meta[match_id - 1]
+        score, margin = game_score(result, a_is_red)
+        out[(a, b)].append((g, score, margin))
+        done = sum(len(v) for v in out.values())
+        if done % max(1, len(jobs) // 10) == 0 or done == len(jobs):
+            print(f"  {done}/{len(jobs)} matches")
+    for results in out.values():
+        results.sort()
+    return out
+
+def swiss_pairings(names, table, played):
+    # Highest rated first; each entrant meets the next unpaired one it has not played (any, if it has
+    # played them all). An odd entrant out (the lowest rated) sits the round out
+    order = table.ranked()
+    pairings, used = [], set()
+    for i, a in enumerate(order):
+        if a in used:
+            continue
+        rest = [b for b in order[i + 1:] if b not in used]
+        if not rest:
+            break
+        b = next((b for b in rest if (a, b) not in played and (b, a) not in played), rest[0])
+        pairings.append((a, b))
+        used.update((a, b))
+    return pairings
+
+def print_table(table, margins):
+    print(f"{'#':>3s} {'entrant':<40s} {'elo':>7s} {'W':>4s} {'D':>4s} {'L':>4s} {'score %':>8s} {'avg margin':>10s}")
+    print("-" * 86)
+    for rank, name in enumerate(table.ranked(), 1):
+        w, d, l = table.record[name]
+        n = w + d + l
+        pct = (w + 0.5 * d) / n * 100 if n else 0.0
+        avg = sum(margins[name]) / len(margins[name]) if margins[name] else 0.0
+        print(f"{rank:3d} {name:<40s} {table.rating[name]:7.1f} {w:4d} {d:4d} {l:4d} {pct:7.1f}% {avg:+10.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Round-robin / Swiss tournament between models and heuristic configs")
+    parser.add_argument("--entrant", type=str, action="append", default=[], help="heuristic, model .zip or config .json; NAME=SPEC to rename (repeatable)")
+    parser.add_argument("--models", type=str, action="append", default=[], help="Glob of model checkpoints to enter (repeatable)")
+    parser.add_argument("--format", type=str, default="round-robin", choices=["round-robin", "swiss"])
+    parser.add_argument("--rounds", type=int, help="Swiss rounds (default: ceil(log2(entrants)) + 1)")
+    parser.add_argument("--games", type=int, default=10, help="Matches per pairing (sides alternate)")
+    parser.add_argument("--mode", type=str, default="1v1", choices=["1v1", "3v3"])
+    parser.add_argument("--seed", type=int, default=0, help="Game g of every pairing uses seed + g")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--k", type=float, default=16.0, help="Elo K-factor (per game)")
+    parser.add_argument("--config", type=str, default=resource_path('config.json'), help="Base config (field, physics, default robots)")
+    parser.add_argument("--cache", type=str, default=CACHE_DIR, help=f"Match cache directory (default: {CACHE_DIR})")
+    parser.add_argument("--no-cache", action="store_true", help="Play every match, even if cached")
+    parser.add_argument("--cache-max-mb", type=float, default=500)
+    parser.add_argument("--out", type=str, help="Write ratings, records and pairing results to this JSON file")
+    args = parser.parse_args()
+
+    with open(args.config, 'r') as f:
+        base_config = json.load(f)
+    specs = list(args.entrant)
+    for pattern in args.models:
+        specs += sorted(glob.glob(pattern, recursive=True))
+    entrants = {}
+    try:
+        for spec in specs:
+            name, robots = parse_entrant(spec, base_config)
+            if name in entrants:
+                raise ValueError(f"Two entrants are named '{name}' (use NAME=SPEC)")
+            entrants[name] = robots
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    if len(entrants) < 2:
+        print("Error: a tournament needs at least two entrants.")
+        sys.exit(1)
+
+    names = list(entrants)
+    table = EloTable(names, args.k)
+    margins = {n: [] for n in names}
+    cache = None if args.no_cache else MatchCache(args.cache, args.cache_max_mb)
+    played = {}
+    if args.format == "round-robin":
+        schedule = [[(a, b) for i, a in enumerate(names) for b in names[i + 1:]]]
+    else:
+        schedule = [None] * (args.rounds or math.ceil(math.log2(len(names))) + 1)
+    start = time.perf_counter()
+    for round_no, pairings in enumerate(schedule, 1):
+        if pairings is None:
+            pairings = swiss_pairings(names, table, played)
+        n_matches = len(pairings) * args.games
+        workers = max(1, min(args.workers, n_matches))
+        label = f"Round {round_no}/{len(schedule)}: " if args.format == "swiss" else ""
+        print(f"{label}{len(pairings)} pairings x {args.games} games ({args.mode}) on {workers} worker(s)...")
+        results = play_pairings(base_config, entrants, pairings, args.games, args.mode, args.seed, workers, cache)
+        # Ratings replay the games in schedule order, so they do not depend on completion order
+        for (a, b) in pairings:
+            for _, score, margin in results[(a, b)]:
+                table.add(a, b, score)
+                margins[a].append(margin)
+                margins[b].append(-margin)
+            played[(a, b)] = results[(a, b)]
+        if args.format == "swiss":
+            print_table(table, margins)
+            print()
+    print(f"Done in {time.perf_counter() - start:.1f}s")
+    if cache is not None:
+        cache.prune(drop_stale=False)
+        print(f"Cache: {cache.hits} matches reused, {cache.stored} simulated and stored ({args.cache})")
+    print()
+    print_table(table, margins)
+
+    if args.out:
+        data = {
+            'format': args.format, 'mode': args.mode, 'games': args.games, 'seed': args.seed, 'k': args.k,
+            'entrants': [{'name': n, 'elo': round(table.rating[n], 1), 'wins': table.record[n][0],
+                          'draws': table.record[n][1], 'losses': table.record[n][2]} for n in table.ranked()],
+            'pairings': [{'a': a, 'b': b, 'results': [{'game': g, 'score': s, 'margin': m} for g, s, m in res]}
+                         for (a, b), res in played.items()]
+        }
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out + ".tmp", "w") as f:
+            json.dump(data, f, indent=4)
+        os.replace(args.out + ".tmp", args.out)
+        print(f"\nResults written to {args.out}")
+
+if __name__ == "__main__":
+    main()
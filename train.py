@@ -2,11 +2,15 @@ import os
 import json
 import argparse
 import glob
+from functools import partial
 from stable_baselines3 import PPO
 from stable_baselines3.common.monitor import Monitor
 from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv
-from stable_baselines3.common.callbacks import CheckpointCallback, EvalCallback, BaseCallback
+from stable_baselines3.common.callbacks import BaseCallback
 from gym_env import FrcEnv
+from async_eval import AsyncEvalCallback
+from ml_utils import load_ml_config, pin_worker, tuned_env_key
+from checkpoint_store import CheckpointStore, CheckpointStoreCallback, latest_checkpoint, latest_run
 
 def linear_schedule(initial_value: float):
     def func(progress_remaining: float) -> float:
@@ -14,8 +18,11 @@ def linear_schedule(initial_value: float):
     return func
 
 class TensorboardCallback(BaseCallback):
-    def __init__(self, verbose=0):
+    def __init__(self, verbose=0, perf_report_path=None):
         super(TensorboardCallback, self).__init__(verbose)
+        # Running totals of per-episode perf_* scalars (only present when profiling is enabled)
+        self.perf_report_path = perf_report_path
+        self.perf_totals = {}
 
     def _on_step(self) -> bool:
         # The Monitor wrapper adds 'episode' to info on completion
@@ -29,23 +36,80 @@ class TensorboardCallback(BaseCallback):
                 for key, value in info.items():
                     if key.startswith('rew_'):
                         self.logger.record(f'reward/{key}', value)
+                    elif key.startswith('perf_'):
+                        self.logger.record(f'perf/{key[5:]}', value)
+                        total = self.perf_totals.setdefault(key[5:], [0, 0.0])
+                        total[0] += 1
+                        total[1] += value
+        return True
+
+    def _on_training_end(self) -> None:
+        if self.perf_report_path and self.perf_totals:
+            report = {name: total / n for name, (n, total) in self.perf_totals.items()}
+            with open(self.perf_report_path, 'w') as f:
+                json.dump({'episodes': max(n for n, _ in self.perf_totals.values()), 'mean': report}, f, indent=4)
+            print(f"Profile report written to {self.perf_report_path}")
+
+class SelfPlayCallback(BaseCallback):
+    """
+    Keeps the self-play opponent pool (opponent_pool.py) fed: exports new checkpoints from `sources`
+    and writes the learner's results per opponent, which the workers pick up on their next reset.
+    """
+    def __init__(self, pool_dir, sources, max_policies=20, refresh_freq=50000, verbose=0):
+        super(SelfPlayCallback, self).__init__(verbose)
+        self.pool_dir = pool_dir
+        self.sources = sources
+        self.max_policies = max_policies
+        self.refresh_freq = refresh_freq
+        self.results = []
+        self.last_refresh = 0
+        self.index = None
+
+    def _refresh(self):
+        from opponent_pool import sync_pool, record_results
+        self.index = record_results(self.pool_dir, self.results)
+        self.index, added = sync_pool(self.pool_dir, self.sources, self.max_policies, self.index)
+        if added:
+            print(f"Opponent pool: added {', '.join(added)}")
+        self.results = []
+        self.last_refresh = self.num_timesteps
+
+    def _on_training_start(self) -> None:
+        self._refresh()
+
+    def _on_step(self) -> bool:
+        for info in self.locals['infos']:
+            if 'episode' in info and 'opponent' in info:
+                self.logger.record_mean(f"self_play/result_{'heuristic' if info['opponent'] == 'heuristic' else 'pool'}", info['result'])
+                if info['opponent'] != "heuristic":
+                    self.results.append((info['opponent'], info['result']))
+        if self.num_timesteps - self.last_refresh >= self.refresh_freq:
+            self._refresh()
+            self.logger.record("self_play/pool_size", len(self.index['policies']))
         return True
 
 def train():
     parser = argparse.ArgumentParser()
     parser.add_argument("--resume", type=str, nargs='?', const='auto', help="Resume training from latest checkpoint ('auto') or specific path")
     parser.add_argument("--suffix", type=str, default="", help="Optional suffix for the run ID (e.g. 'worker_score')")
+    parser.add_argument("--multi_agent", action="store_true", help="Drive all six robots with one shared policy (gym_env_multi.py); n_envs is then the number of sims")
+    parser.add_argument("--remote", type=str, help="Step envs on remote rollout workers (remote_rollout.py): tcp://host:port or unix:///path.sock")
+    parser.add_argument("--remote_envs", type=int, help="Envs to wait for across all remote workers (default: n_envs)")
+    parser.add_argument("--spawn_workers", type=int, default=0, help="Also start this many local rollout workers for --remote (envs split between them)")
+    parser.add_argument("--no_tuned", action="store_true", help="Ignore ml_config.tuned.json (autotune.py)")
     args = parser.parse_args()
 
-    # Load ML config
-    with open("ml_config.json", "r") as f:
-        ml_config = json.load(f)
+    # Load ML config (+ ml_config.tuned.json from autotune.py, if present)
+    # Tuned for the plain FrcEnv workers only: multi-agent and remote rollouts scale differently
+    tuned_env = tuned_env_key("frc") if not (args.multi_agent or args.remote) else None
+    ml_config = load_ml_config(use_tuned=not args.no_tuned, env=tuned_env)
     
     train_cfg = ml_config['training_params']
     
     # Create environment factory
     def make_env(rank, seed=0):
         def _init():
+            pin_worker(rank, n_envs, train_cfg.get('worker_affinity', "none"))
             # Wrap in Monitor to get rollout/ep_rew_mean in TensorBoard
             env = FrcEnv(render_mode=None)
             env.reset(seed=seed + rank)
@@ -53,7 +117,22 @@ def train():
         return _init
     
     n_envs = train_cfg.get('n_envs', 1)
-    if n_envs > 1:
+    if args.remote:
+        from remote_rollout import RemoteVecEnv, spawn_local_workers
+        n_envs = args.remote_envs or n_envs
+        if args.spawn_workers:
+            spawn_local_workers(args.remote, args.spawn_workers, n_envs)
+        env = RemoteVecEnv(args.remote, n_envs)
+        print(f"Using RemoteVecEnv: {n_envs} envs on {len(env.workers)} rollout workers.")
+    elif args.multi_agent:
+        from gym_env_multi import MultiFrcEnv
+        from multi_vec_env import MultiAgentVecEnv
+        def make_multi_env():
+            return MultiFrcEnv(render_mode=None)
+        env = MultiAgentVecEnv([make_multi_env for _ in range(n_envs)], use_subprocess=n_envs > 1)
+        env.seed(0)
+        print(f"Using MultiAgentVecEnv: {n_envs} sims x {env.agents_per_sim} agents = {env.num_envs} samples per step.")
+    elif n_envs > 1:
         print(f"Using SubprocVecEnv with {n_envs} parallel environments.")
         env = SubprocVecEnv([make_env(i) for i in range(n_envs)])
     else:
@@ -89,19 +168,30 @@ def train():
     load_model = None
     if args.resume:
         if args.resume == 'auto':
-            files = glob.glob(os.path.join(model_dir, "*.zip"))
-            if files:
-                load_model = max(files, key=os.path.getmtime)
+            # Newest of: the latest checkpoint of the most recently saved run, and the zips saved
+            # directly in ml_models/ (older runs)
+            candidates = [(os.path.getmtime(f), f) for f in glob.glob(os.path.join(model_dir, "*.zip"))]
+            last_run = latest_run(model_dir, exclude=run_model_dir)
+            if last_run:
+                checkpoint = latest_checkpoint(last_run)
+                candidates.append((os.path.getmtime(checkpoint), checkpoint))
+            if candidates:
+                load_model = max(candidates)[1]
                 print(f"Resuming from latest model: {load_model}")
             else:
-                print("No checkpoints found to resume. Starting from scratch.")
+                print(f"Error: --resume auto found no checkpoints in {model_dir}. Run without --resume to start from scratch.")
+                env.close()
+                return
         else:
-            if os.path.exists(args.resume):
+            if os.path.isdir(args.resume) and latest_checkpoint(args.resume):
+                load_model = latest_checkpoint(args.resume)
+                print(f"Resuming from latest checkpoint of {args.resume}: {load_model}")
+            elif os.path.isfile(args.resume):
                 load_model = args.resume
                 print(f"Resuming from specified model: {load_model}")
             else:
-                # Fallback to auto if file not found? Or error? Let's error clearly.
-                print(f"Error: Specified model path {args.resume} not found.")
+                print(f"Error: No model found at {args.resume}.")
+                env.close()
                 return
 
     if load_model:
@@ -129,28 +219,44 @@ def train():
         )
     
     # Callbacks
-    checkpoint_callback = CheckpointCallback(
-        save_freq=max(5000, 100000 // n_envs), 
-        save_path=run_model_dir,
-        name_prefix=f"{run_id}_frc_ppo"
+    # Checkpoints are written by a background thread; manifest.json + retention (checkpoint_store.py)
+    checkpoint_store = CheckpointStore(
+        run_model_dir,
+        name_prefix=f"{run_id}_frc_ppo",
+        keep_last=train_cfg.get('checkpoint_keep_last', 3),
+        keep_every=train_cfg.get('checkpoint_keep_every', 10)
+    )
+    checkpoint_callback = CheckpointStoreCallback(
+        checkpoint_store,
+        save_freq=max(5000, train_cfg.get('checkpoint_freq', 100000) // env.num_envs)
     )
     
-    # Best Model Tracker
-    eval_env = Monitor(FrcEnv(render_mode=None))
+    # Best Model Tracker (evaluated in background processes, training never waits for it)
     best_model_path = os.path.join(run_model_dir, "best_model")
     os.makedirs(best_model_path, exist_ok=True)
     
-    eval_callback = EvalCallback(
-        eval_env,
+    eval_callback = AsyncEvalCallback(
+        partial(FrcEnv, render_mode=None),
+        n_eval_episodes=train_cfg.get('eval_episodes', 5),
+        eval_freq=max(1000, train_cfg.get('eval_freq', 20000) // env.num_envs),
+        n_workers=train_cfg.get('eval_workers', 2),
+        max_pending=train_cfg.get('eval_max_pending', 1),
         best_model_save_path=best_model_path,
-        log_path=log_dir,
-        eval_freq=max(1000, train_cfg.get('eval_freq', 20000) // n_envs),
-        deterministic=True,
-        render=False,
-        n_eval_episodes=train_cfg.get('eval_episodes', 5)
+        log_path=log_dir
     )
     
-    callbacks = [checkpoint_callback, eval_callback, TensorboardCallback()]
+    perf_report_path = os.path.join(log_dir, f"{run_id}_perf.json")
+    callbacks = [checkpoint_callback, eval_callback, TensorboardCallback(perf_report_path=perf_report_path)]
+    
+    # Self-play: this run's checkpoints (or env_params.self_play.sources) become opponents as they land
+    sp_cfg = ml_config['env_params'].get('self_play', {})
+    if sp_cfg.get('enabled', False):
+        callbacks.append(SelfPlayCallback(
+            sp_cfg.get('pool_dir', os.path.join(model_dir, "opponent_pool")),
+            sp_cfg.get('sources', [run_model_dir]),
+            sp_cfg.get('max_policies', 20),
+            sp_cfg.get('refresh_freq', 50000)
+        ))
     
     print(f"Starting training for {train_cfg['total_timesteps']} timesteps...")
     model.learn(
@@ -1,12 +1,15 @@
 import os
 import json
 import argparse
-import glob
+from functools import partial
 from stable_baselines3 import PPO
 from stable_baselines3.common.monitor import Monitor
 from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv
-from stable_baselines3.common.callbacks import CheckpointCallback, EvalCallback, BaseCallback
+from stable_baselines3.common.callbacks import BaseCallback
 from gym_env_specialized import SpecializedFrcEnv
+from async_eval import AsyncEvalCallback
+from ml_utils import load_ml_config, pin_worker, tuned_env_key
+from checkpoint_store import CheckpointStore, CheckpointStoreCallback, latest_checkpoint, latest_run
 
 def linear_schedule(initial_value: float):
     def func(progress_remaining: float) -> float:
@@ -14,8 +17,11 @@ def linear_schedule(initial_value: float):
     return func
 
 class TensorboardCallback(BaseCallback):
-    def __init__(self, verbose=0):
+    def __init__(self, verbose=0, perf_report_path=None):
         super(TensorboardCallback, self).__init__(verbose)
+        # Running totals of per-episode perf_* scalars (only present when profiling is enabled)
+        self.perf_report_path = perf_report_path
+        self.perf_totals = {}
 
     def _on_step(self) -> bool:
         for info in self.locals['infos']:
@@ -25,8 +31,20 @@ class TensorboardCallback(BaseCallback):
                 for key, value in info.items():
                     if key.startswith('rew_'):
                         self.logger.record(f'reward/{key}', value)
+                    elif key.startswith('perf_'):
+                        self.logger.record(f'perf/{key[5:]}', value)
+                        total = self.perf_totals.setdefault(key[5:], [0, 0.0])
+                        total[0] += 1
+                        total[1] += value
         return True
 
+    def _on_training_end(self) -> None:
+        if self.perf_report_path and self.perf_totals:
+            report = {name: total / n for name, (n, total) in self.perf_totals.items()}
+            with open(self.perf_report_path, 'w') as f:
+                json.dump({'episodes': max(n for n, _ in self.perf_totals.values()), 'mean': report}, f, indent=4)
+            print(f"Profile report written to {self.perf_report_path}")
+
 def train():
     parser = argparse.ArgumentParser()
     parser.add_argument("--mode", type=str, choices=["janitor", "lobber"], default="janitor", help="Specialized training mode")
@@ -34,33 +52,18 @@ def train():
     parser.add_argument("--resume", type=str, nargs='?', const='auto', help="Resume path or 'auto' for latest run")
     parser.add_argument("--n_envs", type=int, help="Number of parallel environments (overrides ml_config)")
     parser.add_argument("--eval_freq", type=int, help="Total steps between evaluations (e.g. 10000)")
+    parser.add_argument("--pbt", type=int, metavar="K", help="Population-based training with K members (training_params.pbt)")
+    parser.add_argument("--no_tuned", action="store_true", help="Ignore ml_config.tuned.json (autotune.py)")
     args = parser.parse_args()
 
-    # Load ML config
-    with open("ml_config.json", "r") as f:
-        ml_config = json.load(f)
+    # Load ML config (+ ml_config.tuned.json from autotune.py, if present)
+    # PBT members split the workers between them, so a single-model tuning does not apply to them
+    tuned_env = tuned_env_key("specialized", args.mode) if not args.pbt else None
+    ml_config = load_ml_config(use_tuned=not args.no_tuned, env=tuned_env)
     
     train_cfg = ml_config['training_params']
     n_envs = args.n_envs if args.n_envs is not None else train_cfg.get('n_envs', 1)
     
-    # Create environment factory
-    def make_env(rank, seed=0):
-        def _init():
-            env = SpecializedFrcEnv(render_mode=None, mode=args.mode)
-            env.reset(seed=seed + rank)
-            return Monitor(env)
-        return _init
-    
-    print(f"--- Parallelism Check ---")
-    print(f"Requested Envs: {n_envs}")
-    if n_envs > 1:
-        print(f"Initializing SubprocVecEnv with {n_envs} workers...")
-        env = SubprocVecEnv([make_env(i) for i in range(n_envs)])
-    else:
-        print(f"Initializing DummyVecEnv (Single process)...")
-        env = DummyVecEnv([make_env(0)])
-    print(f"-------------------------")
-    
     model_dir = "ml_models"
     log_dir = "ml_logs"
     os.makedirs(model_dir, exist_ok=True)
@@ -86,32 +89,45 @@ def train():
     run_model_dir = os.path.join(model_dir, run_id)
     os.makedirs(run_model_dir, exist_ok=True)
 
+    if args.pbt:
+        # K smaller PPO members with exploit/explore between them (pbt.py); --n_envs is per member here
+        from pbt import run_pbt
+        if args.resume:
+            print("Warning: --resume is not supported with --pbt. Starting a NEW population.")
+        run_pbt(args.mode, ml_config, run_id, run_model_dir, log_dir, n_members=args.pbt, envs_per_member=args.n_envs)
+        return
+
+    # Create environment factory
+    def make_env(rank, seed=0):
+        def _init():
+            pin_worker(rank, n_envs, train_cfg.get('worker_affinity', "none"))
+            env = SpecializedFrcEnv(render_mode=None, mode=args.mode)
+            env.reset(seed=seed + rank)
+            return Monitor(env)
+        return _init
+    
+    print(f"--- Parallelism Check ---")
+    print(f"Requested Envs: {n_envs}")
+    if n_envs > 1:
+        print(f"Initializing SubprocVecEnv with {n_envs} workers...")
+        env = SubprocVecEnv([make_env(i) for i in range(n_envs)])
+    else:
+        print(f"Initializing DummyVecEnv (Single process)...")
+        env = DummyVecEnv([make_env(0)])
+    print(f"-------------------------")
+
     resume_path = None
     if args.resume:
         if args.resume == "auto":
-            # Find latest run for this mode
-            pattern = os.path.join(model_dir, f"PPO_*_{args.mode}*")
-            matches = glob.glob(pattern)
-            
-            # Filter: Ignore the folder we just created for the current run!
-            candidates = [m for m in matches if os.path.abspath(m) != os.path.abspath(run_model_dir)]
-            
-            # Filter: Only consider folders that actually have a zip file
-            valid_candidates = []
-            for c in candidates:
-                if os.path.isdir(c):
-                    for _, _, files in os.walk(c):
-                        if any(f.endswith(".zip") for f in files):
-                            valid_candidates.append(c)
-                            break
-            
-            if valid_candidates:
-                # Sort by modification time to get the most recent successful run
-                valid_candidates.sort(key=lambda x: os.path.getmtime(x), reverse=True)
-                args.resume = valid_candidates[0]
+            # Latest run for this mode with saved checkpoints (from the run manifests; older runs
+            # get one built from their zips), ignoring the folder we just created for the current run
+            args.resume = latest_run(model_dir, f"PPO_*_{args.mode}*", exclude=run_model_dir)
+            if args.resume:
                 print(f"Auto-resuming latest valid {args.mode} run: {args.resume}")
             else:
-                args.resume = None # No model found, start fresh without error
+                print(f"Error: --resume auto found no {args.mode} run with checkpoints in {model_dir}. Run without --resume to start from scratch.")
+                env.close()
+                return
         
         if os.path.isdir(args.resume):
             # 1. Try common best_model locations
@@ -126,25 +142,21 @@ def train():
                     break
             
             if not resume_path:
-                # 2. Look for ANY zip file in the folder or subfolders
-                for root, dirs, files in os.walk(args.resume):
-                    zips = [f for f in files if f.endswith(".zip")]
-                    if zips:
-                        # Pick the newest one
-                        full_paths = [os.path.join(root, f) for f in zips]
-                        resume_path = max(full_paths, key=os.path.getmtime)
-                        break
-        elif os.path.exists(args.resume):
+                # 2. Newest checkpoint of the run (any zip under it, for runs without a manifest)
+                resume_path = latest_checkpoint(args.resume)
+        elif os.path.isfile(args.resume):
             resume_path = args.resume
 
+        if not resume_path:
+            print(f"Error: Could not find a model to resume from {args.resume}.")
+            env.close()
+            return
+
     tb_log_name = run_id
     if resume_path:
         print(f"Resuming from Model: {resume_path}")
         model = PPO.load(resume_path, env=env, tensorboard_log=log_dir, learning_rate=train_cfg['learning_rate'])
     else:
-        if args.resume:
-            print(f"Warning: Could not find model to resume from {args.resume}. Starting NEW.")
-        
         print(f"Starting NEW {args.mode} training: {run_id}")
         policy_kwargs = dict(net_arch=[256, 256])
         model = PPO(
@@ -160,26 +172,34 @@ def train():
             tensorboard_log=log_dir
         )
     
-    checkpoint_callback = CheckpointCallback(
-        save_freq=max(5000, 100000 // n_envs), 
-        save_path=run_model_dir,
-        name_prefix=f"{run_id}_specialized"
+    # Checkpoints are written by a background thread; manifest.json + retention (checkpoint_store.py)
+    checkpoint_store = CheckpointStore(
+        run_model_dir,
+        name_prefix=f"{run_id}_specialized",
+        keep_last=train_cfg.get('checkpoint_keep_last', 3),
+        keep_every=train_cfg.get('checkpoint_keep_every', 10)
+    )
+    checkpoint_callback = CheckpointStoreCallback(
+        checkpoint_store,
+        save_freq=max(5000, train_cfg.get('checkpoint_freq', 100000) // n_envs)
     )
     
-    eval_env = Monitor(SpecializedFrcEnv(render_mode=None, mode=args.mode))
+    # Best Model Tracker (evaluated in background processes, training never waits for it)
     best_model_path = os.path.join(run_model_dir, "best_model")
     os.makedirs(best_model_path, exist_ok=True)
     
-    eval_callback = EvalCallback(
-        eval_env,
-        best_model_save_path=best_model_path,
-        log_path=log_dir,
+    eval_callback = AsyncEvalCallback(
+        partial(SpecializedFrcEnv, render_mode=None, mode=args.mode),
+        n_eval_episodes=train_cfg.get('eval_episodes', 5),
         eval_freq=max(100, (args.eval_freq if args.eval_freq else train_cfg.get('eval_freq', 20000)) // n_envs),
-        deterministic=True,
-        n_eval_episodes=train_cfg.get('eval_episodes', 5)
+        n_workers=train_cfg.get('eval_workers', 2),
+        max_pending=train_cfg.get('eval_max_pending', 1),
+        best_model_save_path=best_model_path,
+        log_path=log_dir
     )
     
-    callbacks = [checkpoint_callback, eval_callback, TensorboardCallback()]
+    perf_report_path = os.path.join(log_dir, f"{run_id}_perf.json")
+    callbacks = [checkpoint_callback, eval_callback, TensorboardCallback(perf_report_path=perf_report_path)]
     
     model.learn(
         total_timesteps=train_cfg['total_timesteps'],
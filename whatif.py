@@ -0,0 +1,259 @@
+import os
+import sys
+import json
+import time
+import argparse
+import multiprocessing as mp
+
+import numpy as np
+
+# Force Pygame to use dummy driver for headless operation
+os.environ["SDL_VIDEODRIVER"] = "dummy"
+
+import pygame
+from ai import RobotAI
+from simulation import Simulation, lineup
+from headless_runner import resource_path, seed_match
+from match_stats import BatchStats
+from sweep import side_view
+import sim_state
+
+# What-If Continuations
+# "Does switching Red 2 from passing to scoring at t=70s help?" Takes one mid-match state and plays
+# --runs stochastic continuations of it to the end of the match, unchanged and under every --alt
+# strategy assignment, on a process pool. Continuation k runs with seed + k under every alternative,
+# so the alternatives are compared on the same luck. Reports win probability and the final score
+# distribution per alternative.
+# Mid-match states:
+#   --state FILE                   saved from main.py (F5 during a match) or any Simulation.snapshot()
+#   --match-seed S --at T --mode M  headless_runner's match with seed S (same config), replayed to T seconds
+# Assignments (robots numbered from 1 within their alliance, like sweep.py):
+#   red.2=scorer        never passes; off-phase fuel is ferried into its own zone instead
+#   red.2=passer        treats its hub as closed: gathers and passes to its alliance zone, never shoots
+#   red.2=heuristic     heuristic RobotAI instead of its model (also the driver of human robots)
+#   red.2=model:PATH    drive with this PPO model
+# Several assignments go in one --alt, comma separated: --alt red.2=scorer,red.3=passer
+#
+#   python whatif.py --match-seed 42 --at 70 --alt red.2=scorer --alt red.2=passer --runs 200 --workers 24
+#   python whatif.py --state whatif_states/match_70s.pkl --alt blue.1=heuristic --out whatif.json
+
+ROLES = ("scorer", "passer")
+
+class RoleAI:
+    """
+    Drives a robot through its normal AI with a fixed role. A passer's AI is always told its hub is
+    closed, which is what makes the heuristic (and PPO policies) gather and pass.
+    """
+    def __init__(self, ai, role):
+        self.ai = ai
+        self.role = role
+
+    def update(self, robot, field, pieces, can_score, *args, **kwargs):
+        return self.ai.update(robot, field, pieces, can_score and self.role != "passer", *args, **kwargs)
+
+    def __getattr__(self, name):
+        # get_state/set_state, recovery_timer, ... of the wrapped AI
+        return getattr(self.ai, name)
+
+def parse_alt(spec):
+    # "red.2=scorer,red.3=model:ml_models/x.zip" -> [(alliance, index, value)]
+    out = []
+    for part in spec.split(","):
+        name, _, value = part.partition("=")
+        parts = name.split(".")
+        if len(parts) != 2 or parts[0] not in ("red", "blue") or not parts[1].isdigit() or not value:
+            raise ValueError(f"Bad assignment '{part}' (expected e.g. red.2=scorer)")
+        if value not in ROLES and value != "heuristic" and not value.startswith("model:"):
+            raise ValueError(f"Unknown strategy '{value}' (expected scorer, passer, heuristic or model:PATH)")
+        if value.startswith("model:") and not os.path.exists(value[len("model:"):]):
+            raise ValueError(f"Model {value[len('model:'):]} not found")
+        out.append((parts[0], int(parts[1]) - 1, value))
+    return out
+
+def check_alt(snap, alt):
+    counts = {}
+    for alliance, _, _ in lineup(snap['config'], snap['mode']):
+        counts[alliance] = counts.get(alliance, 0) + 1
+    for alliance, index, _ in alt:
+        if index >= counts.get(alliance, 0):
+            raise ValueError(f"{alliance}.{index + 1}: {alliance} has {counts.get(alliance, 0)} robots in {snap['mode']}")
+
+def alt_label(alt):
+    return ",".join(f"{a}.{i + 1}={v}" for a, i, v in alt) if alt else "as is"
+
+def match_state(config, mode, match_seed, at):
+    # headless_runner's match with this seed (run_match seeds, then builds the same Simulation), stopped at `at`
+    seed_match(match_seed)
+    sim = Simulation.from_config(config, mode)
+    while sim.game_time < at and not sim.finished:
+        sim.step(1)
+    return sim.snapshot()
+
+class Forker:
+    """
+    One Simulation rebuilt from the snapshot, restored in place for every continuation. Robots
+    without an AI in the snapshot (human drivers in main.py) get the heuristic.
+    """
+    def __init__(self, snap):
+        self.snap = snap
+        self.sim = Simulation.from_snapshot(snap)
+        for robot in self.sim.robots:
+            if robot not in self.sim.robot_ais:
+                self.sim.robot_ais[robot] = RobotAI(robot.alliance, robot.drivetrain == "tank")
+        self.base_ais = dict(self.sim.robot_ais)
+        self.can_pass = [robot.can_pass for robot in self.sim.robots]
+        self.positions = {(a, i): k for k, (a, i, _) in enumerate(lineup(snap['config'], snap['mode']))}
+
+    def play(self, alt, seed):
+        sim = self.sim
+        sim.robot_ais = dict(self.base_ais)
+        sim.restore(self.snap)
+        for robot, can_pass in zip(sim.robots, self.can_pass):
+            robot.can_pass = can_pass
+        for alliance, index, value in alt:
+            k = self.positions[(alliance, index)]
+            robot = sim.robots[k]
+            if value == "scorer":
+                robot.can_pass = False
+                robot.auto_pass_enabled = False
+            elif value == "passer":
+                robot.can_pass = True
+                robot.auto_pass_enabled = True
+                robot.auto_shoot_enabled = False
+                sim.robot_ais[robot] = RoleAI(sim.robot_ais[robot], "passer")
+            else:
+                model_path = value[len("model:"):] if value.startswith("model:") else None
+                ai = RobotAI(alliance, robot.drivetrain == "tank", model_path)
+                if k in self.snap['ais']:
+                    ai.set_state(self.snap['ais'][k])
+                sim.robot_ais[robot] = ai
+        seed_match(seed)
+        sim.run()
+        return {"scores": dict(sim.scores), "penalties": dict(sim.penalty_scores)}
+
+# Pool workers build their Forker once and then play many continuations
+_worker = {}
+
+def _init_worker(snap, alts):
+    # SDL would otherwise turn SIGTERM into a QUIT event and Pool.terminate() could not stop the worker
+    os.environ["SDL_NO_SIGNAL_HANDLERS"] = "1"
+    pygame.init()
+    pygame.display.set_mode((1, 1))
+    _worker.update(forker=Forker(snap), alts=alts)
+
+def _run_continuation(job):
+    index, k, seed = job
+    return index, k, _worker['forker'].play(_worker['alts'][index], seed)
+
+def run_continuations(snap, alts, runs, seed=0, workers=1):
+    # alts[0] should be [] (as is). Yields (alt index, continuation k, result) as continuations finish
+    jobs = [(index, k, seed + k) for k in range(runs) for index in range(len(alts))]
+    if workers <= 1:
+        forker = Forker(snap)
+        for index, k, s in jobs:
+            yield index, k, forker.play(alts[index], s)
+        return
+    ctx = mp.get_context("forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn")
+    chunksize = max(1, min(8, len(jobs) // (workers * 4)))
+    pool = ctx.Pool(workers, initializer=_init_worker, initargs=(snap, alts))
+    try:
+        yield from pool.imap_unordered(_run_continuation, jobs, chunksize)
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+def margins(finals, side):
+    # Final (side - other) point margins
+    other = "blue" if side == "red" else "red"
+    return np.array([f[side] - f[other] for f in finals], dtype=np.float64)
+
+def print_report(snap, alts, stats, finals, side):
+    scores = snap['sim']['scores']
+    pens = snap['sim']['penalty_scores']
+    print(f"State at {snap['game_time']:.1f}s ({snap['mode']}): RED {scores['red'] + pens['red']} - BLUE {scores['blue'] + pens['blue']}")
+    header = (f"{'alternative':<36s} | {side + ' win %':>10s} {'95% CI':>13s} | {side + ' score':>10s} |"
+              f" {'margin p10':>10s} {'p50':>6s} {'p90':>6s}")
+    print(header)
+    print("-" * len(header))
+    for alt, s, f in zip(alts, stats, finals):
+        wr, (lo, hi), _, _, score = side_view(s, side)
+        p10, p50, p90 = np.percentile(margins(f, side), [10, 50, 90])
+        print(f"{alt_label(alt):<36s} | {wr * 100:9.1f}% [{lo * 100:4.1f},{hi * 100:5.1f}] | {score:10.1f} |"
+              f" {p10:+10.0f} {p50:+6.0f} {p90:+6.0f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Win probability of alternative strategies from a mid-match state")
+    parser.add_argument("--state", type=str, help="Snapshot file (main.py F5 / Simulation.snapshot())")
+    parser.add_argument("--match-seed", type=int, help="Replay headless_runner's match with this seed instead")
+    parser.add_argument("--at", type=float, default=70.0, help="Fork time in seconds (with --match-seed)")
+    parser.add_argument("--mode", type=str, default="3v3", choices=["1v1", "3v3"], help="Match mode (with --match-seed)")
+    parser.add_argument("--config", type=str, default=resource_path('config.json'), help="Config (with --match-seed)")
+    parser.add_argument("--alt", type=str, action="append", default=[], help="Strategy assignment(s), e.g. red.2=scorer,red.3=passer (repeatable)")
+    parser.add_argument("--runs", type=int, default=100, help="Continuations per alternative")
+    parser.add_argument("--seed", type=int, default=0, help="Continuation k uses seed + k under every alternative")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--side", type=str, choices=["red", "blue"], help="Alliance whose chances are reported (default: the first --alt's)")
+    parser.add_argument("--out", type=str, help="Write per-alternative summaries and final margins to this JSON file")
+    args = parser.parse_args()
+
+    pygame.init()
+    pygame.display.set_mode((1, 1))
+
+    if args.state:
+        snap = sim_state.load_snapshot(args.state)
+        if 'config' not in snap:
+            print(f"Error: {args.state} is not a full match snapshot (save one with F5 in main.py).")
+            sys.exit(1)
+    elif args.match_seed is not None:
+        with open(args.config, 'r') as f:
+            config = json.load(f)
+        print(f"Replaying match seed {args.match_seed} ({args.mode}) to {args.at:.1f}s...")
+        snap = match_state(config, args.mode, args.match_seed, args.at)
+    else:
+        print("Error: give a --state file or a --match-seed to fork from.")
+        sys.exit(1)
+    if snap['game_time'] >= 160:
+        print("Error: the state is at the end of the match; nothing to play.")
+        sys.exit(1)
+
+    try:
+        alts = [[]] + [parse_alt(spec) for spec in args.alt]
+        for alt in alts:
+            check_alt(snap, alt)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    side = args.side or (alts[1][0][0] if len(alts) > 1 else "red")
+
+    workers = max(1, min(args.workers, len(alts) * args.runs))
+    print(f"Playing {args.runs} continuations x {len(alts)} alternatives from {snap['game_time']:.1f}s on {workers} worker(s)...")
+    stats = [BatchStats() for _ in alts]
+    finals = [[] for _ in alts]
+    start = time.perf_counter()
+    for index, _, result in run_continuations(snap, alts, args.runs, args.seed, workers):
+        stats[index].add(result)
+        finals[index].append({a: result['scores'][a] + result['penalties'][a] for a in ("red", "blue")})
+    print(f"Done in {time.perf_counter() - start:.1f}s\n")
+
+    print_report(snap, alts, stats, finals, side)
+    if args.out:
+        rows = []
+        for alt, s, f in zip(alts, stats, finals):
+            wr, (lo, hi), diff, (d_lo, d_hi), score = side_view(s, side)
+            rows.append({'alternative': alt_label(alt), 'side': side, 'runs': s.n,
+                         'win_prob': round(wr, 4), 'win_prob_lo': round(lo, 4), 'win_prob_hi': round(hi, 4),
+                         'margin': round(diff, 2), 'margin_lo': round(d_lo, 2), 'margin_hi': round(d_hi, 2),
+                         'score': round(score, 2), 'margins': margins(f, side).astype(int).tolist()})
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out + ".tmp", "w") as fh:
+            json.dump({'game_time': snap['game_time'], 'mode': snap['mode'], 'seed': args.seed, 'alternatives': rows}, fh, indent=4)
+        os.replace(args.out + ".tmp", args.out)
+        print(f"\nResults written to {args.out}")
+
+    pygame.quit()
+
+if __name__ == "__main__":
+    main()